@@ -4,18 +4,68 @@ IPTV M3U Playlist Sorter
 A web application for uploading, sorting, and managing IPTV M3U playlists
 """
 
-from flask import Flask, render_template, request, jsonify, send_file, url_for
+from flask import Flask, Response, g, has_request_context, render_template, request, jsonify, url_for, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.http import is_resource_modified
 import os
+import io
+import atexit
 import re
+import sys
+import codecs
 import json
+import sqlite3
 import uuid
-from datetime import datetime
-from urllib.parse import urlparse
-import tempfile
-import io
+import hashlib
+import hmac
+import cProfile
+import threading
+import heapq
+import zlib
+import gzip
+import http.client
+import socket
+import ipaddress
+import asyncio
+import ssl
+import multiprocessing
+import xml.etree.ElementTree as ET
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, defaultdict
+from collections.abc import MutableMapping
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+from urllib.parse import urlparse, urlsplit, urlunsplit, urljoin, quote
 import time
 import logging
+import click
+
+try:
+    import fcntl
+except ImportError:  # Windows - subscription locking falls back to threads only
+    fcntl = None
+
+try:
+    import brotli
+except ImportError:  # optional - playlists are then offered gzip-compressed only
+    brotli = None
+
+try:
+    import gevent
+    import gevent.monkey
+except ImportError:  # optional - only used to keep blocking writes off the gevent worker's event loop
+    gevent = None
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess as prometheus_multiprocess
+except ImportError:  # in requirements.txt; without it /metrics is disabled
+    prometheus_client = None
 
 app = Flask(__name__)
 
@@ -41,6 +91,34 @@ app.config.update(
     MAX_CONTENT_LENGTH=int(os.environ.get('MAX_FILE_SIZE', 50 * 1024 * 1024)),  # 50MB default
     UPLOAD_FOLDER=os.environ.get('UPLOAD_FOLDER', 'uploads'),
     SAVED_PLAYLISTS_FOLDER=os.environ.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists'),
+    PLAYLIST_STORAGE=os.environ.get('PLAYLIST_STORAGE', 'json'),  # json or sqlite
+    PLAYLIST_DATABASE=os.environ.get('PLAYLIST_DATABASE'),  # defaults to <SAVED_PLAYLISTS_FOLDER>/playlists.db
+    PLAYLIST_CACHE_MAX_CHANNELS=int(os.environ.get('PLAYLIST_CACHE_MAX_CHANNELS', 500000)),  # json backend, per worker
+    PLAYLIST_CACHE_MAX_BYTES=int(os.environ.get('PLAYLIST_CACHE_MAX_BYTES', 64 * 1024 * 1024)),  # 64MB default
+    PERSIST_MODE=os.environ.get('PERSIST_MODE', 'async'),  # json backend: async, fsync or sync
+    PERSIST_DELAY=float(os.environ.get('PERSIST_DELAY', 1.0)),  # seconds saves are coalesced before writing
+    SEARCH_INDEX_MAX_CHANNELS=int(os.environ.get('SEARCH_INDEX_MAX_CHANNELS', 500000)),  # per worker
+    GROUP_INDEX_MAX_CHANNELS=int(os.environ.get('GROUP_INDEX_MAX_CHANNELS', 2000000)),  # per worker, filtered views
+    PARSE_WORKERS=int(os.environ.get('PARSE_WORKERS', os.cpu_count() or 1)),  # process pool per worker for merges and upload jobs
+    UPLOAD_JOB_MIN_BYTES=int(os.environ.get('UPLOAD_JOB_MIN_BYTES', 5 * 1024 * 1024)),  # larger uploads become jobs
+    UPLOAD_JOB_MAX_QUEUE=int(os.environ.get('UPLOAD_JOB_MAX_QUEUE', 4)),  # upload jobs in flight across all workers
+    SUBSCRIPTIONS_ENABLED=os.environ.get('SUBSCRIPTIONS_ENABLED', 'true').lower() == 'true',
+    SUBSCRIPTION_DEFAULT_INTERVAL=int(os.environ.get('SUBSCRIPTION_DEFAULT_INTERVAL', 360)),  # minutes
+    SUBSCRIPTION_CHECK_INTERVAL=int(os.environ.get('SUBSCRIPTION_CHECK_INTERVAL', 60)),  # seconds
+    SUBSCRIPTION_FETCH_TIMEOUT=int(os.environ.get('SUBSCRIPTION_FETCH_TIMEOUT', 30)),  # seconds
+    RULE_TIMEOUT=float(os.environ.get('RULE_TIMEOUT', 30)),  # seconds a rule set with regex patterns may run
+    ALLOW_PRIVATE_URLS=os.environ.get('ALLOW_PRIVATE_URLS', 'false').lower() == 'true',  # fetch from LAN/loopback hosts
+    PROBE_CONCURRENCY=int(os.environ.get('PROBE_CONCURRENCY', 50)),  # stream checks in flight
+    PROBE_PER_HOST=int(os.environ.get('PROBE_PER_HOST', 4)),  # stream checks in flight per host
+    PROBE_TIMEOUT=float(os.environ.get('PROBE_TIMEOUT', 10)),  # seconds per stream
+    PROBE_CACHE_TTL=int(os.environ.get('PROBE_CACHE_TTL', 900)),  # seconds
+    SERVE_ALIVE_ONLY=os.environ.get('SERVE_ALIVE_ONLY', 'false').lower() == 'true',  # drop dead channels when serving
+    EPG_MAX_BYTES=int(os.environ.get('EPG_MAX_BYTES', 512 * 1024 * 1024)),  # guide downloads, as transferred
+    PLAYLIST_COMPRESSION=os.environ.get('PLAYLIST_COMPRESSION', 'br,gzip'),  # encodings offered, in preference order
+    METRICS_ENABLED=os.environ.get('METRICS_ENABLED', 'true').lower() == 'true',  # /metrics, needs prometheus_client
+    PROFILING_ENABLED=os.environ.get('PROFILING_ENABLED', 'false').lower() == 'true',  # needs PROFILING_TOKEN too
+    PROFILING_TOKEN=os.environ.get('PROFILING_TOKEN', ''),  # sent by clients as X-Profiling-Token
+    PROFILING_DIR=os.environ.get('PROFILING_DIR'),  # cProfile dumps, defaults to <SAVED_PLAYLISTS_FOLDER>/profiles
     
     # Production security settings
     SESSION_COOKIE_SECURE=os.environ.get('HTTPS_ENABLED', 'false').lower() == 'true',
@@ -104,9 +182,219 @@ def add_security_headers(response):
     
     return response
 
-# Store playlists in memory
-playlists = {}
-named_playlists = {}
+# Prometheus metrics. Under gunicorn each worker writes its samples to
+# PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) and /metrics merges them.
+METRICS_ENABLED = prometheus_client is not None and app.config['METRICS_ENABLED']
+if app.config['METRICS_ENABLED'] and prometheus_client is None:
+    app.logger.warning("METRICS_ENABLED is set but prometheus_client is not installed - /metrics is disabled")
+
+METRIC_SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+METRIC_BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1KB .. 256MB
+METRIC_CHANNEL_BUCKETS = (10, 100, 1000, 5000, 10000, 50000, 100000, 250000, 500000, 1000000)
+
+class NullMetric:
+    """Stands in for a metric when prometheus_client is missing or metrics are disabled."""
+    
+    def labels(self, *args, **kwargs):
+        return self
+    
+    def observe(self, amount):
+        pass
+    
+    def inc(self, amount=1):
+        pass
+
+def create_metric(metric_type, name, documentation, labelnames=(), **kwargs):
+    """Create a prometheus_client metric (e.g. 'Histogram'), or a no-op one."""
+    if not METRICS_ENABLED:
+        return NullMetric()
+    return getattr(prometheus_client, metric_type)(name, documentation, labelnames, **kwargs)
+
+request_seconds = create_metric(
+    'Histogram', 'iptv_request_duration_seconds', 'Request latency until the response is returned',
+    ('method', 'route', 'status'), buckets=METRIC_SECONDS_BUCKETS
+)
+upload_parse_seconds = create_metric(
+    'Histogram', 'iptv_upload_parse_seconds', 'Time to validate and parse an uploaded M3U',
+    buckets=METRIC_SECONDS_BUCKETS
+)
+upload_bytes = create_metric(
+    'Histogram', 'iptv_upload_bytes', 'Size of parsed M3U uploads', buckets=METRIC_BYTES_BUCKETS
+)
+upload_channels = create_metric(
+    'Histogram', 'iptv_upload_channels', 'Channels per parsed M3U upload', buckets=METRIC_CHANNEL_BUCKETS
+)
+m3u_generate_seconds = create_metric(
+    'Histogram', 'iptv_m3u_generate_seconds', 'Time spent rendering M3U output (excluding client I/O)',
+    buckets=METRIC_SECONDS_BUCKETS
+)
+playlist_save_seconds = create_metric(
+    'Histogram', 'iptv_playlist_save_seconds', 'Duration of writing playlists to storage',
+    ('backend',), buckets=METRIC_SECONDS_BUCKETS
+)
+playlist_save_bytes = create_metric(
+    'Histogram', 'iptv_playlist_save_bytes', 'Serialized size of playlists written to storage',
+    ('backend',), buckets=METRIC_BYTES_BUCKETS
+)
+cache_requests = create_metric(
+    'Counter', 'iptv_cache_requests', 'Cache lookups by cache and result (hit/miss)', ('cache', 'result')
+)
+
+def count_cache_lookup(cache, hit):
+    cache_requests.labels(cache, 'hit' if hit else 'miss').inc()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # The route pattern keeps label cardinality bounded
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_seconds.labels(request.method, route, response.status_code).observe(time.perf_counter() - started)
+    return response
+
+# Opt-in profiling: requests carrying X-Profiling-Token get a Server-Timing
+# header with their phases, and with X-Profile: 1 also a cProfile dump.
+# Without a valid token only the config lookup below is paid.
+PROFILING_ACTIVE = app.config['PROFILING_ENABLED'] and bool(app.config['PROFILING_TOKEN'])
+if app.config['PROFILING_ENABLED'] and not PROFILING_ACTIVE:
+    app.logger.warning("PROFILING_ENABLED is set but PROFILING_TOKEN is empty - profiling stays disabled")
+
+class RequestTimings:
+    """Durations of the phases of one request, exclusive of nested phases."""
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.nested = 0
+    
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+    
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        outer_nested, self.nested = self.nested, 0
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.add(name, elapsed - self.nested)
+            self.nested = outer_nested + elapsed
+    
+    def header(self):
+        return ', '.join(f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.phases.items())
+
+def get_request_timings():
+    """RequestTimings of the current request if it is being profiled, else None."""
+    return g.get('request_timings') if has_request_context() else None
+
+@contextmanager
+def timed_phase(name):
+    """Record the enclosed block as a Server-Timing phase of a profiled request."""
+    timings = get_request_timings()
+    if timings is None:
+        yield
+        return
+    with timings.phase(name):
+        yield
+
+@app.before_request
+def start_request_profiling():
+    if not PROFILING_ACTIVE:
+        return
+    token = request.headers.get('X-Profiling-Token', '')
+    if not hmac.compare_digest(token.encode('utf-8'), app.config['PROFILING_TOKEN'].encode('utf-8')):
+        return
+    
+    g.request_timings = RequestTimings()
+    if request.headers.get('X-Profile') == '1':
+        g.request_profiler = cProfile.Profile()
+        g.request_profiler.enable()
+
+@app.after_request
+def add_server_timing(response):
+    timings = get_request_timings()
+    if timings is None:
+        return response
+    
+    timings.add('total', time.perf_counter() - timings.started)
+    response.headers['Server-Timing'] = timings.header()
+    
+    # Streamed bodies and the send itself finish after the headers went out,
+    # so the complete breakdown is logged once the response is closed
+    profiler = g.get('request_profiler')
+    method = request.method
+    description = f"{method} {request.full_path.rstrip('?')}"
+    endpoint = request.endpoint or 'unmatched'
+    sent_from = time.perf_counter()
+    
+    def finish():
+        timings.add('send', time.perf_counter() - sent_from)
+        if profiler is not None:
+            profiler.disable()
+            profile_dir = app.config['PROFILING_DIR'] or os.path.join(
+                app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists'), 'profiles'
+            )
+            ensure_directory_exists(profile_dir)
+            profile_file = os.path.join(
+                profile_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{method}-{endpoint}.pstats"
+            )
+            profiler.dump_stats(profile_file)
+            app.logger.info(f"Saved profile of {description} to {profile_file}")
+        app.logger.info(f"Server-Timing {description}: {timings.header()}")
+    
+    response.call_on_close(finish)
+    return response
+
+class RenderedPlaylistCache:
+    """LRU cache of rendered M3U bytes, bounded by their total size."""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        """Return cached bytes for key (playlist id first) or None."""
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+        count_cache_lookup('rendered', body is not None)
+        return body
+    
+    def put(self, key, body):
+        """Store rendered bytes, evicting least recently used entries over the cap."""
+        if len(body) > self.max_bytes:
+            return
+        
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            
+            self.entries[key] = body
+            self.total_bytes += len(body)
+            
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+    
+    def invalidate(self, playlist_id):
+        """Drop every cached rendering of a playlist."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == playlist_id]:
+                self.total_bytes -= len(self.entries.pop(key))
+
+# Bump when generate_m3u_content output changes so clients drop old ETags
+M3U_RENDER_VERSION = 1
+
+rendered_playlist_cache = RenderedPlaylistCache(app.config['PLAYLIST_CACHE_MAX_BYTES'])
 
 def ensure_directory_exists(directory):
     """Ensure directory exists, create if not."""
@@ -114,256 +402,3707 @@ def ensure_directory_exists(directory):
         os.makedirs(directory, exist_ok=True)
 
 def get_playlists_file():
-    """Get the path to the playlists storage file."""
+    """Get the path to the legacy single-file playlists storage."""
     playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
     ensure_directory_exists(playlists_dir)
     return os.path.join(playlists_dir, 'playlists.json')
 
-def load_playlists():
-    """Load playlists from disk."""
-    global playlists, named_playlists
-    
+def get_playlists_index_file():
+    """Get the path to the playlist index (metadata of all saved playlists)."""
+    playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
+    ensure_directory_exists(playlists_dir)
+    return os.path.join(playlists_dir, 'index.json')
+
+def get_playlist_data_dir():
+    """Get the directory holding one JSON file per saved playlist."""
+    data_dir = os.path.join(app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists'), 'playlists')
+    ensure_directory_exists(data_dir)
+    return data_dir
+
+def get_playlist_data_file(playlist_id):
+    """Get the path of a single playlist's JSON file."""
+    return os.path.join(get_playlist_data_dir(), f'{playlist_id}.json')
+
+def get_playlist_delta_file(playlist_id):
+    """Get the path of a playlist's log of patches not yet folded into its file."""
+    return os.path.join(get_playlist_data_dir(), f'{playlist_id}.delta.jsonl')
+
+def get_playlist_lock_file(playlist_id):
+    """Get the path of the file locked while a playlist's files are changed."""
+    return os.path.join(get_playlist_data_dir(), f'{playlist_id}.lock')
+
+def remove_playlist_files(playlist_id):
+    """Remove a playlist's file, delta log and lock file."""
+    remove_file(get_playlist_data_file(playlist_id))
+    remove_file(get_playlist_delta_file(playlist_id))
+    remove_file(get_playlist_lock_file(playlist_id))
+
+def remove_file(path):
+    """Remove a file if it exists."""
     try:
-        playlists_file = get_playlists_file()
-        if os.path.exists(playlists_file):
-            with open(playlists_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                playlists = data.get('playlists', {})
-                named_playlists = data.get('named_playlists', {})
-                app.logger.info(f"Loaded {len(playlists)} playlists from disk")
-        else:
-            app.logger.info("No existing playlists file found, starting fresh")
-    except Exception as e:
-        app.logger.error(f"Error loading playlists: {e}")
-        playlists = {}
-        named_playlists = {}
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
-def save_playlists_to_disk():
-    """Save playlists to disk."""
+def get_file_signature(path):
+    """Identify the current version of a file (inode, mtime, size); None if it does not exist."""
     try:
-        playlists_file = get_playlists_file()
-        data = {
-            'playlists': playlists,
-            'named_playlists': named_playlists,
-            'saved_at': datetime.now().isoformat()
-        }
-        
-        # Write to temporary file first, then rename for atomic operation
-        temp_file = playlists_file + '.tmp'
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        # Atomic rename
-        os.replace(temp_file, playlists_file)
-        app.logger.info(f"Saved {len(playlists)} playlists to disk")
-        return True
-    except Exception as e:
-        app.logger.error(f"Error saving playlists: {e}")
-        return False
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
 
-# Load existing playlists on startup
-load_playlists()
+# Patch batches logged per playlist before its JSON file is rewritten in full
+JSON_DELTA_COMPACT_BATCHES = 100
 
-# Enhanced health check endpoints
-@app.route('/health')
-@app.route('/healthz')
-@app.route('/ping')
-def health_check():
-    """Enhanced health check with proper error handling"""
+# Values repeated across thousands of channels share one string object
+CHANNEL_INTERNED_FIELDS = frozenset(('group', 'logo', 'tvg_name', 'tvg_id'))
+
+class Channel(MutableMapping):
+    """Memory-compact channel: the parser's fields in slots, anything else in extra.
+    
+    Behaves like the channel dicts used everywhere else (get, [], items,
+    dict(channel), ==, JSON encoding) at roughly half their size. Saved
+    playlists kept in memory use it, with repeated values interned.
+    """
+    
+    FIELDS = ('name', 'group', 'logo', 'tvg_name', 'tvg_id', 'url', 'attributes')
+    __slots__ = FIELDS + ('extra',)
+    
+    @classmethod
+    def from_dict(cls, data):
+        """Build a channel from a mapping, interning repeated values."""
+        channel = cls.__new__(cls)
+        channel.extra = None
+        for key, value in data.items():
+            if key in CHANNEL_INTERNED_FIELDS and type(value) is str:
+                value = sys.intern(value)
+            elif key == 'attributes' and type(value) is dict and value:
+                value = {sys.intern(k): sys.intern(v) if type(v) is str else v for k, v in value.items()}
+            channel[key] = value
+        return channel
+    
+    def __getitem__(self, key):
+        if key in CHANNEL_FIELD_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+    
+    def get(self, key, default=None):
+        if key in CHANNEL_FIELD_SET:
+            return getattr(self, key, default)
+        return self.extra.get(key, default) if self.extra else default
+    
+    def __setitem__(self, key, value):
+        if key in CHANNEL_FIELD_SET:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+    
+    def __delitem__(self, key):
+        if key in CHANNEL_FIELD_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self.extra and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+    
+    def __iter__(self):
+        for field in self.FIELDS:
+            if hasattr(self, field):
+                yield field
+        if self.extra:
+            yield from self.extra
+    
+    def __len__(self):
+        return sum(hasattr(self, field) for field in self.FIELDS) + len(self.extra or ())
+    
+    def copy(self):
+        return Channel.from_dict(self)
+    
+    def __repr__(self):
+        return f'Channel({dict(self)!r})'
+
+CHANNEL_FIELD_SET = frozenset(Channel.FIELDS)
+
+def compact_channels(channels):
+    """Return channels as Channel objects; ones that already are stay the same object."""
+    return [channel if type(channel) is Channel else Channel.from_dict(channel) for channel in channels]
+
+def channel_object_hook(data):
+    """json.load object_hook turning channel objects into Channel while parsing.
+    
+    Converting each channel as soon as it is decoded keeps the short-lived
+    dicts from piling up, so the process does not grow to hold both forms.
+    """
+    if 'url' in data and 'name' in data:
+        return Channel.from_dict(data)
+    return data
+
+def channel_json_default(value):
+    """json.dumps default= hook for Channel objects."""
+    if isinstance(value, Channel):
+        return dict(value)
+    raise TypeError(f'Object of type {value.__class__.__name__} is not JSON serializable')
+
+class ChannelJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider that also encodes Channel objects."""
+    
+    @staticmethod
+    def default(value):
+        if isinstance(value, Channel):
+            return dict(value)
+        return DefaultJSONProvider.default(value)
+
+app.json = ChannelJSONProvider(app)
+
+def fsync_directory(path):
+    """Make renames in a directory durable (no-op where directories cannot be opened)."""
     try:
-        health_status = {
-            'status': 'healthy',
-            'timestamp': datetime.now().isoformat(),
-            'version': '2.0.0',
-            'server': 'gunicorn',
-            'app': 'iptv-m3u-sorter',
-            'checks': {
-                'flask': 'ok',
-                'routing': 'ok'
-            }
-        }
-        
-        # Optional filesystem checks
-        enable_fs_checks = os.environ.get('ENABLE_FS_HEALTH_CHECKS', 'false').lower() == 'true'
-        
-        if enable_fs_checks:
-            upload_dir = app.config.get('UPLOAD_FOLDER', 'uploads')
-            playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def write_json_atomic(path, data, fsync=False):
+    """Write JSON to a temporary file first, then rename for atomic operation.
+    
+    With fsync the file and the rename are on disk when this returns.
+    """
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'), default=channel_json_default)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temp_file, path)
+    if fsync:
+        fsync_directory(os.path.dirname(path) or '.')
+
+PERSIST_MODES = ('async', 'fsync', 'sync')
+
+def run_blocking(func, *args):
+    """Call func(*args) on a real OS thread if threading is gevent-patched.
+    
+    Under the gevent worker a Thread is a greenlet on the event loop, so file
+    writes in it would stall every other request; the hub's thread pool
+    runs them on a native thread while only the calling greenlet waits.
+    """
+    if gevent is not None and gevent.monkey.is_module_patched('threading'):
+        return gevent.get_hub().threadpool.apply(func, args)
+    return func(*args)
+
+class PersistenceQueue:
+    """Write-behind for a store: persist() runs on a background thread.
+    
+    The first change after a write opens a coalescing window of delay
+    seconds; every change within it is written by a single persist() call.
+    Failed writes are retried after the next window.
+    """
+    
+    def __init__(self, persist, delay):
+        self.persist = persist
+        self.delay = delay
+        self.condition = threading.Condition()
+        self.pending = False
+        self.writing = False
+        self.thread_pid = None
+    
+    def schedule(self):
+        """Note pending changes and wake the writer."""
+        with self.condition:
+            self.pending = True
+            # Threads do not survive a fork; start one per process
+            if self.thread_pid != os.getpid():
+                self.thread_pid = os.getpid()
+                threading.Thread(target=self.run, name='playlist-persistence', daemon=True).start()
+            self.condition.notify()
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
             
-            for directory in [upload_dir, playlists_dir]:
-                try:
-                    if os.path.exists(directory):
-                        health_status['checks'][f'{directory}_exists'] = 'ok'
-                        if os.access(directory, os.W_OK):
-                            health_status['checks'][f'{directory}_writable'] = 'ok'
-                        else:
-                            health_status['checks'][f'{directory}_writable'] = 'readonly'
-                    else:
-                        health_status['checks'][f'{directory}_exists'] = 'missing'
-                except OSError as e:
-                    health_status['checks'][f'{directory}_error'] = str(e)
-        else:
-            health_status['checks']['filesystem_checks'] = 'disabled'
-        
-        # Memory usage check
+            time.sleep(self.delay)
+            with self.condition:
+                # A flush() may be writing; whatever it leaves pending is written next
+                while self.writing:
+                    self.condition.wait()
+                if not self.pending:
+                    continue
+                self.pending = False
+                self.writing = True
+            self.write()
+    
+    def write(self):
+        """Run persist() for a caller that has set writing; failed writes stay pending."""
+        persisted = False
         try:
-            playlist_count = len(playlists)
-            named_playlist_count = len(named_playlists)
-            health_status['checks']['playlists_in_memory'] = playlist_count
-            health_status['checks']['named_playlists_in_memory'] = named_playlist_count
-        except Exception as e:
-            health_status['checks']['memory_check'] = f'error: {str(e)}'
-        
-        return health_status, 200
+            persisted = self.persist()
+        finally:
+            with self.condition:
+                self.writing = False
+                if not persisted:
+                    self.pending = True
+                self.condition.notify_all()
+        return persisted
+    
+    def flush(self):
+        """Write pending changes of this process now, after any write in progress.
         
-    except Exception as e:
-        app.logger.error(f"Health check failed: {str(e)}")
-        return {
-            'status': 'error',
-            'timestamp': datetime.now().isoformat(),
-            'error': str(e),
-            'app': 'iptv-m3u-sorter'
-        }, 200
+        Returns True on success.
+        """
+        with self.condition:
+            if self.thread_pid != os.getpid():
+                return True
+            while self.writing:
+                self.condition.wait()
+            if not self.pending:
+                return True
+            self.pending = False
+            self.writing = True
+        return self.write()
 
-@app.route('/ping-simple')
-def ping_simple():
-    """Ultra-simple health check that never fails"""
+def get_playlists_database():
+    """Get the path to the SQLite playlist database."""
+    database = app.config.get('PLAYLIST_DATABASE')
+    if database:
+        return database
+    
+    playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
+    ensure_directory_exists(playlists_dir)
+    return os.path.join(playlists_dir, 'playlists.db')
+
+def build_playlist_info(playlist_data):
+    """Playlist metadata without the channel list."""
     return {
-        'status': 'ok', 
-        'timestamp': datetime.now().isoformat(),
-        'app': 'iptv-m3u-sorter',
-        'version': '2.0.0'
-    }, 200
+        'id': playlist_data['id'],
+        'name': playlist_data.get('name', playlist_data.get('sanitized_name')),
+        'sanitized_name': playlist_data['sanitized_name'],
+        'channel_count': len(playlist_data.get('channels', [])),
+        'created_at': playlist_data.get('created_at'),
+        'updated_at': playlist_data.get('updated_at')
+    }
 
-# Input validation and sanitization
-def validate_m3u_content(content):
-    """Validate M3U file content for security"""
-    if not content:
-        return False, "Empty content"
-    
-    # Check file size
-    if len(content) > app.config['MAX_CONTENT_LENGTH']:
-        return False, "File too large"
-    
-    # Basic M3U validation
-    if not content.strip().startswith('#EXTM3U'):
-        return False, "Not a valid M3U file"
-    
-    # Check for potentially dangerous content
-    dangerous_patterns = ['<script', 'javascript:', 'data:text/html']
-    content_lower = content.lower()
-    for pattern in dangerous_patterns:
-        if pattern in content_lower:
-            return False, f"Potentially dangerous content detected: {pattern}"
+class PlaylistPatchError(ValueError):
+    """Raised when a batch of playlist operations is invalid."""
+
+class PlaylistVersionConflict(Exception):
+    """Raised when a patch is based on an outdated playlist version."""
     
-    return True, "Valid"
+    def __init__(self, current_version):
+        super().__init__(f"Playlist was changed in the meantime (current version {current_version})")
+        self.current_version = current_version
 
-def parse_m3u_content(content):
-    """Parse M3U file content and extract channel information."""
-    channels = []
-    lines = content.strip().split('\n')
+def get_patch_position(op, key, upper):
+    """Validated integer position 0 <= op[key] <= upper."""
+    value = op.get(key)
+    if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value <= upper:
+        raise PlaylistPatchError(f"{op.get('op')}: '{key}' must be a position between 0 and {upper}")
+    return value
+
+def apply_playlist_ops(channels, ops):
+    """Apply a batch of edit operations to a channel list and return the new list.
     
-    current_extinf = None
+    Positions refer to the list as left by the previous operation:
+      {"op": "move", "from": 3, "count": 2, "to": 10}  - move a range (to = index after removal)
+      {"op": "delete", "positions": [4, 7]}
+      {"op": "insert", "at": 0, "channels": [{...}]}
+      {"op": "update", "position": 5, "fields": {"name": "..."}}
+    The input list and its channels are not modified; untouched channels are
+    the same objects in the result, which lets backends persist only changes.
+    """
+    if not isinstance(ops, list) or not ops:
+        raise PlaylistPatchError("ops must be a non-empty list")
     
-    for line in lines:
-        line = line.strip()
+    channels = list(channels)
+    for op in ops:
+        if not isinstance(op, dict):
+            raise PlaylistPatchError("every op must be an object")
+        kind = op.get('op')
         
-        if line.startswith('#EXTINF:'):
-            current_extinf = line
-        elif line and not line.startswith('#') and current_extinf:
-            # Extract channel information from EXTINF line
-            channel_info = parse_extinf_line(current_extinf)
-            channel_info['url'] = line
-            channels.append(channel_info)
-            current_extinf = None
+        if kind == 'move':
+            start = get_patch_position(op, 'from', len(channels) - 1)
+            count = op.get('count', 1)
+            if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= len(channels) - start:
+                raise PlaylistPatchError("move: 'count' is out of range")
+            moved = channels[start:start + count]
+            del channels[start:start + count]
+            target = get_patch_position(op, 'to', len(channels))
+            channels[target:target] = moved
+        elif kind == 'delete':
+            positions = op.get('positions')
+            if not isinstance(positions, list) or not positions:
+                raise PlaylistPatchError("delete: 'positions' must be a non-empty list")
+            removed = {get_patch_position({'op': kind, 'position': position}, 'position', len(channels) - 1)
+                       for position in positions}
+            channels = [channel for position, channel in enumerate(channels) if position not in removed]
+        elif kind == 'insert':
+            target = get_patch_position(op, 'at', len(channels))
+            inserted = op.get('channels')
+            if not isinstance(inserted, list) or not all(isinstance(channel, dict) for channel in inserted):
+                raise PlaylistPatchError("insert: 'channels' must be a list of channel objects")
+            channels[target:target] = inserted
+        elif kind == 'update':
+            position = get_patch_position(op, 'position', len(channels) - 1)
+            fields = op.get('fields')
+            if not isinstance(fields, dict):
+                raise PlaylistPatchError("update: 'fields' must be an object")
+            channels[position] = dict(channels[position], **fields)
+        else:
+            raise PlaylistPatchError(f"Unknown op: {kind}")
     
     return channels
 
-def parse_extinf_line(extinf_line):
-    """Parse EXTINF line to extract channel name, group, and logo."""
-    # Example: #EXTINF:-1 tvg-name="ARD" tvg-logo="logo.png" group-title="German",ARD HD
-    
-    channel_info = {
-        'name': '',
-        'group': None,
-        'logo': None,
-        'tvg_name': None,
-        'tvg_id': None
-    }
+class PlaylistStore(ABC):
+    """Storage backend for saved playlists.
     
-    # Extract the channel name (after the last comma)
-    if ',' in extinf_line:
-        parts = extinf_line.rsplit(',', 1)
-        if len(parts) == 2:
-            channel_info['name'] = parts[1].strip()
+    Routes only need metadata to answer most requests (names, ETags, lists),
+    so backends hand out playlist info and channel lists separately.
+    """
     
-    # Extract attributes using regex
-    # group-title="..."
-    group_match = re.search(r'group-title="([^"]*)"', extinf_line)
-    if group_match:
-        channel_info['group'] = group_match.group(1)
+    backend = None
     
-    # tvg-logo="..."
-    logo_match = re.search(r'tvg-logo="([^"]*)"', extinf_line)
-    if logo_match:
-        channel_info['logo'] = logo_match.group(1)
+    def load(self):
+        """Prepare the store on startup."""
     
-    # tvg-name="..."
-    tvg_name_match = re.search(r'tvg-name="([^"]*)"', extinf_line)
-    if tvg_name_match:
-        channel_info['tvg_name'] = tvg_name_match.group(1)
+    def persist(self):
+        """Write pending changes to disk. Returns True on success."""
+        return True
     
-    # tvg-id="..."
-    tvg_id_match = re.search(r'tvg-id="([^"]*)"', extinf_line)
-    if tvg_id_match:
-        channel_info['tvg_id'] = tvg_id_match.group(1)
+    def flush(self):
+        """Write changes still queued for persistence now (e.g. on shutdown)."""
+        return True
     
-    return channel_info
-
-def sanitize_playlist_name(name):
-    """Sanitize playlist name for use in URLs."""
-    # Remove special characters and replace spaces with underscores
-    sanitized = re.sub(r'[^\w\s-]', '', name)
-    sanitized = re.sub(r'[-\s]+', '_', sanitized)
-    return sanitized.strip('_')
-
-def generate_m3u_content(channels):
-    """Generate M3U content from channels list."""
-    lines = ['#EXTM3U']
+    @abstractmethod
+    def get_info(self, sanitized_name):
+        """Return playlist info by sanitized name, or None."""
     
-    for channel in channels:
-        # Build EXTINF line
-        extinf_parts = ['#EXTINF:-1']
-        
-        if channel.get('tvg_id'):
-            extinf_parts.append(f'tvg-id="{channel["tvg_id"]}"')
-        
-        if channel.get('tvg_name'):
-            extinf_parts.append(f'tvg-name="{channel["tvg_name"]}"')
-        
-        if channel.get('logo'):
-            extinf_parts.append(f'tvg-logo="{channel["logo"]}"')
+    @abstractmethod
+    def get_info_by_id(self, playlist_id):
+        """Return playlist info by id, or None."""
+    
+    @abstractmethod
+    def get_channels(self, playlist_id):
+        """Return the channel list of a playlist."""
+    
+    @abstractmethod
+    def list_info(self):
+        """Return info of all saved playlists."""
+    
+    def get_channels_at(self, playlist_id, positions, version=None):
+        """Return the channels at positions of a playlist, in the given order.
         
-        if channel.get('group'):
-            extinf_parts.append(f'group-title="{channel["group"]}"')
+        Positions usually come from an index of one playlist version; with that
+        version given, PlaylistVersionConflict is raised if the playlist changed.
+        """
+        playlist_data = self.get_playlist(playlist_id)
+        if version is not None and playlist_data.get('updated_at') != version:
+            raise PlaylistVersionConflict(playlist_data.get('updated_at'))
+        channels = playlist_data['channels']
+        return [channels[position] for position in positions]
+    
+    def get_playlist(self, playlist_id):
+        """Return the full playlist (info fields plus channels)."""
+        info = self.get_info_by_id(playlist_id)
+        if info is None:
+            raise KeyError(playlist_id)
+        playlist_data = {key: value for key, value in info.items() if key != 'channel_count'}
+        playlist_data['channels'] = self.get_channels(playlist_id)
+        return playlist_data
+    
+    @abstractmethod
+    def save(self, playlist_data):
+        """Store a playlist, replacing one with the same sanitized name.
         
-        extinf_line = ' '.join(extinf_parts) + f',{channel["name"]}'
+        Returns True if the playlist was persisted to disk (or queued for it).
+        """
+    
+    @abstractmethod
+    def patch(self, playlist_id, base_version, ops, updated_at):
+        """Apply edit operations to a stored playlist in place (same id).
         
-        lines.append(extinf_line)
-        lines.append(channel['url'])
+        Raises PlaylistVersionConflict unless base_version is the current
+        updated_at. Returns the new playlist info.
+        """
     
-    return '\n'.join(lines)
-
-# Add cache buster to template context
-@app.context_processor
-def inject_cache_buster():
-    return {'cache_buster': str(int(time.time()))}
+    def count(self):
+        """Number of saved playlists."""
+        return len(self.list_info())
+    
+    def describe(self):
+        """Backend details for debug output."""
+        return {'storage_backend': self.backend}
 
-@app.route('/')
-def index():
-    """Main page for uploading and sorting playlists"""
+class JsonPlaylistStore(PlaylistStore):
+    """Playlists persisted as one JSON file per playlist plus an index.
+    
+    Startup reads only the small index, which answers listings, name checks
+    and ETags. Channel lists are loaded on first access and kept in an LRU
+    bounded by channel count. A save rewrites only the changed playlist's
+    file and the index, so its cost depends on that playlist alone. A patch
+    only appends its operations to <id>.delta.jsonl, which is replayed on
+    load and folded into the playlist file every JSON_DELTA_COMPACT_BATCHES.
+    
+    persist_mode decides when saves reach the disk: 'sync' writes (and
+    fsyncs) before save() returns; 'async' and 'fsync' only update memory and
+    leave the write to a PersistenceQueue, which coalesces bursts of saves
+    into one write. 'fsync' also fsyncs what it writes.
+    """
+    
+    backend = 'json'
+    
+    def __init__(self, max_cached_channels=None, persist_mode='sync', persist_delay=0):
+        if persist_mode not in PERSIST_MODES:
+            raise ValueError(f"Unknown persist mode: {persist_mode}")
+        self.index = {}
+        self.names = {}
+        self.loaded = OrderedDict()
+        self.loaded_channels = 0
+        self.max_cached_channels = max_cached_channels
+        self.dirty_ids = set()
+        self.removed_ids = set()
+        # Playlists whose delta log is due to be folded into their file
+        self.compact_ids = set()
+        # Signatures of the files each cached playlist was read from (or written to)
+        self.file_signatures = {}
+        # Playlists whose index entry this worker changed but has not merged into index.json yet
+        self.index_changed = set()
+        self.index_signature = None
+        self.delta_batches = {}
+        self.lock = threading.RLock()
+        # Serialises persist() calls, whose writes run outside self.lock
+        self.write_lock = threading.Lock()
+        # Serialises patch() calls, so greenlets of this worker wait here
+        # rather than blocking the whole process in flock()
+        self.patch_lock = threading.Lock()
+        self.persist_mode = persist_mode
+        self.fsync = persist_mode != 'async'
+        self.queue = PersistenceQueue(self.persist, persist_delay) if persist_mode != 'sync' else None
+    
+    def add(self, playlist_data):
+        """Put a playlist into the index and the loaded cache without persisting it."""
+        with self.lock:
+            self.index[playlist_data['id']] = build_playlist_info(playlist_data)
+            self.names[playlist_data['sanitized_name']] = playlist_data['id']
+            self.cache_playlist(playlist_data)
+    
+    def cache_playlist(self, playlist_data):
+        """Keep a loaded playlist (channels compacted), evicting least recently used ones over the channel cap.
+        
+        Returns the cached playlist.
+        """
+        playlist_data = dict(playlist_data, channels=compact_channels(playlist_data.get('channels', [])))
+        with self.lock:
+            self.uncache_playlist(playlist_data['id'])
+            self.loaded[playlist_data['id']] = playlist_data
+            self.loaded_channels += len(playlist_data.get('channels', []))
+            
+            if self.max_cached_channels is None:
+                return playlist_data
+            
+            # Playlists not yet written to disk must stay in memory
+            for playlist_id in list(self.loaded):
+                if self.loaded_channels <= self.max_cached_channels:
+                    break
+                if playlist_id not in self.dirty_ids and playlist_id != playlist_data['id']:
+                    self.uncache_playlist(playlist_id)
+        return playlist_data
+    
+    def uncache_playlist(self, playlist_id):
+        with self.lock:
+            playlist_data = self.loaded.pop(playlist_id, None)
+            if playlist_data is not None:
+                self.loaded_channels -= len(playlist_data.get('channels', []))
+    
+    def load_playlist(self, playlist_id):
+        """Return the full playlist, reading its file on first access."""
+        with self.lock:
+            playlist_data = self.loaded.get(playlist_id)
+            count_cache_lookup('playlist', playlist_data is not None)
+            if playlist_data is not None:
+                self.loaded.move_to_end(playlist_id)
+                return playlist_data
+            
+            if playlist_id not in self.index:
+                raise KeyError(playlist_id)
+            
+            return self.load_playlist_file(playlist_id)
+    
+    def load_playlist_file(self, playlist_id):
+        """Read a playlist from disk into the cache."""
+        playlist_data, batches, signatures = self.read_playlist_file(playlist_id)
+        with self.lock:
+            self.delta_batches[playlist_id] = batches
+            self.file_signatures[playlist_id] = signatures
+            return self.cache_playlist(playlist_data)
+    
+    def get_file_signatures(self, playlist_id):
+        """Signatures of a playlist's file and delta log."""
+        return (get_file_signature(get_playlist_data_file(playlist_id)),
+                get_file_signature(get_playlist_delta_file(playlist_id)))
+    
+    def read_playlist_file(self, playlist_id):
+        """Read a playlist file and replay its pending delta log.
+        
+        Returns the playlist, the number of replayed batches and the file
+        signatures taken before reading: if the files change meanwhile, they
+        no longer match and patch() reads them again.
+        """
+        signatures = self.get_file_signatures(playlist_id)
+        with open(get_playlist_data_file(playlist_id), 'r', encoding='utf-8') as f:
+            playlist_data = json.load(f, object_hook=channel_object_hook)
+        
+        batches = 0
+        delta_file = get_playlist_delta_file(playlist_id)
+        if os.path.exists(delta_file):
+            with open(delta_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        batch = json.loads(line)
+                    except ValueError:
+                        # Torn last line of an interrupted append
+                        break
+                    if batch['base'] != playlist_data.get('updated_at'):
+                        # Already folded into the file (compaction interrupted before the log was removed)
+                        continue
+                    playlist_data['channels'] = apply_playlist_ops(playlist_data['channels'], batch['ops'])
+                    playlist_data['updated_at'] = batch['updated_at']
+                    batches += 1
+        
+        return playlist_data, batches, signatures
+    
+    def load(self):
+        """Load the playlist index from disk, migrating a legacy playlists.json first."""
+        with self.lock:
+            self.index = {}
+            self.names = {}
+            self.loaded = OrderedDict()
+            self.loaded_channels = 0
+        
+        try:
+            index_file = get_playlists_index_file()
+            if not os.path.exists(index_file) and os.path.exists(get_playlists_file()):
+                self.migrate_legacy_file()
+                return
+            
+            if os.path.exists(index_file):
+                signature = get_file_signature(index_file)
+                self.merge_index(self.read_index(), signature)
+            else:
+                self.rebuild_index()
+            
+            if self.index:
+                app.logger.info(f"Loaded index of {len(self.index)} playlists from disk")
+            else:
+                app.logger.info("No existing playlists found, starting fresh")
+        except Exception as e:
+            app.logger.error(f"Error loading playlists: {e}")
+            self.index = {}
+            self.names = {}
+    
+    def rebuild_index(self):
+        """Recreate index.json from the playlist files on disk."""
+        data_dir = get_playlist_data_dir()
+        for name in sorted(os.listdir(data_dir)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                self.add(self.read_playlist_file(name[:-len('.json')])[0])
+            except (OSError, ValueError, KeyError) as e:
+                app.logger.error(f"Error loading playlist file {name}: {e}")
+        
+        if self.index:
+            self.merge_index(*self.write_index(self.list_info(), ()))
+            app.logger.info(f"Rebuilt playlist index from {len(self.index)} playlist files")
+    
+    def migrate_legacy_file(self):
+        """Split a legacy playlists.json into per-playlist files and keep it as a backup."""
+        playlists_file = get_playlists_file()
+        with open(playlists_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        # named_playlists holds the current version of every playlist
+        for playlist_data in data.get('named_playlists', {}).values():
+            self.dirty_ids.add(playlist_data['id'])
+            self.index_changed.add(playlist_data['id'])
+            self.add(playlist_data)
+        
+        if self.persist():
+            os.replace(playlists_file, playlists_file + '.migrated')
+            app.logger.info(f"Migrated {len(self.index)} playlists from {playlists_file}")
+    
+    def read_index(self):
+        """Read index.json as playlist id -> info (empty if it does not exist)."""
+        try:
+            with open(get_playlists_index_file(), 'r', encoding='utf-8') as f:
+                playlists = json.load(f).get('playlists', [])
+        except FileNotFoundError:
+            return {}
+        return {info['id']: info for info in playlists}
+    
+    def write_index(self, changed, removed_ids):
+        """Merge index entries into index.json. Returns the merged index and its file signature.
+        
+        Every gunicorn worker rewrites the same file, so it is read, merged
+        and replaced under a file lock: entries other workers wrote are kept,
+        only the given ones change. A playlist another worker saved under
+        one of these names is replaced, its files are removed.
+        """
+        index_file = get_playlists_index_file()
+        replaced_ids = []
+        with file_lock(index_file + '.lock'):
+            index = self.read_index()
+            for playlist_id in removed_ids:
+                index.pop(playlist_id, None)
+            names = {info['sanitized_name']: playlist_id for playlist_id, info in index.items()}
+            for info in changed:
+                other_id = names.get(info['sanitized_name'])
+                if other_id is not None and other_id != info['id']:
+                    index.pop(other_id)
+                    replaced_ids.append(other_id)
+                index[info['id']] = info
+                names[info['sanitized_name']] = info['id']
+            
+            write_json_atomic(index_file, {
+                'playlists': list(index.values()),
+                'saved_at': datetime.now().isoformat()
+            }, self.fsync)
+            signature = get_file_signature(index_file)
+        
+        for playlist_id in replaced_ids:
+            remove_playlist_files(playlist_id)
+        return index, signature
+    
+    def sync_index(self):
+        """Pick up index changes other workers wrote - one stat while there are none."""
+        index_file = get_playlists_index_file()
+        signature = get_file_signature(index_file)
+        if signature is None or signature == self.index_signature:
+            return
+        try:
+            index = self.read_index()
+        except (OSError, ValueError) as e:
+            app.logger.error(f"Error reading {index_file}: {e}")
+            return
+        self.merge_index(index, signature)
+    
+    def merge_index(self, index, signature):
+        """Take over an index read from disk, keeping this worker's changes not written yet."""
+        with self.lock:
+            for playlist_id in self.removed_ids:
+                index.pop(playlist_id, None)
+            names = {info['sanitized_name']: playlist_id for playlist_id, info in index.items()}
+            for playlist_id in self.index_changed:
+                info = self.index.get(playlist_id)
+                if info is None:
+                    continue
+                other_id = names.get(info['sanitized_name'])
+                if other_id is not None and other_id != playlist_id:
+                    index.pop(other_id)
+                index[playlist_id] = info
+                names[info['sanitized_name']] = playlist_id
+            
+            # Drop cached copies other workers replaced or changed
+            for playlist_id, playlist_data in list(self.loaded.items()):
+                info = index.get(playlist_id)
+                if info is None or info.get('updated_at') != playlist_data.get('updated_at'):
+                    self.uncache_playlist(playlist_id)
+                    self.delta_batches.pop(playlist_id, None)
+                    self.file_signatures.pop(playlist_id, None)
+            
+            self.index = index
+            self.names = names
+            self.index_signature = signature
+    
+    def request_persist(self):
+        """Write changes now in sync mode, otherwise queue them. Returns True unless a sync write failed."""
+        if self.queue is None:
+            return self.persist()
+        self.queue.schedule()
+        return True
+    
+    def flush(self):
+        if self.queue is None:
+            return True
+        return self.queue.flush()
+    
+    def persist(self):
+        """Save changed playlists to disk.
+        
+        The store lock is only held to snapshot the changes and to record
+        the outcome. Serialising and writing happen outside it, on a real OS
+        thread under gevent (run_blocking). Cached playlists are replaced on
+        every change, never modified, so the snapshot stays consistent.
+        Only the changed index entries are written; write_index() merges
+        them with what other workers wrote.
+        """
+        with self.write_lock:
+            started = time.perf_counter()
+            # Changes stay pending until written: dirty playlists are not evicted
+            # and merge_index() keeps index entries over an older index.json
+            with self.lock:
+                removed_ids = set(self.removed_ids)
+                compact_ids, self.compact_ids = self.compact_ids, set()
+                playlists = [
+                    (self.loaded[playlist_id], self.file_signatures.get(playlist_id, (None, None)))
+                    for playlist_id in self.dirty_ids if playlist_id in self.loaded
+                ]
+                changed = [self.index[playlist_id] for playlist_id in self.index_changed if playlist_id in self.index]
+            
+            try:
+                sizes, signatures, index, signature = run_blocking(
+                    self.write_files, playlists, compact_ids, changed, removed_ids
+                )
+            except Exception as e:
+                # Retry the failed writes with the next save
+                with self.lock:
+                    self.compact_ids |= compact_ids
+                app.logger.error(f"Error saving playlists: {e}")
+                return False
+            
+            with self.lock:
+                written = {playlist_data['id']: playlist_data for playlist_data, _ in playlists}
+                for playlist_id, playlist_data in written.items():
+                    if self.loaded.get(playlist_id) is playlist_data:
+                        self.file_signatures[playlist_id] = signatures[playlist_id]
+                        if signatures[playlist_id][1] is None:
+                            self.delta_batches[playlist_id] = 0
+                for playlist_id in compact_ids:
+                    self.delta_batches[playlist_id] = 0
+                self.dirty_ids = {
+                    playlist_id for playlist_id in self.dirty_ids
+                    if playlist_id in self.loaded and self.loaded[playlist_id] is not written.get(playlist_id)
+                }
+                
+                written = {info['id']: info for info in changed}
+                self.index_changed = {
+                    playlist_id for playlist_id in self.index_changed
+                    if playlist_id in self.index and self.index[playlist_id] is not written.get(playlist_id)
+                }
+                self.removed_ids -= removed_ids
+                for playlist_id in removed_ids:
+                    self.delta_batches.pop(playlist_id, None)
+                    self.file_signatures.pop(playlist_id, None)
+                self.merge_index(index, signature)
+        
+        for size in sizes:
+            playlist_save_bytes.labels(self.backend).observe(size)
+        playlist_save_seconds.labels(self.backend).observe(time.perf_counter() - started)
+        app.logger.info(f"Saved {len(playlists)} of {len(index)} playlists to disk")
+        return True
+    
+    def write_files(self, playlists, compact_ids, changed, removed_ids):
+        """Write playlist files, fold due delta logs, then write the index and drop replaced files.
+        
+        playlists holds (playlist, signatures of the files it was read from)
+        pairs. Returns the file sizes, the new signatures per written
+        playlist and what write_index() returns.
+        """
+        sizes = []
+        signatures = {}
+        for playlist_data, read_signatures in playlists:
+            playlist_id = playlist_data['id']
+            playlist_file = get_playlist_data_file(playlist_id)
+            with file_lock(get_playlist_lock_file(playlist_id)):
+                write_json_atomic(playlist_file, playlist_data, self.fsync)
+                # Patches logged since the playlist was read chain onto this
+                # version (older batches are skipped on replay), so keep them
+                delta_file = get_playlist_delta_file(playlist_id)
+                if get_file_signature(delta_file) == read_signatures[1]:
+                    remove_file(delta_file)
+                signatures[playlist_id] = self.get_file_signatures(playlist_id)
+            sizes.append(os.path.getsize(playlist_file))
+        
+        for playlist_id in compact_ids - signatures.keys() - removed_ids:
+            size = self.compact_playlist_file(playlist_id)
+            if size is not None:
+                sizes.append(size)
+        
+        index, signature = self.write_index(changed, removed_ids)
+        
+        for playlist_id in removed_ids:
+            remove_playlist_files(playlist_id)
+        return sizes, signatures, index, signature
+    
+    def compact_playlist_file(self, playlist_id):
+        """Fold a playlist's delta log into its file. Returns the file size, None if the playlist is gone.
+        
+        Reads the files under the playlist's lock rather than using the cached
+        copy, which misses batches other workers appended.
+        """
+        playlist_file = get_playlist_data_file(playlist_id)
+        with file_lock(get_playlist_lock_file(playlist_id)):
+            if not os.path.exists(playlist_file):
+                return None
+            playlist_data = self.read_playlist_file(playlist_id)[0]
+            write_json_atomic(playlist_file, playlist_data, self.fsync)
+            remove_file(get_playlist_delta_file(playlist_id))
+        return os.path.getsize(playlist_file)
+    
+    def get_info(self, sanitized_name):
+        self.sync_index()
+        playlist_id = self.names.get(sanitized_name)
+        return self.index.get(playlist_id) if playlist_id else None
+    
+    def get_info_by_id(self, playlist_id):
+        self.sync_index()
+        return self.index.get(playlist_id)
+    
+    def get_channels(self, playlist_id):
+        return self.load_playlist(playlist_id)['channels']
+    
+    def get_playlist(self, playlist_id):
+        return self.load_playlist(playlist_id)
+    
+    def list_info(self):
+        self.sync_index()
+        return list(self.index.values())
+    
+    def save(self, playlist_data):
+        with self.lock:
+            previous_id = self.names.get(playlist_data['sanitized_name'])
+            if previous_id and previous_id != playlist_data['id']:
+                self.index.pop(previous_id, None)
+                self.uncache_playlist(previous_id)
+                self.removed_ids.add(previous_id)
+            
+            self.dirty_ids.add(playlist_data['id'])
+            self.index_changed.add(playlist_data['id'])
+            self.compact_ids.discard(playlist_data['id'])
+            self.add(playlist_data)
+        return self.request_persist()
+    
+    def patch(self, playlist_id, base_version, ops, updated_at):
+        """Apply a batch of ops, logging it to the playlist's delta file.
+        
+        Every worker appends to the same log, so the version check and the
+        append happen under the playlist's file lock, against the playlist
+        on disk: the cached copy is read again if the files changed since.
+        """
+        with self.patch_lock, file_lock(get_playlist_lock_file(playlist_id)), self.lock:
+            playlist_data = self.load_playlist(playlist_id)
+            # A save not written yet is newer than the files
+            if playlist_id not in self.dirty_ids and \
+                    self.file_signatures.get(playlist_id) != self.get_file_signatures(playlist_id):
+                if not os.path.exists(get_playlist_data_file(playlist_id)):
+                    raise KeyError(playlist_id)
+                playlist_data = self.load_playlist_file(playlist_id)
+            
+            if playlist_data.get('updated_at') != base_version:
+                raise PlaylistVersionConflict(playlist_data.get('updated_at'))
+            
+            channels = apply_playlist_ops(playlist_data['channels'], ops)
+            
+            # Log first - memory only changes once the delta is on disk
+            delta_file = get_playlist_delta_file(playlist_id)
+            with open(delta_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({'base': base_version, 'updated_at': updated_at, 'ops': ops}, ensure_ascii=False,
+                                   separators=(',', ':')) + '\n')
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            
+            playlist_data = dict(playlist_data, channels=channels, updated_at=updated_at)
+            self.index[playlist_id] = build_playlist_info(playlist_data)
+            self.index_changed.add(playlist_id)
+            self.cache_playlist(playlist_data)
+            self.file_signatures[playlist_id] = (self.file_signatures.get(playlist_id, (None, None))[0],
+                                                 get_file_signature(delta_file))
+            self.delta_batches[playlist_id] = self.delta_batches.get(playlist_id, 0) + 1
+            
+            if self.delta_batches[playlist_id] >= JSON_DELTA_COMPACT_BATCHES:
+                self.compact_ids.add(playlist_id)
+            info = self.index[playlist_id]
+        
+        # Outside the store lock - persist() takes write_lock before it
+        self.request_persist()
+        return info
+    
+    def count(self):
+        self.sync_index()
+        return len(self.index)
+    
+    def describe(self):
+        index_file = get_playlists_index_file()
+        data_dir = get_playlist_data_dir()
+        playlist_files = [name for name in os.listdir(data_dir) if name.endswith('.json')]
+        info = {
+            'storage_backend': self.backend,
+            'playlists_index_path': index_file,
+            'playlists_index_exists': os.path.exists(index_file),
+            'playlists_directory': data_dir,
+            'playlists_directory_exists': os.path.exists(data_dir),
+            'playlist_file_count': len(playlist_files),
+            'playlist_files_size': sum(os.path.getsize(os.path.join(data_dir, name)) for name in playlist_files),
+            'loaded_playlists': len(self.loaded),
+            'loaded_channels': self.loaded_channels,
+            'max_cached_channels': self.max_cached_channels,
+            'persist_mode': self.persist_mode,
+            'pending_writes': len(self.dirty_ids | self.removed_ids | self.compact_ids | self.index_changed)
+        }
+        
+        # Index info if exists
+        if os.path.exists(index_file):
+            stat = os.stat(index_file)
+            info.update({
+                'index_modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+                'index_readable': os.access(index_file, os.R_OK),
+                'index_writable': os.access(index_file, os.W_OK)
+            })
+        
+        return info
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    sanitized_name TEXT NOT NULL UNIQUE,
+    channel_count INTEGER NOT NULL,
+    created_at TEXT,
+    updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS channels (
+    playlist_id TEXT NOT NULL REFERENCES playlists(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (playlist_id, position)
+) WITHOUT ROWID;
+"""
+
+SQLITE_POSITION_BATCH = 500  # positions per IN (...) query, below SQLite's variable limit
+
+class SQLitePlaylistStore(PlaylistStore):
+    """Playlists in a shared SQLite database (WAL mode).
+    
+    Every gunicorn worker reads the same database, so a save in one worker is
+    visible to all others on their next request without reloading anything.
+    """
+    
+    backend = 'sqlite'
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+    
+    def connect(self):
+        """Return this process' connection; connections are never shared across forks."""
+        if self.connection is None or self.connection_pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('PRAGMA foreign_keys=ON')
+            connection.executescript(SQLITE_SCHEMA)
+            self.connection = connection
+            self.connection_pid = os.getpid()
+        return self.connection
+    
+    def load(self):
+        """Create the schema and import existing JSON storage once."""
+        try:
+            with self.lock:
+                connection = self.connect()
+                count = connection.execute('SELECT COUNT(*) FROM playlists').fetchone()[0]
+            
+            has_json_data = (os.path.exists(get_playlists_index_file())
+                             or os.path.exists(get_playlists_file()))
+            if count == 0 and has_json_data:
+                json_store = JsonPlaylistStore()
+                json_store.load()
+                for info in json_store.list_info():
+                    self.save(json_store.get_playlist(info['id']))
+                app.logger.info(f"Imported {json_store.count()} playlists from JSON storage")
+            else:
+                app.logger.info(f"Using SQLite playlist store with {count} playlists: {self.path}")
+        except Exception as e:
+            app.logger.error(f"Error opening playlist database: {e}")
+    
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.connect().execute(sql, parameters).fetchall()
+    
+    @staticmethod
+    def row_to_info(row):
+        return dict(zip(('id', 'name', 'sanitized_name', 'channel_count', 'created_at', 'updated_at'), row))
+    
+    def get_info(self, sanitized_name):
+        rows = self.query(
+            'SELECT id, name, sanitized_name, channel_count, created_at, updated_at '
+            'FROM playlists WHERE sanitized_name = ?', (sanitized_name,)
+        )
+        return self.row_to_info(rows[0]) if rows else None
+    
+    def get_info_by_id(self, playlist_id):
+        rows = self.query(
+            'SELECT id, name, sanitized_name, channel_count, created_at, updated_at '
+            'FROM playlists WHERE id = ?', (playlist_id,)
+        )
+        return self.row_to_info(rows[0]) if rows else None
+    
+    def get_channels(self, playlist_id):
+        rows = self.query('SELECT data FROM channels WHERE playlist_id = ? ORDER BY position', (playlist_id,))
+        return [json.loads(row[0]) for row in rows]
+    
+    def get_channels_at(self, playlist_id, positions, version=None):
+        positions = list(positions)
+        wanted = sorted(set(positions))
+        rows = {}
+        
+        with self.lock:
+            connection = self.connect()
+            # One read transaction - the version check and all batches see the same snapshot
+            connection.execute('BEGIN')
+            try:
+                row = connection.execute('SELECT updated_at FROM playlists WHERE id = ?', (playlist_id,)).fetchone()
+                if row is None:
+                    raise KeyError(playlist_id)
+                if version is not None and row[0] != version:
+                    raise PlaylistVersionConflict(row[0])
+                
+                for start in range(0, len(wanted), SQLITE_POSITION_BATCH):
+                    batch = wanted[start:start + SQLITE_POSITION_BATCH]
+                    rows.update(connection.execute(
+                        f'SELECT position, data FROM channels WHERE playlist_id = ? '
+                        f'AND position IN ({", ".join("?" * len(batch))})',
+                        (playlist_id, *batch)
+                    ))
+            finally:
+                connection.execute('COMMIT')
+        
+        return [json.loads(rows[position]) for position in positions]
+    
+    def list_info(self):
+        rows = self.query(
+            'SELECT id, name, sanitized_name, channel_count, created_at, updated_at FROM playlists'
+        )
+        return [self.row_to_info(row) for row in rows]
+    
+    def save(self, playlist_data):
+        channels = playlist_data.get('channels', [])
+        started = time.perf_counter()
+        size = 0
+        
+        def iter_rows():
+            nonlocal size
+            for position, channel in enumerate(channels):
+                data = json.dumps(channel, ensure_ascii=False, default=channel_json_default)
+                size += len(data)
+                yield playlist_data['id'], position, data
+        
+        with self.lock:
+            connection = self.connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                # Replaced playlists lose their channel rows via ON DELETE CASCADE
+                connection.execute(
+                    'DELETE FROM playlists WHERE sanitized_name = ? OR id = ?',
+                    (playlist_data['sanitized_name'], playlist_data['id'])
+                )
+                connection.execute(
+                    'INSERT INTO playlists (id, name, sanitized_name, channel_count, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (playlist_data['id'], playlist_data.get('name', playlist_data['sanitized_name']),
+                     playlist_data['sanitized_name'], len(channels),
+                     playlist_data.get('created_at'), playlist_data.get('updated_at'))
+                )
+                connection.executemany(
+                    'INSERT INTO channels (playlist_id, position, data) VALUES (?, ?, ?)', iter_rows()
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        
+        playlist_save_seconds.labels(self.backend).observe(time.perf_counter() - started)
+        playlist_save_bytes.labels(self.backend).observe(size)
+        app.logger.info(f"Saved playlist '{playlist_data['sanitized_name']}' to {self.path}")
+        return True
+    
+    def patch(self, playlist_id, base_version, ops, updated_at):
+        with self.lock:
+            connection = self.connect()
+            # The write lock makes version check and update atomic across workers
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute('SELECT updated_at FROM playlists WHERE id = ?', (playlist_id,)).fetchone()
+                if row is None:
+                    raise KeyError(playlist_id)
+                if row[0] != base_version:
+                    raise PlaylistVersionConflict(row[0])
+                
+                previous = [json.loads(data) for (data,) in connection.execute(
+                    'SELECT data FROM channels WHERE playlist_id = ? ORDER BY position', (playlist_id,)
+                )]
+                channels = apply_playlist_ops(previous, ops)
+                
+                # Only rows whose channel changed (or moved) are written
+                connection.executemany(
+                    'INSERT OR REPLACE INTO channels (playlist_id, position, data) VALUES (?, ?, ?)',
+                    ((playlist_id, position, json.dumps(channel, ensure_ascii=False, default=channel_json_default))
+                     for position, channel in enumerate(channels)
+                     if position >= len(previous) or channel is not previous[position])
+                )
+                connection.execute(
+                    'DELETE FROM channels WHERE playlist_id = ? AND position >= ?', (playlist_id, len(channels))
+                )
+                connection.execute(
+                    'UPDATE playlists SET channel_count = ?, updated_at = ? WHERE id = ?',
+                    (len(channels), updated_at, playlist_id)
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        
+        return self.get_info_by_id(playlist_id)
+    
+    def count(self):
+        return self.query('SELECT COUNT(*) FROM playlists')[0][0]
+    
+    def describe(self):
+        info = {
+            'storage_backend': self.backend,
+            'database_path': self.path,
+            'database_exists': os.path.exists(self.path)
+        }
+        if os.path.exists(self.path):
+            info['database_size'] = os.path.getsize(self.path)
+        return info
+
+def create_playlist_store():
+    """Create the storage backend selected by PLAYLIST_STORAGE."""
+    backend = app.config.get('PLAYLIST_STORAGE', 'json').lower()
+    if backend == 'sqlite':
+        return SQLitePlaylistStore(get_playlists_database())
+    if backend != 'json':
+        app.logger.warning(f"Unknown PLAYLIST_STORAGE '{backend}', using json")
+    persist_mode = app.config.get('PERSIST_MODE', 'async').lower()
+    if persist_mode not in PERSIST_MODES:
+        app.logger.warning(f"Unknown PERSIST_MODE '{persist_mode}', using sync")
+        persist_mode = 'sync'
+    return JsonPlaylistStore(app.config.get('PLAYLIST_CACHE_MAX_CHANNELS'), persist_mode, app.config['PERSIST_DELAY'])
+
+playlist_store = create_playlist_store()
+
+def load_playlists():
+    """Load playlists from disk."""
+    playlist_store.load()
+
+def save_playlists_to_disk():
+    """Save playlists to disk."""
+    return playlist_store.persist()
+
+def flush_playlist_store():
+    """Write saves still queued by the write-behind persistence."""
+    return playlist_store.flush()
+
+# Queued writes must not be lost when a worker, the dev server or a CLI command exits
+atexit.register(flush_playlist_store)
+
+# Load existing playlists on startup
+load_playlists()
+
+# Enhanced health check endpoints
+@app.route('/health')
+@app.route('/healthz')
+@app.route('/ping')
+def health_check():
+    """Enhanced health check with proper error handling"""
+    try:
+        health_status = {
+            'status': 'healthy',
+            'timestamp': datetime.now().isoformat(),
+            'version': '2.0.0',
+            'server': 'gunicorn',
+            'app': 'iptv-m3u-sorter',
+            'checks': {
+                'flask': 'ok',
+                'routing': 'ok'
+            }
+        }
+        
+        # Optional filesystem checks
+        enable_fs_checks = os.environ.get('ENABLE_FS_HEALTH_CHECKS', 'false').lower() == 'true'
+        
+        if enable_fs_checks:
+            upload_dir = app.config.get('UPLOAD_FOLDER', 'uploads')
+            playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
+            
+            for directory in [upload_dir, playlists_dir]:
+                try:
+                    if os.path.exists(directory):
+                        health_status['checks'][f'{directory}_exists'] = 'ok'
+                        if os.access(directory, os.W_OK):
+                            health_status['checks'][f'{directory}_writable'] = 'ok'
+                        else:
+                            health_status['checks'][f'{directory}_writable'] = 'readonly'
+                    else:
+                        health_status['checks'][f'{directory}_exists'] = 'missing'
+                except OSError as e:
+                    health_status['checks'][f'{directory}_error'] = str(e)
+        else:
+            health_status['checks']['filesystem_checks'] = 'disabled'
+        
+        # Memory usage check
+        try:
+            playlist_count = playlist_store.count()
+            health_status['checks']['playlists_in_memory'] = playlist_count
+            health_status['checks']['named_playlists_in_memory'] = playlist_count
+            health_status['checks']['storage_backend'] = playlist_store.backend
+        except Exception as e:
+            health_status['checks']['memory_check'] = f'error: {str(e)}'
+        
+        return health_status, 200
+        
+    except Exception as e:
+        app.logger.error(f"Health check failed: {str(e)}")
+        return {
+            'status': 'error',
+            'timestamp': datetime.now().isoformat(),
+            'error': str(e),
+            'app': 'iptv-m3u-sorter'
+        }, 200
+
+@app.route('/ping-simple')
+def ping_simple():
+    """Ultra-simple health check that never fails"""
+    return {
+        'status': 'ok', 
+        'timestamp': datetime.now().isoformat(),
+        'app': 'iptv-m3u-sorter',
+        'version': '2.0.0'
+    }, 200
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics of all workers."""
+    if not METRICS_ENABLED:
+        return jsonify({
+            'success': False,
+            'error': 'Metriken sind deaktiviert (METRICS_ENABLED=false oder prometheus_client nicht installiert)'
+        }), 404
+    
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = prometheus_client.CollectorRegistry()
+        prometheus_multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), mimetype=prometheus_client.CONTENT_TYPE_LATEST)
+
+# Input validation and sanitization
+DANGEROUS_PATTERNS = ('<script', 'javascript:', 'data:text/html')
+DANGEROUS_PATTERN_BYTES = tuple(pattern.encode('ascii') for pattern in DANGEROUS_PATTERNS)
+
+# '#EXTM3U' after the ASCII whitespace str.strip() removes
+M3U_HEADER_PATTERN = re.compile(rb'[\t\n\x0b\x0c\r\x1c-\x1f ]*#EXTM3U')
+
+# Uploads are read in chunks of this size instead of all at once
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Generated M3U output is sent in chunks of roughly this size
+M3U_CHUNK_SIZE = 64 * 1024
+
+# Channels per NDJSON record when /api/upload streams its response
+UPLOAD_STREAM_BATCH_SIZE = 500
+
+class M3UValidationError(ValueError):
+    """Raised when streamed M3U content fails validation."""
+
+def validate_m3u_content(content):
+    """Validate M3U file content for security"""
+    if not content:
+        return False, "Empty content"
+    
+    # Check file size
+    if len(content) > app.config['MAX_CONTENT_LENGTH']:
+        return False, "File too large"
+    
+    # Basic M3U validation
+    if not content.strip().startswith('#EXTM3U'):
+        return False, "Not a valid M3U file"
+    
+    # Check for potentially dangerous content
+    content_lower = content.lower()
+    for pattern in DANGEROUS_PATTERNS:
+        if pattern in content_lower:
+            return False, f"Potentially dangerous content detected: {pattern}"
+    
+    return True, "Valid"
+
+def is_utf8(data):
+    """Whether data is valid UTF-8; ASCII content is recognized without decoding."""
+    if data.isascii():
+        return True
+    try:
+        str(data, 'utf-8')
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def validate_m3u_bytes(data):
+    """validate_m3u_content for raw UTF-8 content, checked without decoding it.
+    
+    The size limit counts bytes. Inputs the byte checks cannot decide (no
+    ASCII header, a possible dangerous pattern, invalid UTF-8) are decoded and
+    passed to validate_m3u_content, so results and messages stay the same.
+    """
+    start = len(codecs.BOM_UTF8) if data.startswith(codecs.BOM_UTF8) else 0
+    if len(data) == start:
+        return False, "Empty content"
+    
+    if len(data) - start > app.config['MAX_CONTENT_LENGTH']:
+        return False, "File too large"
+    
+    # Decoding drops invalid bytes, which may then join a pattern ('<scr\xffipt')
+    if not is_utf8(data):
+        return validate_m3u_content(data.decode('utf-8-sig', errors='ignore'))
+    
+    # One case-folded copy for all patterns; bytes.lower() only touches ASCII
+    content_lower = data.lower()
+    if (not M3U_HEADER_PATTERN.match(data, start)
+            or any(pattern in content_lower for pattern in DANGEROUS_PATTERN_BYTES)):
+        return validate_m3u_content(data.decode('utf-8-sig', errors='ignore'))
+    
+    return True, "Valid"
+
+def iter_m3u_lines(stream, chunk_size=UPLOAD_CHUNK_SIZE):
+    """Yield decoded lines from a binary stream without reading it into memory at once."""
+    # utf-8-sig drops a leading BOM; invalid bytes are ignored like before
+    decoder = codecs.getincrementaldecoder('utf-8-sig')(errors='ignore')
+    pending = ''
+    
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()
+        yield from lines
+    
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def iter_validated_m3u_lines(lines, max_size=None):
+    """Validate M3U lines incrementally and yield them stripped (CR included)."""
+    size = 0
+    has_header = False
+    
+    for line in lines:
+        size += len(line) + 1
+        if max_size and size > max_size:
+            raise M3UValidationError("File too large")
+        
+        line = line.strip()
+        if not has_header:
+            if not line:
+                continue
+            if not line.startswith('#EXTM3U'):
+                raise M3UValidationError("Not a valid M3U file")
+            has_header = True
+        
+        # Patterns cannot span lines, so checking line by line is equivalent
+        line_lower = line.lower()
+        for pattern in DANGEROUS_PATTERNS:
+            if pattern in line_lower:
+                raise M3UValidationError(f"Potentially dangerous content detected: {pattern}")
+        
+        yield line
+    
+    if not has_header:
+        raise M3UValidationError("Empty content")
+
+def iter_m3u_channels(lines):
+    """Yield channels from an iterable of M3U lines."""
+    current_extinf = None
+    
+    for line in lines:
+        line = line.strip()
+        
+        if line.startswith('#EXTINF:'):
+            current_extinf = line
+        elif line and not line.startswith('#') and current_extinf:
+            # Extract channel information from EXTINF line
+            channel_info = parse_extinf_line(current_extinf)
+            channel_info['url'] = line
+            yield channel_info
+            current_extinf = None
+
+def iter_m3u_stream(stream, max_size=None, timings=None):
+    """Validate and parse an uploaded M3U stream, yielding channels as they are read.
+    
+    With timings (RequestTimings of a profiled request) the stages are timed.
+    """
+    if timings is not None:
+        return iter_timed_m3u_stream(stream, max_size, timings)
+    return iter_m3u_channels(iter_validated_m3u_lines(iter_m3u_lines(stream), max_size))
+
+class TimedReader:
+    """Binary stream wrapper adding the time spent in read() to durations['read']."""
+    
+    def __init__(self, stream, durations):
+        self.stream = stream
+        self.durations = durations
+    
+    def read(self, size=-1):
+        started = time.perf_counter()
+        chunk = self.stream.read(size)
+        self.durations['read'] += time.perf_counter() - started
+        return chunk
+
+def iter_timed(iterable, durations, name):
+    """Yield from iterable, adding the time spent producing items to durations[name]."""
+    iterator = iter(iterable)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            durations[name] += time.perf_counter() - started
+        yield item
+
+def iter_timed_m3u_stream(stream, max_size, timings):
+    """iter_m3u_stream recording read/decode/validate/parse phases.
+    
+    Each stage is timed including the stages it pulls from; the phases are
+    the differences between neighbouring stages.
+    """
+    durations = defaultdict(float)
+    lines = iter_timed(iter_m3u_lines(TimedReader(stream, durations)), durations, 'lines')
+    validated = iter_timed(iter_validated_m3u_lines(lines, max_size), durations, 'validated')
+    try:
+        yield from iter_timed(iter_m3u_channels(validated), durations, 'channels')
+    finally:
+        timings.add('read', durations['read'])
+        timings.add('decode', durations['lines'] - durations['read'])
+        timings.add('validate', durations['validated'] - durations['lines'])
+        timings.add('parse', durations['channels'] - durations['validated'])
+
+def parse_m3u_content(content):
+    """Parse M3U file content and extract channel information."""
+    return list(iter_m3u_channels(content.strip().split('\n')))
+
+def is_blank_bytes(data):
+    """Whether data decodes to whitespace only (str.strip() semantics)."""
+    return not data.strip() or not str(data, 'utf-8', 'ignore').strip()
+
+def iter_m3u_bytes(data):
+    """Yield (end offset, channel) from raw UTF-8 M3U content.
+    
+    Same channels as parse_m3u_content on the decoded text, but EXTINF lines
+    are located with bytes.find, so comment lines and anything before the
+    first EXTINF are never decoded; only EXTINF and URL lines are. Content
+    that is not valid UTF-8 is decoded line by line instead.
+    """
+    if not is_utf8(data):
+        # Decoding drops invalid bytes, which may then join a marker ('#EXT\xffINF:')
+        yield from iter_decoded_m3u_bytes(data)
+        return
+    
+    view = memoryview(data)
+    find = data.find
+    end = len(data)
+    position = len(codecs.BOM_UTF8) if data.startswith(codecs.BOM_UTF8) else 0
+    
+    while True:
+        marker = find(b'#EXTINF:', position)
+        if marker == -1:
+            return
+        
+        line_start = data.rfind(b'\n', position, marker) + 1 or position
+        line_end = find(b'\n', marker)
+        if line_end == -1:
+            line_end = end
+        position = line_end + 1
+        
+        # '#EXTINF:' inside a line (e.g. in a URL) does not start a channel
+        if line_start != marker and not is_blank_bytes(data[line_start:marker]):
+            continue
+        extinf = str(view[line_start:line_end], 'utf-8', 'ignore').strip()
+        
+        # The URL is the next non-comment line; a later EXTINF replaces this one
+        while position < end:
+            line_start = position
+            line_end = find(b'\n', position)
+            if line_end == -1:
+                line_end = end
+            position = line_end + 1
+            
+            line = data[line_start:line_end].strip()
+            if line.startswith(b'#'):
+                if line.startswith(b'#EXTINF:'):
+                    extinf = str(view[line_start:line_end], 'utf-8', 'ignore').strip()
+                continue
+            
+            # Non-ASCII whitespace and invalid bytes only disappear when decoded
+            url = str(line, 'utf-8', 'ignore').strip()
+            if not url:
+                continue
+            if url.startswith('#'):
+                if url.startswith('#EXTINF:'):
+                    extinf = url
+                continue
+            
+            channel_info = parse_extinf_line(extinf)
+            channel_info['url'] = url
+            yield line_end, channel_info
+            break
+
+def iter_decoded_m3u_bytes(data):
+    """iter_m3u_bytes for invalid UTF-8: each line is decoded like the whole content would be."""
+    position = len(codecs.BOM_UTF8) if data.startswith(codecs.BOM_UTF8) else 0
+    
+    def iter_lines():
+        nonlocal position
+        # Lines split at b'\n' decode like the split decoded text - invalid bytes never join a newline
+        for line in data[position:].split(b'\n'):
+            position += len(line) + 1
+            yield str(line, 'utf-8', 'ignore')
+    
+    for channel in iter_m3u_channels(iter_lines()):
+        yield position - 1, channel
+
+def parse_m3u_bytes(data):
+    """Parse raw UTF-8 M3U content; the bytes counterpart of parse_m3u_content."""
+    return [channel for _, channel in iter_m3u_bytes(data)]
+
+# EXTINF attribute tokenizer. Quoted values are tokenized by splitting on '"';
+# the regex handles irregular lines (bare values like tvg-chno=5, stray text)
+EXTINF_ATTRIBUTE_PATTERN = re.compile(r'\s([\w-]+)="?((?<=")[^"]*|[^\s",]*)"?')
+
+def find_extinf_separator(extinf_line):
+    """Find the comma separating attributes from the channel name, skipping quoted commas."""
+    separator = extinf_line.find(',')
+    while separator != -1 and extinf_line.count('"', 0, separator) % 2:
+        separator = extinf_line.find(',', separator + 1)
+    
+    if separator == -1 and ',' in extinf_line:
+        # Unbalanced quotes - fall back to the last comma
+        separator = extinf_line.rfind(',')
+    
+    return separator
+
+def parse_extinf_line(extinf_line):
+    """Parse EXTINF line to extract channel name, group, logo and extra attributes."""
+    # Example: #EXTINF:-1 tvg-name="ARD" tvg-logo="logo.png" tvg-chno="1" group-title="German",ARD HD
+    
+    separator = find_extinf_separator(extinf_line)
+    if separator == -1:
+        attribute_part = extinf_line
+        name = ''
+    else:
+        attribute_part = extinf_line[:separator]
+        name = extinf_line[separator + 1:].strip()
+    
+    # Tokenize all key="value" pairs in one pass, keeping their order:
+    # '#EXTINF:-1 tvg-id="a" group-title="b"' -> ['#EXTINF:-1 tvg-id=', 'a', ' group-title=', 'b', '']
+    tokens = attribute_part.split('"')
+    values = tokens[1::2]
+    key_part = ' '.join(tokens[0:-1:2])
+    keys = key_part.replace('=', ' ').split()
+    
+    # Regular line: '#EXTINF:-1' followed by exactly one key= per quoted value
+    if (len(keys) == len(values) + 1 and key_part.count('=') == len(values)
+            and not tokens[-1].strip()):
+        attributes = dict(zip(keys[1:], values))
+    else:
+        attributes = dict(EXTINF_ATTRIBUTE_PATTERN.findall(attribute_part))
+    
+    # Known attributes get their own fields, everything else (tvg-chno,
+    # catchup, user-agent, ...) is kept in 'attributes' for export
+    pop = attributes.pop
+    return {
+        'name': name,
+        'group': pop('group-title', None),
+        'logo': pop('tvg-logo', None),
+        'tvg_name': pop('tvg-name', None),
+        'tvg_id': pop('tvg-id', None),
+        'attributes': attributes
+    }
+
+def sanitize_playlist_name(name):
+    """Sanitize playlist name for use in URLs."""
+    # Remove special characters and replace spaces with underscores
+    sanitized = re.sub(r'[^\w\s-]', '', name)
+    sanitized = re.sub(r'[-\s]+', '_', sanitized)
+    return sanitized.strip('_')
+
+def build_extinf_line(channel):
+    """Build the EXTINF line for a channel."""
+    extinf_parts = ['#EXTINF:-1']
+    
+    if channel.get('tvg_id'):
+        extinf_parts.append(f'tvg-id="{channel["tvg_id"]}"')
+    
+    if channel.get('tvg_name'):
+        extinf_parts.append(f'tvg-name="{channel["tvg_name"]}"')
+    
+    if channel.get('logo'):
+        extinf_parts.append(f'tvg-logo="{channel["logo"]}"')
+    
+    if channel.get('group'):
+        extinf_parts.append(f'group-title="{channel["group"]}"')
+    
+    # Preserve any additional attributes (tvg-chno, catchup, ...) in order
+    for key, value in (channel.get('attributes') or {}).items():
+        extinf_parts.append(f'{key}="{value}"')
+    
+    return ' '.join(extinf_parts) + f',{channel["name"]}'
+
+def iter_m3u_chunks(channels, chunk_size=M3U_CHUNK_SIZE):
+    """Generate M3U content from channels list as UTF-8 encoded chunks of about chunk_size bytes."""
+    pieces = ['#EXTM3U']
+    size = 0
+    # Rendering time only - the clock stops while a chunk is with the consumer
+    elapsed = 0
+    started = time.perf_counter()
+    
+    for channel in channels:
+        extinf_line = '\n' + build_extinf_line(channel)
+        url_line = '\n' + channel['url']
+        pieces.append(extinf_line)
+        pieces.append(url_line)
+        # Encoded length; only non-ASCII lines are encoded an extra time to measure it
+        size += len(extinf_line) if extinf_line.isascii() else len(extinf_line.encode('utf-8'))
+        size += len(url_line) if url_line.isascii() else len(url_line.encode('utf-8'))
+        
+        if size >= chunk_size:
+            chunk = ''.join(pieces).encode('utf-8')
+            elapsed += time.perf_counter() - started
+            yield chunk
+            started = time.perf_counter()
+            pieces = []
+            size = 0
+    
+    if pieces:
+        chunk = ''.join(pieces).encode('utf-8')
+        elapsed += time.perf_counter() - started
+        yield chunk
+    
+    m3u_generate_seconds.observe(elapsed)
+
+def generate_m3u_content(channels):
+    """Generate M3U content from channels list (the text of iter_m3u_chunks)."""
+    started = time.perf_counter()
+    lines = ['#EXTM3U']
+    for channel in channels:
+        lines.append(build_extinf_line(channel))
+        lines.append(channel['url'])
+    content = '\n'.join(lines)
+    m3u_generate_seconds.observe(time.perf_counter() - started)
+    return content
+
+# Template sorting - mirrors createChannelSignature/applySortingTemplate in static/js/app.js
+SIGNATURE_WHITESPACE_PATTERN = re.compile(r'\s+')
+SIGNATURE_BRACKETS_PATTERN = re.compile(r'[\[\]()]')
+SIGNATURE_QUALITY_PATTERN = re.compile(r'\s*(hd|4k|fhd|uhd)\s*', re.IGNORECASE)
+SIGNATURE_COUNTRY_PATTERN = re.compile(r'\s*(de|ger|germany)\s*', re.IGNORECASE)
+
+def create_channel_signature(channel):
+    """Create the signature used to match a channel against template entries."""
+    name = (channel.get('name') or '').lower().strip()
+    url = (channel.get('url') or '').lower().strip()
+    
+    # Normalize names (remove common variations)
+    normalized_name = SIGNATURE_WHITESPACE_PATTERN.sub(' ', name)
+    normalized_name = SIGNATURE_BRACKETS_PATTERN.sub('', normalized_name)
+    normalized_name = SIGNATURE_QUALITY_PATTERN.sub('', normalized_name)
+    normalized_name = SIGNATURE_COUNTRY_PATTERN.sub('', normalized_name).strip()
+    
+    return {
+        'name': normalized_name,
+        'url': url,
+        'originalName': channel.get('name')
+    }
+
+def create_sorting_template(template_name, channels):
+    """Create a sorting template from an ordered channel list."""
+    return {
+        'name': template_name,
+        'created': datetime.now().isoformat(),
+        'channels': [{
+            'position': index + 1,
+            'signature': create_channel_signature(channel),
+            'category': channel.get('category') or 'General'
+        } for index, channel in enumerate(channels)]
+    }
+
+def apply_sorting_template(channels, template):
+    """Sort channels by a template in linear time.
+    
+    Returns (sorted_channels, results) with the same matched / new_channels /
+    duplicates / not_found classification as the browser. A channel matched by
+    several template entries is only placed once.
+    """
+    results = {
+        'matched': [],
+        'new_channels': [],
+        'duplicates': [],
+        'not_found': []
+    }
+    
+    # Map signature key -> index of the first channel with that signature
+    channel_map = {}
+    for index, channel in enumerate(channels):
+        signature = create_channel_signature(channel)
+        key = f"{signature['name']}|{signature['url']}"
+        
+        if key in channel_map:
+            results['duplicates'].append({
+                'name': channel.get('name'),
+                'original_index': index,
+                'duplicate_index': channel_map[key]
+            })
+        else:
+            channel_map[key] = index
+    
+    # Step 1: Exact matches into their template positions
+    sorted_channels = [None] * len(channels)
+    placed = set()
+    
+    for template_channel in template.get('channels', []):
+        signature = template_channel.get('signature') or {}
+        key = f"{signature.get('name')}|{signature.get('url')}"
+        position = template_channel.get('position', 0)
+        index = channel_map.get(key)
+        
+        if index is None:
+            # Channel in template but not in current list
+            results['not_found'].append({
+                'name': signature.get('originalName'),
+                'position': position
+            })
+        elif index in placed or not 0 < position <= len(sorted_channels):
+            continue
+        elif sorted_channels[position - 1] is None:
+            sorted_channels[position - 1] = channels[index]
+            placed.add(index)
+            results['matched'].append({
+                'name': channels[index].get('name'),
+                'template_position': position,
+                'actual_position': position
+            })
+        else:
+            # Position already taken - the channel is placed as a new one below
+            results['new_channels'].append({
+                'name': channels[index].get('name'),
+                'reason': 'position_conflict',
+                'wanted_position': position
+            })
+    
+    # Step 2: Insert unmatched channels in free positions, in their original order
+    next_free_position = 0
+    for index, channel in enumerate(channels):
+        if index in placed:
+            continue
+        
+        while next_free_position < len(sorted_channels) and sorted_channels[next_free_position] is not None:
+            next_free_position += 1
+        
+        if next_free_position < len(sorted_channels):
+            sorted_channels[next_free_position] = channel
+            reason = 'new_channel'
+            position = next_free_position + 1
+        else:
+            # Append at end if all positions taken
+            sorted_channels.append(channel)
+            reason = 'appended'
+            position = len(sorted_channels)
+        
+        results['new_channels'].append({
+            'name': channel.get('name'),
+            'reason': reason,
+            'position': position
+        })
+    
+    return [channel for channel in sorted_channels if channel is not None], results
+
+def get_templates_file():
+    """Get the path to the server-side sorting template storage."""
+    playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
+    ensure_directory_exists(playlists_dir)
+    return os.path.join(playlists_dir, 'templates.json')
+
+templates_lock = threading.Lock()
+
+def load_templates():
+    """Load sorting templates (name -> template). Read on every call so all workers agree."""
+    templates_file = get_templates_file()
+    if not os.path.exists(templates_file):
+        return {}
+    
+    try:
+        with open(templates_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('templates', {})
+    except (OSError, ValueError) as e:
+        app.logger.error(f"Error loading templates: {e}")
+        return {}
+
+def update_templates(name, template=None):
+    """Store (or with template=None delete) one sorting template."""
+    with templates_lock:
+        templates = load_templates()
+        if template is None:
+            templates.pop(name, None)
+        else:
+            templates[name] = template
+        write_json_atomic(get_templates_file(), {
+            'templates': templates,
+            'saved_at': datetime.now().isoformat()
+        })
+    return templates
+
+def resort_saved_playlist(sanitized_name, template):
+    """Sort a saved playlist by a template and save the result as a new version."""
+    playlist_info = playlist_store.get_info(sanitized_name)
+    if not playlist_info:
+        raise KeyError(sanitized_name)
+    
+    playlist_data = dict(playlist_store.get_playlist(playlist_info['id']))
+    sorted_channels, results = apply_sorting_template(playlist_data['channels'], template)
+    
+    playlist_data['channels'] = sorted_channels
+    playlist_data['updated_at'] = datetime.now().isoformat()
+    store_playlist(playlist_data)
+    return playlist_data, results
+
+# Rule sets - declarative bulk edits applied server-side. A rule set can be
+# attached to a playlist; subscription refreshes then apply it before saving
+RULE_TYPES = ('rename', 'group', 'drop', 'logo')
+RULE_FIELDS = ('name', 'group', 'logo', 'tvg_name', 'tvg_id', 'url')
+RULE_SET_CACHE_SIZE = 32
+RULE_PATTERN_MAX_LENGTH = 200
+# Characters that make a pattern more than a literal substring
+RULE_PATTERN_METACHARACTERS = frozenset('.^$*+?{}[]\\|()')
+DROP_CHANNEL = object()
+
+class RuleSetError(ValueError):
+    """Raised when a rule set cannot be compiled."""
+
+class RuleTimeoutError(RuleSetError):
+    """Raised when applying a rule set takes longer than RULE_TIMEOUT."""
+
+def apply_rule_set_in_child(connection, rules, channels):
+    """Child process side of RuleSet.apply(): send back the result, unchanged channels as positions."""
+    try:
+        positions = {id(channel): position for position, channel in enumerate(channels)}
+        result, changes = RuleSet(rules).apply_inline(channels)
+        connection.send(([positions.get(id(channel), channel) for channel in result], changes))
+    except Exception as e:
+        connection.send(e)
+    finally:
+        connection.close()
+
+def apply_rule_set_isolated(rules, channels, timeout):
+    """Apply rules in a child process that is killed after timeout seconds.
+    
+    Whether a regex backtracks catastrophically cannot be told from the
+    pattern reliably, so user patterns run where they can be stopped.
+    """
+    context = multiprocessing.get_context()
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=apply_rule_set_in_child, args=(sender, rules, channels), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            raise RuleTimeoutError(f"rule set did not finish within {timeout:g} seconds, simplify its patterns")
+        result = receiver.recv()
+    except EOFError:
+        raise RuleSetError("rule set process exited unexpectedly") from None
+    finally:
+        receiver.close()
+        if process.is_alive():
+            process.kill()
+        process.join()
+    
+    if isinstance(result, Exception):
+        raise result
+    result, changes = result
+    return [channels[item] if isinstance(item, int) else item for item in result], changes
+
+class RuleSet:
+    """Compiled rule set. apply() runs every rule over a channel list in one pass.
+    
+    Rules are applied in order to each channel:
+    
+        {"type": "rename", "pattern": "\\s*\\(720p\\)", "replace": ""}
+        {"type": "group", "map": {"DE | News": "Nachrichten"}}
+        {"type": "group", "pattern": "Sport", "group": "Sport"}
+        {"type": "drop", "pattern": "\\[Geo-blocked\\]"}
+        {"type": "logo", "map": {"ard.de": "https://example.com/ard.png"}}
+        {"type": "logo", "pattern": "^Das Erste", "logo": "https://example.com/ard.png"}
+    
+    Patterns are regexes searched in "field" (default name; group and logo
+    maps look up the group / tvg_id), case-insensitive with "ignore_case":
+    true, and limited to RULE_PATTERN_MAX_LENGTH characters. A rule set
+    with any pattern beyond a literal substring is applied in a child
+    process that is killed after RULE_TIMEOUT seconds (RuleTimeoutError).
+    Renamed values are stripped. A dropped channel skips the remaining rules.
+    """
+    
+    def __init__(self, rules):
+        if not isinstance(rules, list) or not rules:
+            raise RuleSetError("rules must be a non-empty list")
+        self.rules = rules
+        self.operations = [self.compile_rule(index, rule) for index, rule in enumerate(rules, 1)]
+        self.isolated = any(
+            not (rule['type'] in ('group', 'logo') and rule.get('map') is not None)
+            and not RULE_PATTERN_METACHARACTERS.isdisjoint(rule['pattern'])
+            for rule in rules
+        )
+    
+    @staticmethod
+    def compile_rule(index, rule):
+        """Return (rule type, source field, target field, function of the source value).
+        
+        The function returns the new target value, DROP_CHANNEL or None for no change.
+        """
+        if not isinstance(rule, dict) or rule.get('type') not in RULE_TYPES:
+            raise RuleSetError(f"rule {index}: type must be one of {', '.join(RULE_TYPES)}")
+        rule_type = rule['type']
+        target = {'rename': rule.get('field', 'name'), 'group': 'group', 'logo': 'logo'}.get(rule_type)
+        
+        mapping = rule.get('map')
+        if rule_type in ('group', 'logo') and mapping is not None:
+            if not isinstance(mapping, dict):
+                raise RuleSetError(f"rule {index}: map must be an object")
+            field = rule.get('field', 'group' if rule_type == 'group' else 'tvg_id')
+            function = mapping.get
+        else:
+            source = rule.get('pattern') or ''
+            if not isinstance(source, str) or not source:
+                raise RuleSetError(f"rule {index}: pattern is required")
+            if len(source) > RULE_PATTERN_MAX_LENGTH:
+                raise RuleSetError(f"rule {index}: pattern is longer than {RULE_PATTERN_MAX_LENGTH} characters")
+            flags = re.IGNORECASE if rule.get('ignore_case') else 0
+            try:
+                pattern = re.compile(source, flags)
+            except re.error as e:
+                raise RuleSetError(f"rule {index}: invalid pattern: {e}") from None
+            field = rule.get('field', 'name')
+            
+            if rule_type == 'rename':
+                replace = rule.get('replace', '')
+                
+                def function(value):
+                    # Unmatched values are left alone, stray whitespace included
+                    new_value, count = pattern.subn(replace, value)
+                    return new_value.strip() if count else None
+            else:
+                value = DROP_CHANNEL if rule_type == 'drop' else rule.get(rule_type)
+                if not isinstance(value, str) and value is not DROP_CHANNEL:
+                    raise RuleSetError(f"rule {index}: {rule_type} is required")
+                function = lambda source, value=value: value if pattern.search(source) else None
+        
+        if field not in RULE_FIELDS or (target is not None and target not in RULE_FIELDS):
+            raise RuleSetError(f"rule {index}: field must be one of {', '.join(RULE_FIELDS)}")
+        return rule_type, field, target, function
+    
+    def apply(self, channels):
+        """Return (channels, changes per rule type); the input channels are not modified."""
+        if self.isolated:
+            return run_blocking(apply_rule_set_isolated, self.rules, channels, app.config['RULE_TIMEOUT'])
+        return self.apply_inline(channels)
+    
+    def apply_inline(self, channels):
+        changes = dict.fromkeys(RULE_TYPES, 0)
+        # Repeated values (groups, tvg-ids, ...) are only evaluated once per rule
+        operations = [
+            (rule_type, field, target, function, {} if field in CHANNEL_INTERNED_FIELDS else None)
+            for rule_type, field, target, function in self.operations
+        ]
+        result = []
+        
+        for channel in channels:
+            current = channel
+            for rule_type, field, target, function, memo in operations:
+                value = current.get(field)
+                if not isinstance(value, str):
+                    continue
+                if memo is None:
+                    new_value = function(value)
+                elif value in memo:
+                    new_value = memo[value]
+                else:
+                    new_value = memo[value] = function(value)
+                
+                if new_value is None or new_value == current.get(target):
+                    continue
+                changes[rule_type] += 1
+                if new_value is DROP_CHANNEL:
+                    break
+                if current is channel:
+                    current = dict(channel)
+                current[target] = new_value
+            else:
+                result.append(current)
+        
+        return result, changes
+
+compiled_rule_sets = OrderedDict()
+compiled_rule_sets_lock = threading.Lock()
+
+def compile_rule_set(rule_set):
+    """Compile a rule set, reusing the compiled form while its rules are unchanged."""
+    key = json.dumps(rule_set.get('rules'), sort_keys=True)
+    with compiled_rule_sets_lock:
+        compiled = compiled_rule_sets.get(key)
+        if compiled is not None:
+            compiled_rule_sets.move_to_end(key)
+            return compiled
+    
+    compiled = RuleSet(rule_set.get('rules'))
+    with compiled_rule_sets_lock:
+        compiled_rule_sets[key] = compiled
+        while len(compiled_rule_sets) > RULE_SET_CACHE_SIZE:
+            compiled_rule_sets.popitem(last=False)
+    return compiled
+
+def get_rules_file():
+    """Get the path to the rule set storage."""
+    playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
+    ensure_directory_exists(playlists_dir)
+    return os.path.join(playlists_dir, 'rules.json')
+
+rules_lock = threading.Lock()
+
+def load_rules():
+    """Load rule sets (name -> rule set) and attachments (sanitized playlist name -> rule set name)."""
+    rules_file = get_rules_file()
+    if not os.path.exists(rules_file):
+        return {}, {}
+    
+    try:
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data.get('rule_sets', {}), data.get('playlists', {})
+    except (OSError, ValueError) as e:
+        app.logger.error(f"Error loading rule sets: {e}")
+        return {}, {}
+
+def write_rules(rule_sets, attachments):
+    write_json_atomic(get_rules_file(), {
+        'rule_sets': rule_sets,
+        'playlists': attachments,
+        'saved_at': datetime.now().isoformat()
+    })
+
+def update_rule_set(name, rule_set=None):
+    """Store (or with rule_set=None delete and detach) one rule set."""
+    with rules_lock, file_lock(get_rules_file() + '.lock'):
+        rule_sets, attachments = load_rules()
+        if rule_set is None:
+            rule_sets.pop(name, None)
+            attachments = {playlist: attached for playlist, attached in attachments.items() if attached != name}
+        else:
+            rule_sets[name] = rule_set
+        write_rules(rule_sets, attachments)
+
+def attach_rule_set(sanitized_name, rule_set_name=None):
+    """Attach a rule set to a playlist (rule_set_name=None detaches)."""
+    with rules_lock, file_lock(get_rules_file() + '.lock'):
+        rule_sets, attachments = load_rules()
+        if rule_set_name is None:
+            attachments.pop(sanitized_name, None)
+        else:
+            attachments[sanitized_name] = rule_set_name
+        write_rules(rule_sets, attachments)
+
+def get_playlist_rule_set(sanitized_name):
+    """The rule set attached to a playlist, or None."""
+    rule_sets, attachments = load_rules()
+    return rule_sets.get(attachments.get(sanitized_name))
+
+def apply_rules_to_saved_playlist(sanitized_name, rule_set):
+    """Apply a rule set to a saved playlist and save the result as a new version."""
+    playlist_info = playlist_store.get_info(sanitized_name)
+    if not playlist_info:
+        raise KeyError(sanitized_name)
+    
+    playlist_data = dict(playlist_store.get_playlist(playlist_info['id']))
+    channels, changes = compile_rule_set(rule_set).apply(playlist_data['channels'])
+    
+    # Nothing changed - keep the version (and its cached output)
+    if any(changes.values()):
+        playlist_data['channels'] = channels
+        playlist_data['updated_at'] = datetime.now().isoformat()
+        store_playlist(playlist_data)
+    return playlist_data, changes
+
+# Search - trigram index over the searchable fields of a saved playlist
+SEARCH_FIELDS = ('name', 'group', 'tvg_id', 'tvg_name')
+SEARCH_DEFAULT_LIMIT = 100
+SEARCH_MAX_LIMIT = 1000
+SEARCH_VERSION_ATTEMPTS = 3  # searches of a playlist patched while its page is read
+
+class PlaylistSearchIndex:
+    """Inverted trigram index of one playlist version.
+    
+    A query term matches a channel if it is a substring of one of the
+    SEARCH_FIELDS (case-insensitive), like the browser filter. Terms of at
+    least three characters are answered from the rarest trigram's postings
+    and verified; shorter terms fall back to scanning the lowered texts.
+    """
+    
+    def __init__(self, channels):
+        self.texts = []
+        postings = defaultdict(list)
+        groups = defaultdict(list)
+        
+        for position, channel in enumerate(channels):
+            # Fields joined by newlines - query terms never contain one
+            text = '\n'.join([str(channel.get(field) or '') for field in SEARCH_FIELDS]).lower()
+            self.texts.append(text)
+            groups[channel.get('group') or ''].append(position)
+            
+            for ngram in set(map(''.join, zip(text, text[1:], text[2:]))):
+                postings[ngram].append(position)
+        
+        # Compact position lists (4 bytes per entry)
+        self.postings = {ngram: array('I', positions) for ngram, positions in postings.items()}
+        self.groups = {group: array('I', positions) for group, positions in groups.items()}
+    
+    def __len__(self):
+        return len(self.texts)
+    
+    def search(self, query='', group=None):
+        """Return matching channel positions in playlist order."""
+        terms = query.lower().split()
+        
+        if group is not None:
+            candidates = self.groups.get(group, ())
+        else:
+            candidates = None
+        
+        # Narrow by the rarest trigram of all terms before verifying
+        rarest = None
+        for term in terms:
+            for i in range(len(term) - 2):
+                posting = self.postings.get(term[i:i + 3])
+                if posting is None:
+                    return []
+                if rarest is None or len(posting) < len(rarest):
+                    rarest = posting
+        
+        if rarest is not None:
+            if candidates is None:
+                candidates = rarest
+            else:
+                # Walk the shorter list, probe the longer one
+                shorter, longer = sorted((rarest, candidates), key=len)
+                longer = set(longer)
+                candidates = [p for p in shorter if p in longer]
+        elif candidates is None:
+            candidates = range(len(self.texts))
+        
+        if not terms:
+            return list(candidates)
+        
+        texts = self.texts
+        return [p for p in candidates if all(term in texts[p] for term in terms)]
+
+class PlaylistGroupIndex:
+    """Group and tvg-id index of one playlist version for filtered views.
+    
+    Groups map to their channel positions; tvg-ids are kept sorted next to
+    their positions and found by bisection. A selection costs time in the
+    number of matching channels, not the playlist size.
+    """
+    
+    def __init__(self, channels):
+        groups = defaultdict(list)
+        group_numbers = {}
+        self.group_numbers = array('I')
+        tvg_ids = []
+        
+        for position, channel in enumerate(channels):
+            group = channel.get('group') or ''
+            groups[group].append(position)
+            self.group_numbers.append(group_numbers.setdefault(group, len(group_numbers)))
+            if channel.get('tvg_id'):
+                tvg_ids.append((channel['tvg_id'], position))
+        
+        self.groups = {group: array('I', positions) for group, positions in groups.items()}
+        self.group_number = group_numbers
+        tvg_ids.sort()
+        self.tvg_ids = [tvg_id for tvg_id, _ in tvg_ids]
+        self.tvg_id_positions = array('I', [position for _, position in tvg_ids])
+    
+    def __len__(self):
+        return len(self.group_numbers)
+    
+    def select(self, groups=(), exclude_groups=(), tvg_ids=()):
+        """Iterate positions, in playlist order, of channels in one of groups (default:
+        any group) and with one of tvg_ids (if given), except those in exclude_groups."""
+        excluded = set(exclude_groups)
+        names = [
+            name for name in (dict.fromkeys(groups) if groups else self.groups)
+            if name not in excluded and name in self.groups
+        ]
+        
+        if tvg_ids:
+            positions = set()
+            for tvg_id in tvg_ids:
+                positions.update(self.tvg_id_positions[
+                    bisect_left(self.tvg_ids, tvg_id):bisect_right(self.tvg_ids, tvg_id)
+                ])
+            allowed = {self.group_number[name] for name in names}
+            return [position for position in sorted(positions) if self.group_numbers[position] in allowed]
+        
+        if len(names) == 1:
+            return iter(self.groups[names[0]])
+        return heapq.merge(*[self.groups[name] for name in names])
+
+class PlaylistIndexCache:
+    """LRU of playlist indexes keyed by (playlist id, updated_at), bounded by channel count."""
+    
+    def __init__(self, max_channels, index_class, name):
+        self.max_channels = max_channels
+        self.index_class = index_class
+        self.name = name
+        self.entries = OrderedDict()
+        self.total_channels = 0
+        self.lock = threading.Lock()
+    
+    def get(self, playlist_info):
+        """Return the index of a playlist version, building it on a miss."""
+        key = (playlist_info['id'], playlist_info.get('updated_at'))
+        with self.lock:
+            index = self.entries.get(key)
+            if index is not None:
+                self.entries.move_to_end(key)
+        count_cache_lookup(self.name, index is not None)
+        if index is not None:
+            return index
+        
+        return self.build(playlist_info, playlist_store.get_channels(playlist_info['id']))
+    
+    def build(self, playlist_info, channels):
+        """Index channels of a playlist version and cache the result.
+        
+        An index larger than the whole cap is returned without being cached.
+        """
+        index = self.index_class(channels)
+        key = (playlist_info['id'], playlist_info.get('updated_at'))
+        
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_channels -= len(previous)
+            if len(index) > self.max_channels:
+                return index
+            
+            self.entries[key] = index
+            self.total_channels += len(index)
+            while self.total_channels > self.max_channels:
+                _, evicted = self.entries.popitem(last=False)
+                self.total_channels -= len(evicted)
+        return index
+    
+    def invalidate(self, playlist_id):
+        """Drop every index of a playlist."""
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == playlist_id]:
+                self.total_channels -= len(self.entries.pop(key))
+
+search_index_cache = PlaylistIndexCache(app.config['SEARCH_INDEX_MAX_CHANNELS'], PlaylistSearchIndex, 'search')
+group_index_cache = PlaylistIndexCache(app.config['GROUP_INDEX_MAX_CHANNELS'], PlaylistGroupIndex, 'group')
+
+def store_playlist(playlist_data, replaced_id=None):
+    """Save a new playlist version, dropping caches of the replaced one.
+    
+    The group index is cheap and built right away for filtered serves; the
+    search index (seconds for large playlists) only on the first search.
+    Returns True if the playlist was persisted to disk (or queued for it).
+    """
+    for playlist_id in {replaced_id, playlist_data['id']} - {None}:
+        rendered_playlist_cache.invalidate(playlist_id)
+        search_index_cache.invalidate(playlist_id)
+        group_index_cache.invalidate(playlist_id)
+    
+    with timed_phase('persist'):
+        persisted = playlist_store.save(playlist_data)
+    group_index_cache.build(playlist_data, playlist_data['channels'])
+    return persisted
+
+# Merge - several sources parsed in parallel, deduplicated, merged by priority
+MERGE_SORT_KEYS = {
+    'priority': lambda channel: (),
+    'name': lambda channel: ((channel.get('name') or '').casefold(),),
+    'group': lambda channel: ((channel.get('group') or '').casefold(), (channel.get('name') or '').casefold())
+}
+
+# Below this total input size a merge is parsed inline - the pool costs more than it saves
+MERGE_PARALLEL_MIN_BYTES = 1024 * 1024
+
+DEFAULT_URL_PORTS = {'http': 80, 'https': 443, 'rtsp': 554, 'rtmp': 1935}
+
+def normalize_channel_url(url):
+    """Normalize a stream URL for duplicate detection (scheme/host case, default port, fragment)."""
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or '').lower()
+        port = parts.port
+    except ValueError:
+        return url.strip()
+    
+    netloc = host
+    if port and port != DEFAULT_URL_PORTS.get(scheme):
+        netloc = f'{host}:{port}'
+    if parts.username is not None:
+        userinfo = parts.username if parts.password is None else f'{parts.username}:{parts.password}'
+        netloc = f'{userinfo}@{netloc}'
+    
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+def get_channel_dedupe_key(channel):
+    """8-byte hash of normalized URL plus tvg-id identifying duplicate channels."""
+    key = f"{normalize_channel_url(channel.get('url') or '')}\n{channel.get('tvg_id') or ''}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+
+def validate_merge_source(content):
+    """Raise M3UValidationError unless a merge source (bytes or str) is a valid M3U."""
+    if isinstance(content, bytes):
+        is_valid, message = validate_m3u_bytes(content)
+    else:
+        is_valid, message = validate_m3u_content(content)
+    if not is_valid:
+        raise M3UValidationError(message)
+
+def parse_merge_source(content, sort_by='priority'):
+    """Parse one validated merge source into a sorted run of (sort_key, position, dedupe_key, channel).
+    
+    Runs in pool processes, so it takes raw bytes and only returns picklable data.
+    """
+    parse = parse_m3u_bytes if isinstance(content, bytes) else parse_m3u_content
+    sort_key = MERGE_SORT_KEYS[sort_by]
+    run = [
+        (sort_key(channel), position, get_channel_dedupe_key(channel), channel)
+        for position, channel in enumerate(parse(content))
+    ]
+    if sort_by != 'priority':
+        run.sort(key=lambda entry: (entry[0], entry[1]))
+    return run
+
+process_pool = None
+process_pool_pid = None
+process_pool_lock = threading.Lock()
+
+def get_process_pool():
+    """Return this process's parse pool, creating it on first use (and again after a fork)."""
+    global process_pool, process_pool_pid
+    
+    with process_pool_lock:
+        if process_pool is None or process_pool_pid != os.getpid():
+            process_pool = ProcessPoolExecutor(max_workers=app.config['PARSE_WORKERS'])
+            process_pool_pid = os.getpid()
+        return process_pool
+
+# Upload jobs - large uploads are parsed in the process pool. Job state lives
+# in files, so any worker can answer /api/jobs/<id>.
+UPLOAD_JOB_TTL = 3600  # seconds job files are kept
+UPLOAD_JOB_STALE_AFTER = 600  # seconds without a job file update before an unfinished job stops counting
+UPLOAD_JOB_PROGRESS_CHANNELS = 5000  # progress is written every this many channels
+UPLOAD_JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+UPLOAD_JOB_FILE_PATTERN = re.compile(r'[0-9a-f]{32}\.json')
+
+def get_jobs_dir():
+    """Get the directory holding upload job files."""
+    jobs_dir = os.path.join(app.config.get('UPLOAD_FOLDER', 'uploads'), 'jobs')
+    ensure_directory_exists(jobs_dir)
+    return jobs_dir
+
+def get_job_file(job_id, suffix='json'):
+    return os.path.join(get_jobs_dir(), f'{job_id}.{suffix}')
+
+def load_job(job_id):
+    """Return the state of an upload job, or None."""
+    try:
+        with open(get_job_file(job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def run_upload_job(job, max_size=None):
+    """Parse the upload of a job; runs in a pool process and records progress in the job file.
+    
+    Returns (channel count, parse seconds).
+    """
+    started = time.perf_counter()
+    upload_file_path = get_job_file(job['id'], 'm3u')
+    job = dict(job, status='running', started_at=datetime.now().isoformat())
+    write_json_atomic(get_job_file(job['id']), job)
+    
+    channels = []
+    try:
+        with open(upload_file_path, 'rb') as f:
+            data = f.read(max_size + 1) if max_size else f.read()
+        if max_size and len(data) > max_size:
+            raise M3UValidationError("File too large")
+        
+        is_valid, message = validate_m3u_bytes(data)
+        if not is_valid:
+            raise M3UValidationError(message)
+        
+        for offset, channel in iter_m3u_bytes(data):
+            channels.append(channel)
+            if len(channels) % UPLOAD_JOB_PROGRESS_CHANNELS == 0:
+                job['bytes_done'] = offset
+                job['channel_count'] = len(channels)
+                write_json_atomic(get_job_file(job['id']), job)
+        
+        if not channels:
+            raise M3UValidationError('Keine gültigen Kanäle in der Playlist gefunden')
+        write_json_atomic(get_job_file(job['id'], 'result.json'), channels)
+        job.update(status='done', bytes_done=job['bytes_total'])
+    except M3UValidationError as e:
+        job.update(status='error', error=str(e))
+    except Exception as e:
+        job.update(status='error', error=f'Fehler beim Verarbeiten der Datei: {str(e)}')
+    finally:
+        remove_file(upload_file_path)
+    
+    job.update(channel_count=len(channels), finished_at=datetime.now().isoformat())
+    write_json_atomic(get_job_file(job['id']), job)
+    return len(channels), time.perf_counter() - started
+
+def count_active_jobs():
+    """Count upload jobs queued or running in any worker.
+    
+    Jobs whose file was not updated for UPLOAD_JOB_STALE_AFTER seconds are
+    left over from a dead worker and do not count.
+    """
+    jobs_dir = get_jobs_dir()
+    stale = time.time() - UPLOAD_JOB_STALE_AFTER
+    active = 0
+    for name in os.listdir(jobs_dir):
+        if not UPLOAD_JOB_FILE_PATTERN.fullmatch(name):
+            continue
+        path = os.path.join(jobs_dir, name)
+        try:
+            if os.path.getmtime(path) < stale:
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                status = json.load(f).get('status')
+        except (OSError, ValueError):
+            continue
+        if status in ('queued', 'running'):
+            active += 1
+    return active
+
+def remove_expired_jobs():
+    """Delete job files older than UPLOAD_JOB_TTL."""
+    jobs_dir = get_jobs_dir()
+    expires = time.time() - UPLOAD_JOB_TTL
+    for name in os.listdir(jobs_dir):
+        if name.endswith('.lock'):
+            continue
+        path = os.path.join(jobs_dir, name)
+        try:
+            if os.path.getmtime(path) < expires:
+                os.remove(path)
+        except OSError:
+            pass
+
+def submit_upload_job(file):
+    """Store an upload and queue it for parsing in the process pool.
+    
+    Returns the job, or None if UPLOAD_JOB_MAX_QUEUE jobs are already in flight
+    across all workers. The limit is enforced on the job files, so the check and
+    the queued job file are written under one file lock.
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'status': 'queued',
+        'filename': file.filename,
+        'bytes_total': 0,
+        'bytes_done': 0,
+        'channel_count': 0,
+        'created_at': datetime.now().isoformat()
+    }
+    
+    with file_lock(os.path.join(get_jobs_dir(), 'jobs.lock')):
+        remove_expired_jobs()
+        if count_active_jobs() >= app.config['UPLOAD_JOB_MAX_QUEUE']:
+            return None
+        write_json_atomic(get_job_file(job_id), job)
+    
+    try:
+        upload_file_path = get_job_file(job_id, 'm3u')
+        file.save(upload_file_path)
+        job['bytes_total'] = os.path.getsize(upload_file_path)
+        write_json_atomic(get_job_file(job_id), job)
+        future = get_process_pool().submit(run_upload_job, job, app.config['MAX_CONTENT_LENGTH'])
+    except Exception as e:
+        # Release the slot taken by the queued job file
+        write_json_atomic(get_job_file(job_id), dict(
+            job, status='error', error=f'Fehler beim Verarbeiten der Datei: {e}'
+        ))
+        raise
+    
+    def finished(future):
+        error = future.exception()
+        if error is not None:
+            # The pool itself failed (e.g. a crashed process), so the job file was never finished
+            write_json_atomic(get_job_file(job_id), dict(
+                job, status='error', error=f'Fehler beim Verarbeiten der Datei: {error}'
+            ))
+            return
+        channel_count, seconds = future.result()
+        if channel_count:
+            upload_parse_seconds.observe(seconds)
+            upload_channels.observe(channel_count)
+            upload_bytes.observe(job['bytes_total'])
+    
+    future.add_done_callback(finished)
+    return job
+
+def iter_merge_runs(sources, sort_by='priority'):
+    """Parse source contents into sorted runs, in priority order.
+    
+    Inline the sources are parsed one at a time as the runs are consumed. With
+    PARSE_WORKERS > 1 and at least MERGE_PARALLEL_MIN_BYTES of input they are
+    all submitted to the pool at once and handed over in order.
+    """
+    parallel = (
+        len(sources) > 1
+        and app.config['PARSE_WORKERS'] > 1
+        and sum(len(content) for content in sources) >= MERGE_PARALLEL_MIN_BYTES
+    )
+    if parallel:
+        return get_process_pool().map(parse_merge_source, sources, [sort_by] * len(sources))
+    return (parse_merge_source(content, sort_by) for content in sources)
+
+def iter_merged_channels(runs, sort_by='priority', stats=None):
+    """K-way merge sorted runs (first run = highest priority), dropping duplicates.
+    
+    Of channels sharing a dedupe key the one from the highest priority source
+    (earliest in that source) is kept, wherever the sort order puts it. In
+    priority order that is the first one seen, so runs are merged as they
+    arrive and released after; other orders need the dedupe keys of every
+    run before the first channel. stats (channels per source, unique,
+    duplicates) is filled in once the merge is exhausted.
+    """
+    if stats is None:
+        stats = {}
+    counts = stats.setdefault('sources', [])
+    
+    if sort_by == 'priority':
+        seen = set()
+        for run in runs:
+            counts.append(len(run))
+            for _, _, dedupe_key, channel in run:
+                if dedupe_key not in seen:
+                    seen.add(dedupe_key)
+                    yield channel
+        unique = len(seen)
+    else:
+        runs = list(runs)
+        counts.extend(len(run) for run in runs)
+        
+        # Winner per dedupe key: (priority, position) of its first occurrence
+        winners = {}
+        for priority, run in enumerate(runs):
+            for _, position, dedupe_key, _ in run:
+                if dedupe_key not in winners or winners[dedupe_key] > (priority, position):
+                    winners[dedupe_key] = (priority, position)
+        
+        def keyed(priority, run):
+            for sort_key, position, dedupe_key, channel in run:
+                yield sort_key, priority, position, dedupe_key, channel
+        
+        # (sort_key, priority, position) is unique, so channels are never compared
+        merged = heapq.merge(*(keyed(priority, run) for priority, run in enumerate(runs)))
+        for _, priority, position, dedupe_key, channel in merged:
+            if winners[dedupe_key] == (priority, position):
+                yield channel
+        unique = len(winners)
+    
+    stats['unique'] = unique
+    stats['duplicates'] = sum(counts) - unique
+
+def merge_playlists(sources, sort_by='priority'):
+    """Merge M3U sources (bytes or str, highest priority first). Returns (channels, stats).
+    
+    channels is an iterator, so the merged list is never built as a whole;
+    stats is complete once it is exhausted (see iter_merged_channels).
+    Invalid sources raise M3UValidationError before anything is parsed.
+    """
+    if sort_by not in MERGE_SORT_KEYS:
+        raise ValueError(f"Unknown sort order: {sort_by}")
+    
+    for content in sources:
+        validate_merge_source(content)
+    stats = {}
+    return iter_merged_channels(iter_merge_runs(sources, sort_by), sort_by, stats), stats
+
+def replace_playlist_channels(playlist_name, channels):
+    """Save channels as the new version of a named playlist, creating it if needed."""
+    sanitized_name = sanitize_playlist_name(playlist_name)
+    existing_info = playlist_store.get_info(sanitized_name)
+    now = datetime.now().isoformat()
+    
+    playlist_data = {
+        'id': str(uuid.uuid4()),
+        'name': existing_info['name'] if existing_info else playlist_name,
+        'sanitized_name': sanitized_name,
+        'channels': channels,
+        'created_at': existing_info.get('created_at', now) if existing_info else now,
+        'updated_at': now
+    }
+    store_playlist(playlist_data, existing_info['id'] if existing_info else None)
+    return playlist_data
+
+# Subscriptions - saved playlists refreshed from a provider URL
+HTTP_MAX_REDIRECTS = 5
+HTTP_USER_AGENT = 'IPTV-M3U-Sorter'
+
+class BlockedAddressError(ValueError):
+    """A URL's host resolves to an address the server must not connect to."""
+
+def get_public_address(host, addresses):
+    """Return the first of the getaddrinfo() results of host to connect to.
+    
+    Unless ALLOW_PRIVATE_URLS is set, raises BlockedAddressError if any of them
+    is private, loopback, link-local, multicast or otherwise not global, so
+    user-supplied URLs cannot reach the server's own network.
+    """
+    if not addresses:
+        raise OSError(f"No address for {host}")
+    if not app.config['ALLOW_PRIVATE_URLS']:
+        for *_, sockaddr in addresses:
+            address = ipaddress.ip_address(sockaddr[0].partition('%')[0])
+            if getattr(address, 'ipv4_mapped', None):
+                address = address.ipv4_mapped
+            if not address.is_global or address.is_multicast:
+                raise BlockedAddressError(f"{host} resolves to the non-public address {address}")
+    return addresses[0][4][0]
+
+def check_public_url(url):
+    """Resolve the host of an http(s) URL up front; raises BlockedAddressError, or OSError if it does not resolve."""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    get_public_address(parts.hostname, socket.getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM))
+
+def create_public_connection(address, *args):
+    """socket.create_connection() to the checked address of a host (see get_public_address).
+    
+    Connecting to the address that was checked, not the name, keeps DNS
+    rebinding from swapping in another address after the check.
+    """
+    host, port = address
+    addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return socket.create_connection((get_public_address(host, addresses), port), *args)
+
+class HTTPResponse:
+    """Fully read response of HTTPConnectionPool.request."""
+    
+    def __init__(self, url, status, headers, body):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+class HTTPConnectionPool:
+    """Keep-alive HTTP(S) connections, reused per (scheme, host, port).
+    
+    Only what subscriptions need: GET with redirects, gzip and a body limit.
+    A reused connection the server has meanwhile closed is retried once on a
+    fresh one.
+    """
+    
+    def __init__(self, timeout=30, max_idle_per_host=4):
+        self.timeout = timeout
+        self.max_idle_per_host = max_idle_per_host
+        self.idle = {}
+        self.lock = threading.Lock()
+    
+    def connect(self, key):
+        scheme, host, port = key
+        connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(host, port, timeout=self.timeout)
+        # Every (re)connect - including redirect targets - resolves and checks the host
+        connection._create_connection = create_public_connection
+        return connection
+    
+    def acquire(self, key):
+        """Return (connection, reused)."""
+        with self.lock:
+            connections = self.idle.get(key)
+            if connections:
+                return connections.pop(), True
+        return self.connect(key), False
+    
+    def release(self, key, connection):
+        with self.lock:
+            connections = self.idle.setdefault(key, [])
+            if len(connections) < self.max_idle_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+    
+    def send(self, key, path, headers):
+        connection, reused = self.acquire(key)
+        try:
+            connection.request('GET', path, headers=headers)
+            return connection, connection.getresponse()
+        except (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionError):
+            connection.close()
+            if not reused:
+                raise
+        
+        # Stale keep-alive connection - try once more on a new one
+        connection = self.connect(key)
+        try:
+            connection.request('GET', path, headers=headers)
+            return connection, connection.getresponse()
+        except Exception:
+            connection.close()
+            raise
+    
+    def finish(self, key, connection, response):
+        """Return the connection of a fully read response to the pool."""
+        if response.will_close:
+            connection.close()
+        else:
+            self.release(key, connection)
+    
+    def open(self, url, headers=None):
+        """GET url following redirects; returns (url, key, connection, response) with the body unread.
+        
+        The caller reads the body and hands the connection back with finish(),
+        or closes it if reading failed.
+        """
+        for _ in range(HTTP_MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https') or not parts.hostname:
+                raise ValueError(f"Unsupported URL: {url}")
+            
+            key = (parts.scheme, parts.hostname, parts.port)
+            path = urlunsplit(('', '', parts.path or '/', parts.query, ''))
+            request_headers = {'User-Agent': HTTP_USER_AGENT, 'Accept-Encoding': 'gzip', **(headers or {})}
+            
+            connection, response = self.send(key, path, request_headers)
+            location = response.getheader('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                try:
+                    response.read()
+                except Exception:
+                    connection.close()
+                    raise
+                self.finish(key, connection, response)
+                url = urljoin(url, location)
+                continue
+            
+            return url, key, connection, response
+        
+        raise ValueError(f"Too many redirects: {url}")
+    
+    def request(self, url, headers=None, max_bytes=None):
+        """GET url following redirects; returns an HTTPResponse with the decoded body."""
+        url, key, connection, response = self.open(url, headers)
+        try:
+            body = self.read_body(response, max_bytes)
+        except Exception:
+            connection.close()
+            raise
+        
+        self.finish(key, connection, response)
+        return HTTPResponse(url, response.status, response.headers, body)
+    
+    def read_body(self, response, max_bytes=None):
+        chunks = []
+        size = 0
+        while True:
+            chunk = response.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise M3UValidationError("File too large")
+            chunks.append(chunk)
+        body = b''.join(chunks)
+        
+        if body and (response.getheader('Content-Encoding') or '').lower() == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = decompressor.decompress(body, max_bytes or 0)
+            if decompressor.unconsumed_tail:
+                raise M3UValidationError("File too large")
+        return body
+
+http_pool = HTTPConnectionPool(timeout=app.config['SUBSCRIPTION_FETCH_TIMEOUT'])
+
+def get_subscriptions_file():
+    """Get the path to the subscription storage."""
+    playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
+    ensure_directory_exists(playlists_dir)
+    return os.path.join(playlists_dir, 'subscriptions.json')
+
+subscriptions_lock = threading.Lock()
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """Exclusive lock across worker processes (flock); yields False if not blocking and taken."""
+    if fcntl is None:
+        yield True
+        return
+    
+    with open(path, 'a') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def load_subscriptions():
+    """Load subscriptions (sanitized playlist name -> subscription)."""
+    subscriptions_file = get_subscriptions_file()
+    if not os.path.exists(subscriptions_file):
+        return {}
+    
+    try:
+        with open(subscriptions_file, 'r', encoding='utf-8') as f:
+            return json.load(f).get('subscriptions', {})
+    except (OSError, ValueError) as e:
+        app.logger.error(f"Error loading subscriptions: {e}")
+        return {}
+
+def update_subscription(name, changes=None):
+    """Merge changes into one subscription (changes=None deletes it). Returns the subscription."""
+    subscriptions_file = get_subscriptions_file()
+    with subscriptions_lock, file_lock(subscriptions_file + '.lock'):
+        subscriptions = load_subscriptions()
+        if changes is None:
+            subscription = subscriptions.pop(name, None)
+        else:
+            subscription = subscriptions.setdefault(name, {'name': name})
+            subscription.update(changes)
+        write_json_atomic(subscriptions_file, {
+            'subscriptions': subscriptions,
+            'saved_at': datetime.now().isoformat()
+        })
+    return subscription
+
+def refresh_subscription(name, force=False):
+    """Fetch a subscription's source and save the playlist if the content changed.
+    
+    The fetch is conditional (ETag / Last-Modified), and a 200 whose body
+    hashes like the last import is not parsed or saved either. Returns the
+    outcome: not_modified, unchanged, updated or error.
+    """
+    subscription = load_subscriptions().get(name)
+    if not subscription:
+        raise KeyError(name)
+    
+    headers = {}
+    if not force and playlist_store.get_info(name):
+        if subscription.get('etag'):
+            headers['If-None-Match'] = subscription['etag']
+        if subscription.get('last_modified'):
+            headers['If-Modified-Since'] = subscription['last_modified']
+    
+    changes = {'last_checked': datetime.now().isoformat()}
+    try:
+        response = http_pool.request(subscription['url'], headers, app.config['MAX_CONTENT_LENGTH'])
+        
+        if response.status == 304:
+            changes['last_status'] = 'not_modified'
+        elif response.status != 200:
+            raise ValueError(f"HTTP {response.status}")
+        else:
+            changes['etag'] = response.headers.get('ETag')
+            changes['last_modified'] = response.headers.get('Last-Modified')
+            content_hash = hashlib.sha256(response.body).hexdigest()
+            
+            if content_hash == subscription.get('content_hash') and not force:
+                changes['last_status'] = 'unchanged'
+            else:
+                is_valid, message = validate_m3u_bytes(response.body)
+                if not is_valid:
+                    raise M3UValidationError(message)
+                
+                channels = parse_m3u_bytes(response.body)
+                # Rules first, so templates match the cleaned-up names
+                rule_set = get_playlist_rule_set(name)
+                if rule_set:
+                    channels, _ = compile_rule_set(rule_set).apply(channels)
+                template = load_templates().get(subscription.get('template') or '')
+                if template:
+                    channels, _ = apply_sorting_template(channels, template)
+                
+                replace_playlist_channels(subscription.get('playlist_name') or name, channels)
+                changes.update({
+                    'content_hash': content_hash,
+                    'last_changed': changes['last_checked'],
+                    'last_status': 'updated',
+                    'channel_count': len(channels)
+                })
+        changes.update({'last_error': None, 'failures': 0})
+    except Exception as e:
+        app.logger.warning(f"Subscription '{name}' refresh failed: {e}")
+        changes.update({
+            'last_status': 'error',
+            'last_error': str(e),
+            'failures': (subscription.get('failures') or 0) + 1
+        })
+    
+    return update_subscription(name, changes)
+
+# A failing source is retried after 2, 4, 8, then 16 intervals
+SUBSCRIPTION_BACKOFF_STEPS = 4
+
+def is_subscription_due(subscription, now):
+    last_checked = subscription.get('last_checked')
+    if not last_checked:
+        return True
+    interval = subscription.get('interval') or app.config['SUBSCRIPTION_DEFAULT_INTERVAL']
+    interval *= 2 ** min(subscription.get('failures') or 0, SUBSCRIPTION_BACKOFF_STEPS)
+    return (now - datetime.fromisoformat(last_checked)).total_seconds() >= interval * 60
+
+def refresh_due_subscriptions():
+    """Refresh every due subscription unless another worker is already doing it."""
+    with file_lock(get_subscriptions_file() + '.refresh.lock', blocking=False) as acquired:
+        if not acquired:
+            return []
+        
+        now = datetime.now()
+        return [
+            refresh_subscription(name)
+            for name, subscription in load_subscriptions().items()
+            if is_subscription_due(subscription, now)
+        ]
+
+subscription_scheduler_pid = None
+
+def start_subscription_scheduler():
+    """Start the background refresh loop of this process (once per process)."""
+    global subscription_scheduler_pid
+    
+    if not app.config['SUBSCRIPTIONS_ENABLED'] or subscription_scheduler_pid == os.getpid():
+        return
+    subscription_scheduler_pid = os.getpid()
+    
+    def run():
+        while True:
+            time.sleep(app.config['SUBSCRIPTION_CHECK_INTERVAL'])
+            try:
+                refresh_due_subscriptions()
+            except Exception as e:
+                app.logger.error(f"Subscription scheduler error: {e}")
+    
+    threading.Thread(target=run, name='subscription-scheduler', daemon=True).start()
+
+# Stream checks - asyncio liveness prober for channel URLs
+PROBE_BODY_BYTES = 4096
+PROBE_CACHE_MAX_ENTRIES = 200000
+HLS_CONTENT_TYPES = ('application/vnd.apple.mpegurl', 'application/x-mpegurl', 'audio/mpegurl', 'audio/x-mpegurl')
+
+class StreamProbeCache:
+    """Probe results per URL for a limited time, so URLs shared by playlists are checked once."""
+    
+    def __init__(self, ttl, max_entries=PROBE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[url]
+                entry = None
+        count_cache_lookup('probe', entry is not None)
+        return entry[1] if entry is not None else None
+    
+    def put(self, url, result):
+        with self.lock:
+            self.entries.pop(url, None)
+            self.entries[url] = (time.monotonic() + self.ttl, result)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+stream_probe_cache = StreamProbeCache(app.config['PROBE_CACHE_TTL'])
+
+class StreamProber:
+    """Check channel URLs concurrently with global and per-host limits.
+    
+    Plain streams get a HEAD (GET if HEAD is refused); HLS manifests get a
+    short GET whose body must start the playlist. Anything but http(s) is
+    reported as unknown (alive None) rather than dead.
+    """
+    
+    def __init__(self, concurrency, per_host, timeout, cache=None):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.cache = cache
+        self.ssl_context = ssl.create_default_context()
+    
+    async def check_all(self, urls):
+        """Return {url: result} for the unique URLs given."""
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.host_semaphores = {}
+        urls = list(dict.fromkeys(urls))
+        results = await asyncio.gather(*(self.check(url) for url in urls))
+        return dict(zip(urls, results))
+    
+    async def check(self, url):
+        if self.cache is not None:
+            cached = self.cache.get(url)
+            if cached is not None:
+                return cached
+        
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            return {'alive': None, 'status': None, 'error': 'unsupported scheme',
+                    'checked_at': datetime.now().isoformat()}
+        
+        host_semaphore = self.host_semaphores.setdefault(parts.hostname, asyncio.Semaphore(self.per_host))
+        async with self.semaphore, host_semaphore:
+            start = time.perf_counter()
+            try:
+                alive, status, error = await asyncio.wait_for(self.probe(url), self.timeout)
+            except asyncio.TimeoutError:
+                alive, status, error = False, None, 'timeout'
+            except BlockedAddressError as e:
+                # Not checked, so neither dead nor alive
+                alive, status, error = None, None, str(e)
+            except (OSError, ValueError, ssl.SSLError) as e:
+                alive, status, error = False, None, str(e) or e.__class__.__name__
+            
+            result = {
+                'alive': alive,
+                'status': status,
+                'error': error,
+                'elapsed_ms': round((time.perf_counter() - start) * 1000),
+                'checked_at': datetime.now().isoformat()
+            }
+        
+        if self.cache is not None:
+            self.cache.put(url, result)
+        return result
+    
+    async def probe(self, url):
+        """Return (alive, final status, error) for one URL, following redirects."""
+        is_hls = urlsplit(url).path.lower().endswith(('.m3u8', '.m3u'))
+        method = 'GET' if is_hls else 'HEAD'
+        
+        for _ in range(HTTP_MAX_REDIRECTS + 1):
+            status, headers, body = await self.fetch(url, method)
+            
+            if status in (301, 302, 303, 307, 308) and headers.get('location'):
+                url = urljoin(url, headers['location'])
+                continue
+            if method == 'HEAD' and status in (403, 405, 501):
+                # Some stream servers refuse HEAD - retry with a short GET
+                method = 'GET'
+                continue
+            break
+        
+        if not 200 <= status < 300:
+            return False, status, f'HTTP {status}'
+        if method == 'GET' and (is_hls or headers.get('content-type', '').lower().startswith(HLS_CONTENT_TYPES)):
+            if b'#EXTM3U' not in body:
+                return False, status, 'not an HLS playlist'
+        return True, status, None
+    
+    async def fetch(self, url, method):
+        """Send one request; returns (status, lower-cased headers, first body bytes)."""
+        parts = urlsplit(url)
+        is_https = parts.scheme == 'https'
+        port = parts.port or (443 if is_https else 80)
+        
+        # Connect to the checked address, not the name (see get_public_address)
+        addresses = await asyncio.get_running_loop().getaddrinfo(parts.hostname, port, type=socket.SOCK_STREAM)
+        reader, writer = await asyncio.open_connection(
+            get_public_address(parts.hostname, addresses), port,
+            ssl=self.ssl_context if is_https else None,
+            server_hostname=parts.hostname if is_https else None
+        )
+        try:
+            path = urlunsplit(('', '', parts.path or '/', parts.query, ''))
+            writer.write((
+                f'{method} {path} HTTP/1.1\r\n'
+                f'Host: {parts.netloc.rpartition("@")[2]}\r\n'
+                f'User-Agent: {HTTP_USER_AGENT}\r\n'
+                'Accept: */*\r\n'
+                'Connection: close\r\n\r\n'
+            ).encode('latin-1'))
+            await writer.drain()
+            
+            status_line = await reader.readline()
+            try:
+                status = int(status_line.split()[1])
+            except (IndexError, ValueError):
+                raise ValueError(f'invalid response: {status_line[:50]!r}')
+            
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            
+            body = b''
+            if method == 'GET':
+                while len(body) < PROBE_BODY_BYTES:
+                    chunk = await reader.read(PROBE_BODY_BYTES - len(body))
+                    if not chunk:
+                        break
+                    body += chunk
+            return status, headers, body
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+
+def get_stream_health_file(sanitized_name):
+    """Get the path of the stored stream check results of a playlist."""
+    health_dir = os.path.join(app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists'), 'health')
+    ensure_directory_exists(health_dir)
+    return os.path.join(health_dir, f'{sanitized_name}.json')
+
+# sanitized name -> (file identity, parsed results); the file is replaced atomically
+stream_health_cache = {}
+
+def load_stream_health(sanitized_name):
+    """Load stored stream check results of a playlist, or None.
+    
+    Parsed results are cached per file version (inode, mtime, size), so
+    serving with alive filtering only stats the file. Do not modify them.
+    """
+    health_file = get_stream_health_file(sanitized_name)
+    try:
+        stat = os.stat(health_file)
+    except OSError:
+        return None
+    
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = stream_health_cache.get(sanitized_name)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    
+    try:
+        with open(health_file, 'r', encoding='utf-8') as f:
+            health = json.load(f)
+    except (OSError, ValueError) as e:
+        app.logger.error(f"Error loading stream health for '{sanitized_name}': {e}")
+        return None
+    stream_health_cache[sanitized_name] = (version, health)
+    return health
+
+# A check still 'running' after this long was left behind by a worker that
+# died mid-check (timeout, max_requests recycle, deploy)
+STREAM_CHECK_STALE_AFTER = 3600  # seconds
+
+def get_stream_check_status(health):
+    """Status of the last stream check; a stale 'running' one is reported as 'interrupted'."""
+    status = health.get('status')
+    if status == 'running':
+        try:
+            started_at = datetime.fromisoformat(health['started_at'])
+        except (KeyError, TypeError, ValueError):
+            return 'interrupted'
+        if (datetime.now() - started_at).total_seconds() > STREAM_CHECK_STALE_AFTER:
+            return 'interrupted'
+    return status
+
+# sanitized name -> (checked_at of the stream check, its dead URLs)
+stream_dead_urls_cache = {}
+
+def get_dead_urls(sanitized_name, health):
+    """URLs reported dead by a stream check (unknown ones are kept), collected once per check."""
+    checked_at = health.get('checked_at')
+    cached = stream_dead_urls_cache.get(sanitized_name)
+    if cached is not None and cached[0] == checked_at:
+        return cached[1]
+    
+    dead_urls = frozenset(url for url, result in health.get('results', {}).items() if result.get('alive') is False)
+    stream_dead_urls_cache[sanitized_name] = (checked_at, dead_urls)
+    return dead_urls
+
+def check_playlist_streams(sanitized_name):
+    """Probe every channel URL of a saved playlist and store the results next to it."""
+    playlist_info = playlist_store.get_info(sanitized_name)
+    if not playlist_info:
+        raise KeyError(sanitized_name)
+    
+    health_file = get_stream_health_file(sanitized_name)
+    previous = load_stream_health(sanitized_name) or {}
+    write_json_atomic(health_file, dict(previous, status='running', started_at=datetime.now().isoformat()))
+    
+    try:
+        urls = [channel.get('url') for channel in playlist_store.get_channels(playlist_info['id']) if channel.get('url')]
+        prober = StreamProber(
+            app.config['PROBE_CONCURRENCY'],
+            app.config['PROBE_PER_HOST'],
+            app.config['PROBE_TIMEOUT'],
+            stream_probe_cache
+        )
+        results = asyncio.run(prober.check_all(urls))
+    except Exception as e:
+        write_json_atomic(health_file, dict(previous, status='error', error=str(e)))
+        raise
+    
+    alive = [result['alive'] for result in results.values()]
+    health = {
+        'playlist': sanitized_name,
+        'status': 'done',
+        'checked_at': datetime.now().isoformat(),
+        'summary': {
+            'alive': alive.count(True),
+            'dead': alive.count(False),
+            'unknown': alive.count(None)
+        },
+        'results': results
+    }
+    write_json_atomic(health_file, health)
+    return health
+
+# EPG - XMLTV guides imported into SQLite, served filtered to a playlist's tvg-ids
+EPG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS epg_sources (
+    name TEXT PRIMARY KEY,
+    url TEXT,
+    imported_at TEXT NOT NULL,
+    channel_count INTEGER NOT NULL,
+    programme_count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS epg_channels (
+    channel_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    xml TEXT NOT NULL,
+    PRIMARY KEY (channel_id, source)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS epg_programmes (
+    channel_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    start TEXT,
+    xml TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS epg_programmes_channel ON epg_programmes (channel_id, start);
+CREATE TABLE IF NOT EXISTS epg_imports (
+    name TEXT PRIMARY KEY,
+    url TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT
+);
+"""
+EPG_IMPORT_STALE_AFTER = 3600  # seconds before a running import counts as interrupted
+EPG_INSERT_BATCH_SIZE = 5000
+EPG_FETCH_BATCH_SIZE = 1000
+EPG_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE tv SYSTEM "xmltv.dtd">\n<tv generator-info-name="IPTV-M3U-Sorter">\n'
+EPG_FOOTER = '</tv>\n'
+
+def get_epg_database():
+    """Get the path to the EPG database."""
+    playlists_dir = app.config.get('SAVED_PLAYLISTS_FOLDER', 'saved_playlists')
+    ensure_directory_exists(playlists_dir)
+    return os.path.join(playlists_dir, 'epg.db')
+
+def open_xmltv_stream(stream):
+    """Wrap a binary stream so gzip-compressed guides (.xml.gz) are decompressed on the fly."""
+    if not hasattr(stream, 'peek'):
+        stream = io.BufferedReader(stream)
+    if stream.peek(2)[:2] == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+def iter_xmltv_elements(stream):
+    """Yield (tag, channel id, start, xml) for each <channel> and <programme> of an XMLTV stream.
+    
+    Elements are parsed incrementally and cleared once serialized, so memory
+    stays bounded however large the guide is.
+    """
+    root = None
+    depth = 0
+    for event, element in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                if element.tag != 'tv':
+                    raise ValueError("Not an XMLTV guide")
+                root = element
+            depth += 1
+            continue
+        
+        depth -= 1
+        if depth != 1:
+            continue
+        
+        element.tail = None
+        if element.tag == 'channel':
+            yield 'channel', element.get('id'), None, ET.tostring(element, encoding='unicode')
+        elif element.tag == 'programme':
+            yield 'programme', element.get('channel'), element.get('start'), ET.tostring(element, encoding='unicode')
+        # Drop everything parsed so far
+        root.clear()
+
+class EpgStore:
+    """Imported XMLTV guides in a shared SQLite database (WAL mode), indexed by channel id.
+    
+    Every import replaces the rows of its source in one transaction on a
+    separate connection, so readers keep seeing the previous guide until it
+    commits. A channel id present in several sources is taken from the most
+    recently imported one.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        self.connection_pid = None
+    
+    def open_connection(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(EPG_SCHEMA)
+        return connection
+    
+    def connect(self):
+        """Return this process' connection; connections are never shared across forks."""
+        if self.connection is None or self.connection_pid != os.getpid():
+            self.connection = self.open_connection()
+            self.connection_pid = os.getpid()
+        return self.connection
+    
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.connect().execute(sql, parameters).fetchall()
+    
+    def list_sources(self):
+        """Imported guides plus URL imports still running or failed, with the status of the last URL import."""
+        rows = self.query('SELECT name, url, imported_at, channel_count, programme_count FROM epg_sources')
+        sources = {
+            row[0]: dict(zip(('name', 'url', 'imported_at', 'channel_count', 'programme_count'), row),
+                         status='done', error=None, started_at=None)
+            for row in rows
+        }
+        
+        stale = (datetime.now() - timedelta(seconds=EPG_IMPORT_STALE_AFTER)).isoformat()
+        for name, url, status, error, started_at in self.query(
+            'SELECT name, url, status, error, started_at FROM epg_imports'
+        ):
+            if status == 'running' and started_at < stale:
+                # Left running by a worker that died during the import
+                status = 'interrupted'
+            source = sources.setdefault(name, {
+                'name': name, 'url': url, 'imported_at': None, 'channel_count': None, 'programme_count': None
+            })
+            source.update(status=status, error=error, started_at=started_at)
+        return [sources[name] for name in sorted(sources)]
+    
+    def start_import(self, name, url):
+        """Record a URL import of source name as running."""
+        with self.lock:
+            self.connect().execute(
+                'INSERT OR REPLACE INTO epg_imports (name, url, status, error, started_at, finished_at) '
+                "VALUES (?, ?, 'running', NULL, ?, NULL)", (name, url, datetime.now().isoformat())
+            )
+    
+    def finish_import(self, name, error=None):
+        """Record the end of a URL import, failed if error is given."""
+        with self.lock:
+            self.connect().execute(
+                'UPDATE epg_imports SET status = ?, error = ?, finished_at = ? WHERE name = ?',
+                ('error' if error else 'done', error, datetime.now().isoformat(), name)
+            )
+    
+    def version(self):
+        """Return (version, last import time); version is None without any imported guide."""
+        imported_at, count = self.query('SELECT MAX(imported_at), COUNT(*) FROM epg_sources')[0]
+        if not count:
+            return None, None
+        return f'{imported_at}:{count}', imported_at
+    
+    def import_xmltv(self, name, stream, url=None):
+        """Replace source name with the guide read from a binary stream. Returns the source info."""
+        channel_rows, programme_rows = [], []
+        channel_count = programme_count = 0
+        
+        connection = self.open_connection()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                connection.execute('DELETE FROM epg_channels WHERE source = ?', (name,))
+                connection.execute('DELETE FROM epg_programmes WHERE source = ?', (name,))
+                
+                for tag, channel_id, start, xml in iter_xmltv_elements(open_xmltv_stream(stream)):
+                    if not channel_id:
+                        continue
+                    if tag == 'channel':
+                        channel_rows.append((channel_id, name, xml))
+                        channel_count += 1
+                    else:
+                        programme_rows.append((channel_id, name, start, xml))
+                        programme_count += 1
+                    
+                    if len(channel_rows) + len(programme_rows) >= EPG_INSERT_BATCH_SIZE:
+                        self.insert_rows(connection, channel_rows, programme_rows)
+                        channel_rows, programme_rows = [], []
+                
+                self.insert_rows(connection, channel_rows, programme_rows)
+                info = {
+                    'name': name,
+                    'url': url,
+                    'imported_at': datetime.now().isoformat(),
+                    'channel_count': channel_count,
+                    'programme_count': programme_count
+                }
+                connection.execute(
+                    'INSERT OR REPLACE INTO epg_sources (name, url, imported_at, channel_count, programme_count) '
+                    'VALUES (:name, :url, :imported_at, :channel_count, :programme_count)', info
+                )
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        finally:
+            connection.close()
+        
+        app.logger.info(f"Imported EPG '{name}': {channel_count} channels, {programme_count} programmes")
+        return info
+    
+    @staticmethod
+    def insert_rows(connection, channel_rows, programme_rows):
+        connection.executemany(
+            'INSERT OR REPLACE INTO epg_channels (channel_id, source, xml) VALUES (?, ?, ?)', channel_rows
+        )
+        connection.executemany(
+            'INSERT INTO epg_programmes (channel_id, source, start, xml) VALUES (?, ?, ?, ?)', programme_rows
+        )
+    
+    def delete_source(self, name):
+        """Remove an imported guide. Returns False if it did not exist."""
+        with self.lock:
+            connection = self.connect()
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                deleted = connection.execute('DELETE FROM epg_sources WHERE name = ?', (name,)).rowcount
+                connection.execute('DELETE FROM epg_channels WHERE source = ?', (name,))
+                connection.execute('DELETE FROM epg_programmes WHERE source = ?', (name,))
+                deleted += connection.execute('DELETE FROM epg_imports WHERE name = ?', (name,)).rowcount
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return bool(deleted)
+    
+    def iter_guide_chunks(self, channel_ids, chunk_size=M3U_CHUNK_SIZE):
+        """Yield an XMLTV document with the channels and programmes of channel_ids as UTF-8 chunks."""
+        ids_json = json.dumps(sorted(channel_ids))
+        # A private connection - the cursor stays open while the caller consumes chunks
+        connection = self.open_connection()
+        try:
+            sources = {}
+            pieces = [EPG_HEADER]
+            for channel_id, source, xml in connection.execute(
+                'SELECT c.channel_id, c.source, c.xml FROM epg_channels c '
+                'JOIN epg_sources s ON s.name = c.source '
+                'WHERE c.channel_id IN (SELECT value FROM json_each(?)) '
+                'ORDER BY c.channel_id, s.imported_at DESC', (ids_json,)
+            ):
+                if channel_id not in sources:
+                    sources[channel_id] = source
+                    pieces.append(xml + '\n')
+            yield ''.join(pieces).encode('utf-8')
+            
+            cursor = connection.execute(
+                'SELECT p.channel_id, p.source, p.xml FROM epg_programmes p '
+                'JOIN epg_sources s ON s.name = p.source '
+                'WHERE p.channel_id IN (SELECT value FROM json_each(?)) '
+                'ORDER BY p.channel_id, s.imported_at DESC, p.start', (ids_json,)
+            )
+            pieces = []
+            size = 0
+            while True:
+                rows = cursor.fetchmany(EPG_FETCH_BATCH_SIZE)
+                if not rows:
+                    break
+                for channel_id, source, xml in rows:
+                    # Channels without a <channel> element take their programmes from one source too
+                    if sources.setdefault(channel_id, source) != source:
+                        continue
+                    pieces.append(xml + '\n')
+                    size += len(xml) + 1
+                if size >= chunk_size:
+                    yield ''.join(pieces).encode('utf-8')
+                    pieces = []
+                    size = 0
+            
+            pieces.append(EPG_FOOTER)
+            yield ''.join(pieces).encode('utf-8')
+        finally:
+            connection.close()
+
+epg_store = EpgStore(get_epg_database())
+
+def get_epg_source_name(filename):
+    """Default source name of a guide from its file name or URL."""
+    name = os.path.basename(urlsplit(filename).path) or 'epg'
+    for extension in ('.gz', '.xml', '.xmltv'):
+        if name.lower().endswith(extension):
+            name = name[:-len(extension)]
+    return sanitize_playlist_name(name or 'epg')
+
+class LimitedReader(io.RawIOBase):
+    """Binary stream wrapper raising ValueError once more than max_bytes were read."""
+    
+    def __init__(self, stream, max_bytes):
+        self.stream = stream
+        self.max_bytes = max_bytes
+        self.size = 0
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, buffer):
+        chunk = self.stream.read(len(buffer))
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ValueError(f"Guide larger than {self.max_bytes} bytes")
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+def import_epg_url(name, url):
+    """Download a guide and import it while it is being downloaded.
+    
+    The import is recorded in the EPG database, so its status shows up in
+    /api/epg while it runs in the background.
+    """
+    epg_store.start_import(name, url)
+    try:
+        url, key, connection, response = http_pool.open(url)
+        try:
+            if response.status != 200:
+                raise ValueError(f"HTTP {response.status}")
+            stream = io.BufferedReader(LimitedReader(response, app.config['EPG_MAX_BYTES']))
+            if (response.getheader('Content-Encoding') or '').lower() == 'gzip':
+                stream = gzip.GzipFile(fileobj=stream)
+            info = epg_store.import_xmltv(name, stream, url)
+        except Exception:
+            connection.close()
+            raise
+        http_pool.finish(key, connection, response)
+    except Exception as e:
+        epg_store.finish_import(name, str(e))
+        raise
+    epg_store.finish_import(name)
+    return info
+
+# Add cache buster to template context
+@app.context_processor
+def inject_cache_buster():
+    return {'cache_buster': str(int(time.time()))}
+
+@app.route('/')
+def index():
+    """Main page for uploading and sorting playlists"""
     return render_template('index.html')
 
+def wants_ndjson_response():
+    """Check whether the client opted into an NDJSON streaming response."""
+    return (request.args.get('stream') == 'ndjson'
+            or 'application/x-ndjson' in request.headers.get('Accept', ''))
+
+def iter_channel_batches(channels, batch_size=UPLOAD_STREAM_BATCH_SIZE):
+    """Group an iterable of channels into lists of at most batch_size."""
+    batch = []
+    for channel in channels:
+        batch.append(channel)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def observe_upload(stream, started, channel_count):
+    """Record parse time, size and channel count of a fully parsed upload."""
+    upload_parse_seconds.observe(time.perf_counter() - started)
+    upload_channels.observe(channel_count)
+    try:
+        upload_bytes.observe(stream.tell())
+    except (OSError, ValueError):
+        pass
+
+def stream_upload_response(channels, on_done=None):
+    """Stream parsed channels as NDJSON records: channel batches, then a done/error record.
+    
+    on_done(count) is called once every channel has been parsed.
+    """
+    batches = iter_channel_batches(channels)
+    
+    # Parse the first batch up front so invalid files still get a proper 400
+    try:
+        first_batch = next(batches, None)
+    except M3UValidationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if first_batch is None:
+        return jsonify({'success': False, 'error': 'Keine gültigen Kanäle in der Playlist gefunden'}), 400
+    
+    def generate():
+        count = 0
+        try:
+            for batch in chain([first_batch], batches):
+                count += len(batch)
+                yield json.dumps({'type': 'channels', 'channels': batch}, ensure_ascii=False) + '\n'
+            
+            if on_done:
+                on_done(count)
+            yield json.dumps({
+                'type': 'done',
+                'success': True,
+                'count': count,
+                'message': f'{count} Kanäle erfolgreich geladen'
+            }, ensure_ascii=False) + '\n'
+        except M3UValidationError as e:
+            yield json.dumps({'type': 'error', 'success': False, 'error': str(e)}, ensure_ascii=False) + '\n'
+        except Exception as e:
+            app.logger.error(f"Upload stream error: {str(e)}")
+            yield json.dumps({
+                'type': 'error',
+                'success': False,
+                'error': f'Fehler beim Verarbeiten der Datei: {str(e)}'
+            }, ensure_ascii=False) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     """Handle M3U file upload and parsing."""
@@ -378,15 +4117,38 @@ def upload_file():
         if not file.filename.lower().endswith(('.m3u', '.m3u8')):
             return jsonify({'success': False, 'error': 'Datei muss eine M3U Playlist sein'}), 400
         
-        # Read and parse file content
-        content = file.read().decode('utf-8', errors='ignore')
+        # Large uploads are parsed in the process pool; the client polls the job
+        if (request.content_length or 0) >= app.config['UPLOAD_JOB_MIN_BYTES']:
+            job = submit_upload_job(file)
+            if job is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Zu viele Uploads in Bearbeitung, bitte später erneut versuchen'
+                }), 503, {'Retry-After': '10'}
+            
+            status_url = url_for('get_upload_job', job_id=job['id'])
+            return jsonify({
+                'success': True,
+                'status': job['status'],
+                'job_id': job['id'],
+                'status_url': status_url
+            }), 202, {'Location': status_url}
         
-        # Validate content
-        is_valid, validation_message = validate_m3u_content(content)
-        if not is_valid:
-            return jsonify({'success': False, 'error': validation_message}), 400
+        started = time.perf_counter()
         
-        channels = parse_m3u_content(content)
+        # Opt-in: stream channels back as NDJSON while the upload is parsed
+        if wants_ndjson_response():
+            return stream_upload_response(
+                iter_m3u_stream(file.stream, app.config['MAX_CONTENT_LENGTH'], get_request_timings()),
+                lambda count: observe_upload(file.stream, started, count)
+            )
+        
+        # Validate and parse the upload line by line while streaming it
+        try:
+            channels = list(iter_m3u_stream(file.stream, app.config['MAX_CONTENT_LENGTH'], get_request_timings()))
+        except M3UValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        observe_upload(file.stream, started, len(channels))
         
         if not channels:
             return jsonify({'success': False, 'error': 'Keine gültigen Kanäle in der Playlist gefunden'}), 400
@@ -401,11 +4163,52 @@ def upload_file():
         app.logger.error(f"Upload error: {str(e)}")
         return jsonify({'success': False, 'error': f'Fehler beim Verarbeiten der Datei: {str(e)}'}), 500
 
+def stream_job_result(response, result_file):
+    """Send response with the job's channels copied from result_file as they are.
+    
+    The result can be tens of MB of JSON; splicing its bytes into the body
+    avoids parsing and re-encoding it in the worker on every poll.
+    """
+    head = json.dumps(response, ensure_ascii=False)[:-1] + ', "channels": '
+    
+    def generate():
+        with result_file:
+            yield head.encode('utf-8')
+            while True:
+                chunk = result_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+            yield b'}'
+    
+    return Response(generate(), mimetype='application/json')
+
+@app.route('/api/jobs/<job_id>')
+def get_upload_job(job_id):
+    """State of an upload job; once done it carries the parsed channels like /api/upload."""
+    job = load_job(job_id) if UPLOAD_JOB_ID_PATTERN.fullmatch(job_id) else None
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job nicht gefunden'}), 404
+    
+    response = {
+        'success': job['status'] != 'error',
+        'job_id': job['id'],
+        'status': job['status'],
+        'progress': round(job['bytes_done'] / job['bytes_total'], 3) if job['bytes_total'] else 0,
+        'channel_count': job['channel_count']
+    }
+    if job['status'] == 'error':
+        response['error'] = job.get('error')
+    elif job['status'] == 'done':
+        response['message'] = f"{job['channel_count']} Kanäle erfolgreich geladen"
+        return stream_job_result(response, open(get_job_file(job_id, 'result.json'), 'rb'))
+    return jsonify(response)
+
 @app.route('/api/check_playlist_name/<playlist_name>')
 def check_playlist_name(playlist_name):
     """Check if a playlist name already exists."""
     sanitized_name = sanitize_playlist_name(playlist_name)
-    exists = sanitized_name in named_playlists
+    exists = playlist_store.get_info(sanitized_name) is not None
     
     return jsonify({
         'exists': exists,
@@ -417,14 +4220,16 @@ def list_playlists():
     """List all saved playlists."""
     try:
         playlist_list = []
-        for name, data in named_playlists.items():
+        for info in playlist_store.list_info():
+            name = info['sanitized_name']
             playlist_info = {
-                'name': data.get('name', name),
+                'name': info['name'],
                 'sanitized_name': name,
-                'channel_count': len(data.get('channels', [])),
-                'created_at': data.get('created_at'),
-                'updated_at': data.get('updated_at'),
-                'url': url_for('serve_playlist_by_name', playlist_name=f'{name}.m3u', _external=True)
+                'channel_count': info['channel_count'],
+                'created_at': info['created_at'],
+                'updated_at': info['updated_at'],
+                'url': url_for('serve_playlist_by_name', playlist_name=f'{name}.m3u', _external=True),
+                'epg_url': url_for('serve_playlist_epg', playlist_name=name, _external=True)
             }
             playlist_list.append(playlist_info)
         
@@ -433,17 +4238,116 @@ def list_playlists():
         
         return jsonify({
             'success': True,
-            'playlists': playlist_list,
-            'count': len(playlist_list)
+            'playlists': playlist_list,
+            'count': len(playlist_list)
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/playlists/<playlist_name>/channels')
+def search_playlist_channels(playlist_name):
+    """Search and page the channels of a saved playlist."""
+    playlist_info = playlist_store.get_info(sanitize_playlist_name(playlist_name))
+    if not playlist_info:
+        return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+    
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', SEARCH_DEFAULT_LIMIT)), 0), SEARCH_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'offset und limit müssen Zahlen sein'}), 400
+    
+    try:
+        for attempt in range(SEARCH_VERSION_ATTEMPTS):
+            if attempt:
+                # Patched since the lookup - search the new version
+                playlist_info = playlist_store.get_info(sanitize_playlist_name(playlist_name))
+                if not playlist_info:
+                    return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+            
+            start = time.perf_counter()
+            positions = search_index_cache.get(playlist_info).search(
+                request.args.get('q', ''), request.args.get('group')
+            )
+            search_ms = (time.perf_counter() - start) * 1000
+            
+            page = positions[offset:offset + limit]
+            try:
+                channels = playlist_store.get_channels_at(playlist_info['id'], page, playlist_info.get('updated_at'))
+                break
+            except PlaylistVersionConflict as e:
+                conflict = e
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Die Playlist wird gerade geändert, bitte erneut versuchen',
+                'version': conflict.current_version
+            }), 409
+        
+        return jsonify({
+            'success': True,
+            'playlist': playlist_info['sanitized_name'],
+            'updated_at': playlist_info.get('updated_at'),
+            'total': len(positions),
+            'offset': offset,
+            'limit': limit,
+            'channels': [dict(channel, position=position) for position, channel in zip(page, channels)],
+            'search_ms': round(search_ms, 3)
         })
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return jsonify({'success': False, 'error': f'Fehler bei der Suche: {str(e)}'}), 500
+
+@app.route('/api/playlists/<playlist_name>', methods=['PATCH'])
+def patch_playlist(playlist_name):
+    """Apply a batch of edit operations to a saved playlist (optimistic concurrency on base_version)."""
+    playlist_info = playlist_store.get_info(sanitize_playlist_name(playlist_name))
+    if not playlist_info:
+        return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+    
+    with timed_phase('decode'):
+        data = request.get_json(silent=True)
+    if not data or 'base_version' not in data or 'ops' not in data:
+        return jsonify({'success': False, 'error': 'base_version und ops sind erforderlich'}), 400
+    
+    try:
+        updated_at = datetime.now().isoformat()
+        if updated_at == data['base_version']:
+            updated_at = (datetime.now() + timedelta(microseconds=1)).isoformat()
+        
+        with timed_phase('persist'):
+            info = playlist_store.patch(playlist_info['id'], data['base_version'], data['ops'], updated_at)
+    except PlaylistVersionConflict as e:
+        return jsonify({
+            'success': False,
+            'error': 'Die Playlist wurde inzwischen geändert',
+            'version': e.current_version
+        }), 409
+    except KeyError:
+        # Replaced by a save in another worker
+        return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+    except PlaylistPatchError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Fehler beim Ändern der Playlist: {str(e)}'}), 500
+    
+    rendered_playlist_cache.invalidate(info['id'])
+    search_index_cache.invalidate(info['id'])
+    group_index_cache.invalidate(info['id'])
+    
+    return jsonify({
+        'success': True,
+        'version': info['updated_at'],
+        'channel_count': info['channel_count']
+    })
 
 @app.route('/api/save', methods=['POST'])
 def save_playlist():
     """Save playlist with custom name."""
     try:
-        data = request.get_json()
+        with timed_phase('read'):
+            request.get_data(cache=True)
+        with timed_phase('decode'):
+            data = request.get_json()
         
         if not data or 'channels' not in data:
             return jsonify({'success': False, 'error': 'Keine Playlist-Daten bereitgestellt'}), 400
@@ -456,7 +4360,8 @@ def save_playlist():
         sanitized_name = sanitize_playlist_name(playlist_name)
         
         # Check if name already exists and replacement not allowed
-        if sanitized_name in named_playlists and not replace_existing:
+        existing_info = playlist_store.get_info(sanitized_name)
+        if existing_info and not replace_existing:
             return jsonify({
                 'success': False, 
                 'error': f'Playlist-Name "{playlist_name}" ist bereits vergeben'
@@ -474,12 +4379,8 @@ def save_playlist():
             'updated_at': datetime.now().isoformat()
         }
         
-        # Store in both dictionaries
-        playlists[playlist_id] = playlist_data
-        named_playlists[sanitized_name] = playlist_data
-        
-        # Save to disk
-        if save_playlists_to_disk():
+        # Store and save to disk, dropping caches of the playlist being replaced
+        if store_playlist(playlist_data, existing_info['id'] if existing_info else None):
             app.logger.info(f"Playlist '{playlist_name}' saved successfully")
         else:
             app.logger.warning(f"Playlist '{playlist_name}' saved to memory but failed to save to disk")
@@ -488,13 +4389,475 @@ def save_playlist():
             'success': True,
             'playlist_id': playlist_id,
             'playlist_name': sanitized_name,
+            'version': playlist_data['updated_at'],
             'supports_named_urls': True,
-            'url': url_for('serve_playlist_by_name', playlist_name=f'{sanitized_name}.m3u', _external=True)
+            'url': url_for('serve_playlist_by_name', playlist_name=f'{sanitized_name}.m3u', _external=True),
+            'epg_url': url_for('serve_playlist_epg', playlist_name=sanitized_name, _external=True)
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Fehler beim Speichern der Playlist: {str(e)}'}), 500
 
+@app.route('/api/templates')
+def list_templates():
+    """List server-side sorting templates."""
+    templates = load_templates()
+    return jsonify({
+        'success': True,
+        'templates': list(templates.values()),
+        'count': len(templates)
+    })
+
+@app.route('/api/templates/<template_name>')
+def get_template(template_name):
+    """Get a single sorting template."""
+    template = load_templates().get(template_name)
+    if not template:
+        return jsonify({'success': False, 'error': 'Template nicht gefunden'}), 404
+    return jsonify({'success': True, 'template': template})
+
+@app.route('/api/templates', methods=['POST'])
+def save_template():
+    """Store a sorting template, either given directly or created from channels or a saved playlist."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'Keine Template-Daten bereitgestellt'}), 400
+        
+        # Accept the browser's download format {"template": {...}} as well
+        template = data.get('template')
+        if template:
+            if not template.get('name') or not isinstance(template.get('channels'), list):
+                return jsonify({'success': False, 'error': 'Ungültiges Template-Format'}), 400
+        else:
+            template_name = data.get('name')
+            if not template_name:
+                return jsonify({'success': False, 'error': 'Kein Template-Name angegeben'}), 400
+            
+            channels = data.get('channels')
+            if channels is None and data.get('playlist'):
+                playlist_info = playlist_store.get_info(sanitize_playlist_name(data['playlist']))
+                if not playlist_info:
+                    return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+                channels = playlist_store.get_channels(playlist_info['id'])
+            if not channels:
+                return jsonify({'success': False, 'error': 'Keine Kanäle für das Template angegeben'}), 400
+            
+            template = create_sorting_template(template_name, channels)
+        
+        update_templates(template['name'], template)
+        return jsonify({'success': True, 'template': template})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Fehler beim Speichern des Templates: {str(e)}'}), 500
+
+@app.route('/api/templates/<template_name>', methods=['DELETE'])
+def delete_template(template_name):
+    """Delete a sorting template."""
+    if template_name not in load_templates():
+        return jsonify({'success': False, 'error': 'Template nicht gefunden'}), 404
+    
+    update_templates(template_name)
+    return jsonify({'success': True})
+
+@app.route('/api/sort', methods=['POST'])
+def sort_channels():
+    """Sort channels (posted or from a saved playlist) by a sorting template."""
+    try:
+        data = request.get_json()
+        if not data or not data.get('template'):
+            return jsonify({'success': False, 'error': 'Kein Template angegeben'}), 400
+        
+        # Template by name or as an object
+        template = data['template']
+        if isinstance(template, str):
+            template = load_templates().get(template)
+            if not template:
+                return jsonify({'success': False, 'error': 'Template nicht gefunden'}), 404
+        
+        if data.get('playlist'):
+            sanitized_name = sanitize_playlist_name(data['playlist'])
+            playlist_info = playlist_store.get_info(sanitized_name)
+            if not playlist_info:
+                return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+            
+            if data.get('save'):
+                playlist_data, results = resort_saved_playlist(sanitized_name, template)
+                channels = playlist_data['channels']
+            else:
+                channels, results = apply_sorting_template(playlist_store.get_channels(playlist_info['id']), template)
+        elif isinstance(data.get('channels'), list):
+            channels, results = apply_sorting_template(data['channels'], template)
+        else:
+            return jsonify({'success': False, 'error': 'Keine Playlist-Daten bereitgestellt'}), 400
+        
+        return jsonify({
+            'success': True,
+            'channels': channels,
+            'results': results,
+            'summary': {key: len(value) for key, value in results.items()}
+        })
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Fehler beim Sortieren: {str(e)}'}), 500
+
+@app.route('/api/rules')
+def list_rule_sets():
+    """List rule sets and the playlists they are attached to."""
+    rule_sets, attachments = load_rules()
+    return jsonify({
+        'success': True,
+        'rule_sets': list(rule_sets.values()),
+        'playlists': attachments,
+        'count': len(rule_sets)
+    })
+
+@app.route('/api/rules/<rule_set_name>')
+def get_rule_set(rule_set_name):
+    """Get a single rule set."""
+    rule_set = load_rules()[0].get(rule_set_name)
+    if not rule_set:
+        return jsonify({'success': False, 'error': 'Regelsatz nicht gefunden'}), 404
+    return jsonify({'success': True, 'rule_set': rule_set})
+
+@app.route('/api/rules', methods=['POST'])
+def save_rule_set():
+    """Store a rule set {"name": ..., "rules": [...]}; it is compiled first to reject invalid rules."""
+    try:
+        data = request.get_json()
+        if not data or not data.get('name'):
+            return jsonify({'success': False, 'error': 'Kein Regelsatz-Name angegeben'}), 400
+        
+        try:
+            compile_rule_set(data)
+        except RuleSetError as e:
+            return jsonify({'success': False, 'error': f'Ungültiger Regelsatz: {str(e)}'}), 400
+        
+        rule_set = {'name': data['name'], 'rules': data['rules'], 'updated': datetime.now().isoformat()}
+        update_rule_set(rule_set['name'], rule_set)
+        return jsonify({'success': True, 'rule_set': rule_set})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Fehler beim Speichern des Regelsatzes: {str(e)}'}), 500
+
+@app.route('/api/rules/<rule_set_name>', methods=['DELETE'])
+def delete_rule_set(rule_set_name):
+    """Delete a rule set and detach it from its playlists."""
+    if rule_set_name not in load_rules()[0]:
+        return jsonify({'success': False, 'error': 'Regelsatz nicht gefunden'}), 404
+    
+    update_rule_set(rule_set_name)
+    return jsonify({'success': True})
+
+@app.route('/api/rules/apply', methods=['POST'])
+def apply_rules():
+    """Apply a rule set (by name or as an object) to posted channels or a saved playlist."""
+    try:
+        data = request.get_json()
+        if not data or not data.get('rules'):
+            return jsonify({'success': False, 'error': 'Kein Regelsatz angegeben'}), 400
+        
+        rule_set = data['rules']
+        if isinstance(rule_set, str):
+            rule_set = load_rules()[0].get(rule_set)
+            if not rule_set:
+                return jsonify({'success': False, 'error': 'Regelsatz nicht gefunden'}), 404
+        elif isinstance(rule_set, list):
+            rule_set = {'rules': rule_set}
+        
+        try:
+            compiled = compile_rule_set(rule_set)
+        except RuleSetError as e:
+            return jsonify({'success': False, 'error': f'Ungültiger Regelsatz: {str(e)}'}), 400
+        
+        try:
+            if data.get('playlist'):
+                sanitized_name = sanitize_playlist_name(data['playlist'])
+                playlist_info = playlist_store.get_info(sanitized_name)
+                if not playlist_info:
+                    return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+                
+                if data.get('save'):
+                    playlist_data, changes = apply_rules_to_saved_playlist(sanitized_name, rule_set)
+                    channels = playlist_data['channels']
+                else:
+                    channels, changes = compiled.apply(playlist_store.get_channels(playlist_info['id']))
+            elif isinstance(data.get('channels'), list):
+                channels, changes = compiled.apply(data['channels'])
+            else:
+                return jsonify({'success': False, 'error': 'Keine Playlist-Daten bereitgestellt'}), 400
+        except RuleTimeoutError as e:
+            return jsonify({'success': False, 'error': f'Regelsatz zu langsam: {str(e)}'}), 400
+        
+        return jsonify({'success': True, 'channels': channels, 'changes': changes})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Fehler beim Anwenden der Regeln: {str(e)}'}), 500
+
+@app.route('/api/playlists/<playlist_name>/rules', methods=['PUT'])
+def attach_playlist_rules(playlist_name):
+    """Attach a stored rule set to a playlist and apply it once (unless "apply" is false)."""
+    data = request.get_json(silent=True) or {}
+    rule_set = load_rules()[0].get(data.get('rules') or '')
+    if not rule_set:
+        return jsonify({'success': False, 'error': 'Regelsatz nicht gefunden'}), 404
+    
+    sanitized_name = sanitize_playlist_name(playlist_name)
+    if not playlist_store.get_info(sanitized_name):
+        return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+    
+    attach_rule_set(sanitized_name, rule_set['name'])
+    changes = None
+    if data.get('apply', True):
+        try:
+            _, changes = apply_rules_to_saved_playlist(sanitized_name, rule_set)
+        except RuleTimeoutError as e:
+            return jsonify({'success': False, 'error': f'Regelsatz zu langsam: {str(e)}'}), 400
+    return jsonify({'success': True, 'playlist': sanitized_name, 'rules': rule_set['name'], 'changes': changes})
+
+@app.route('/api/playlists/<playlist_name>/rules', methods=['DELETE'])
+def detach_playlist_rules(playlist_name):
+    """Detach the rule set of a playlist; the playlist itself is kept as it is."""
+    sanitized_name = sanitize_playlist_name(playlist_name)
+    if sanitized_name not in load_rules()[1]:
+        return jsonify({'success': False, 'error': 'Kein Regelsatz zugeordnet'}), 404
+    
+    attach_rule_set(sanitized_name)
+    return jsonify({'success': True})
+
+@app.route('/api/merge', methods=['POST'])
+def merge_sources():
+    """Merge several uploaded M3U files (in priority order) into one deduplicated list."""
+    try:
+        files = [file for file in request.files.getlist('files') if file.filename]
+        if not files:
+            return jsonify({'success': False, 'error': 'Keine Dateien hochgeladen'}), 400
+        
+        for file in files:
+            if not file.filename.lower().endswith(('.m3u', '.m3u8')):
+                return jsonify({'success': False, 'error': f'{file.filename}: Datei muss eine M3U Playlist sein'}), 400
+        
+        sort_by = request.form.get('sort', 'priority')
+        if sort_by not in MERGE_SORT_KEYS:
+            return jsonify({'success': False, 'error': f'Unbekannte Sortierung: {sort_by}'}), 400
+        
+        try:
+            channels, stats = merge_playlists([file.read() for file in files], sort_by)
+        except M3UValidationError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        batches = iter_channel_batches(channels)
+        first_batch = next(batches, None)
+        if first_batch is None:
+            return jsonify({'success': False, 'error': 'Keine gültigen Kanäle in den Playlists gefunden'}), 400
+        filenames = [file.filename for file in files]
+        
+        def generate():
+            # The same JSON object as before, written as the merge runs; stats come last
+            yield '{"success": true, "channels": ['
+            for index, batch in enumerate(chain([first_batch], batches)):
+                yield (', ' if index else '') + json.dumps(batch, ensure_ascii=False)[1:-1]
+            yield '], ' + json.dumps({
+                'stats': {
+                    'sources': [{'filename': filename, 'channels': count}
+                                for filename, count in zip(filenames, stats['sources'])],
+                    'unique': stats['unique'],
+                    'duplicates': stats['duplicates']
+                },
+                'message': f"{stats['unique']} Kanäle aus {len(filenames)} Playlists zusammengeführt "
+                           f"({stats['duplicates']} Duplikate entfernt)"
+            }, ensure_ascii=False)[1:]
+        
+        return Response(stream_with_context(generate()), mimetype='application/json')
+        
+    except Exception as e:
+        app.logger.error(f"Merge error: {str(e)}")
+        return jsonify({'success': False, 'error': f'Fehler beim Zusammenführen: {str(e)}'}), 500
+
+@app.route('/api/subscriptions')
+def list_subscriptions():
+    """List playlist subscriptions."""
+    subscriptions = load_subscriptions()
+    return jsonify({
+        'success': True,
+        'subscriptions': list(subscriptions.values()),
+        'count': len(subscriptions)
+    })
+
+@app.route('/api/subscriptions', methods=['POST'])
+def save_subscription():
+    """Create or update a subscription and fetch it right away."""
+    try:
+        data = request.get_json()
+        if not data or not data.get('name') or not data.get('url'):
+            return jsonify({'success': False, 'error': 'Name und URL sind erforderlich'}), 400
+        
+        if urlsplit(data['url']).scheme not in ('http', 'https'):
+            return jsonify({'success': False, 'error': 'Nur http- und https-URLs werden unterstützt'}), 400
+        
+        try:
+            interval = int(data.get('interval') or app.config['SUBSCRIPTION_DEFAULT_INTERVAL'])
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'Intervall muss eine Zahl (Minuten) sein'}), 400
+        
+        sanitized_name = sanitize_playlist_name(data['name'])
+        previous = load_subscriptions().get(sanitized_name) or {}
+        changes = {
+            'playlist_name': data['name'],
+            'url': data['url'],
+            'interval': max(interval, 1),
+            'template': data.get('template')
+        }
+        if previous.get('url') != data['url']:
+            # New source - validators of the old one must not be sent
+            changes.update({'etag': None, 'last_modified': None, 'content_hash': None})
+        update_subscription(sanitized_name, changes)
+        
+        subscription = refresh_subscription(sanitized_name)
+        return jsonify({'success': subscription['last_status'] != 'error', 'subscription': subscription})
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': f'Fehler beim Speichern des Abonnements: {str(e)}'}), 500
+
+@app.route('/api/subscriptions/<playlist_name>/refresh', methods=['POST'])
+def refresh_subscription_now(playlist_name):
+    """Refresh one subscription immediately (?force=1 skips the conditional request)."""
+    try:
+        subscription = refresh_subscription(
+            sanitize_playlist_name(playlist_name),
+            force=request.args.get('force', '').lower() in ('1', 'true')
+        )
+    except KeyError:
+        return jsonify({'success': False, 'error': 'Abonnement nicht gefunden'}), 404
+    
+    return jsonify({'success': subscription['last_status'] != 'error', 'subscription': subscription})
+
+@app.route('/api/subscriptions/<playlist_name>', methods=['DELETE'])
+def delete_subscription(playlist_name):
+    """Remove a subscription; the playlist itself is kept."""
+    sanitized_name = sanitize_playlist_name(playlist_name)
+    if sanitized_name not in load_subscriptions():
+        return jsonify({'success': False, 'error': 'Abonnement nicht gefunden'}), 404
+    
+    update_subscription(sanitized_name)
+    return jsonify({'success': True})
+
+@app.route('/api/playlists/<playlist_name>/check', methods=['POST'])
+def start_stream_check(playlist_name):
+    """Check the channel URLs of a saved playlist (in the background unless ?wait=1)."""
+    sanitized_name = sanitize_playlist_name(playlist_name)
+    if not playlist_store.get_info(sanitized_name):
+        return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+    
+    health = load_stream_health(sanitized_name) or {}
+    if get_stream_check_status(health) == 'running':
+        return jsonify({'success': True, 'status': 'running', 'started_at': health.get('started_at')}), 202
+    
+    if request.args.get('wait', '').lower() in ('1', 'true'):
+        try:
+            health = check_playlist_streams(sanitized_name)
+        except Exception as e:
+            return jsonify({'success': False, 'error': f'Fehler bei der Stream-Prüfung: {str(e)}'}), 500
+        return jsonify({'success': True, 'status': health['status'], 'summary': health['summary']})
+    
+    def run():
+        try:
+            check_playlist_streams(sanitized_name)
+        except Exception as e:
+            app.logger.error(f"Stream check of '{sanitized_name}' failed: {e}")
+    
+    threading.Thread(target=run, name=f'stream-check-{sanitized_name}', daemon=True).start()
+    return jsonify({'success': True, 'status': 'running'}), 202
+
+@app.route('/api/playlists/<playlist_name>/health')
+def get_stream_health(playlist_name):
+    """Stream check results of a saved playlist, per channel."""
+    sanitized_name = sanitize_playlist_name(playlist_name)
+    playlist_info = playlist_store.get_info(sanitized_name)
+    if not playlist_info:
+        return jsonify({'success': False, 'error': 'Playlist nicht gefunden'}), 404
+    
+    health = load_stream_health(sanitized_name)
+    if not health:
+        return jsonify({'success': True, 'status': 'unchecked', 'channels': []})
+    
+    results = health.get('results', {})
+    channels = []
+    for position, channel in enumerate(playlist_store.get_channels(playlist_info['id'])):
+        result = results.get(channel.get('url'))
+        channels.append({
+            'position': position,
+            'name': channel.get('name'),
+            'url': channel.get('url'),
+            **(result or {'alive': None, 'status': None, 'error': 'not checked'})
+        })
+    
+    return jsonify({
+        'success': True,
+        'status': get_stream_check_status(health),
+        'checked_at': health.get('checked_at'),
+        'summary': health.get('summary'),
+        'channels': channels
+    })
+
+@app.route('/api/epg')
+def list_epg_sources():
+    """List imported EPG guides and the status of URL imports."""
+    return jsonify({'success': True, 'sources': epg_store.list_sources()})
+
+@app.route('/api/epg', methods=['POST'])
+def import_epg():
+    """Import an XMLTV guide (.xml or .xml.gz) from an upload or, given {url}, download it.
+    
+    URL imports run in the background unless ?wait=1.
+    """
+    if 'file' in request.files:
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'error': 'Keine Datei ausgewählt'}), 400
+        
+        name = sanitize_playlist_name(request.form.get('name') or get_epg_source_name(file.filename))
+        try:
+            info = epg_store.import_xmltv(name, file.stream)
+        except (ET.ParseError, ValueError, OSError) as e:
+            return jsonify({'success': False, 'error': f'Ungültige XMLTV-Datei: {str(e)}'}), 400
+        return jsonify({'success': True, 'source': info})
+    
+    data = request.get_json(silent=True) or {}
+    url = data.get('url', '').strip()
+    if not url.lower().startswith(('http://', 'https://')):
+        return jsonify({'success': False, 'error': 'Datei oder gültige URL erforderlich'}), 400
+    name = sanitize_playlist_name(data.get('name') or get_epg_source_name(url))
+    
+    # Refused before a background import is started for it
+    try:
+        check_public_url(url)
+    except (ValueError, OSError) as e:
+        return jsonify({'success': False, 'error': f'Ungültige URL: {str(e)}'}), 400
+    
+    if request.args.get('wait', '').lower() in ('1', 'true'):
+        try:
+            info = import_epg_url(name, url)
+        except Exception as e:
+            return jsonify({'success': False, 'error': f'Fehler beim EPG-Import: {str(e)}'}), 502
+        return jsonify({'success': True, 'source': info})
+    
+    def run():
+        try:
+            import_epg_url(name, url)
+        except Exception as e:
+            app.logger.error(f"EPG import of '{name}' from {url} failed: {e}")
+    
+    threading.Thread(target=run, name=f'epg-import-{name}', daemon=True).start()
+    return jsonify({'success': True, 'status': 'running', 'name': name}), 202
+
+@app.route('/api/epg/<source_name>', methods=['DELETE'])
+def delete_epg_source(source_name):
+    """Remove an imported EPG guide."""
+    if not epg_store.delete_source(source_name):
+        return jsonify({'success': False, 'error': 'EPG-Quelle nicht gefunden'}), 404
+    return jsonify({'success': True})
+
 @app.route('/api/export', methods=['POST'])
 def export_playlist():
     """Export playlist as M3U file."""
@@ -504,30 +4867,223 @@ def export_playlist():
         if not data or 'channels' not in data:
             return jsonify({'success': False, 'error': 'Keine Playlist-Daten bereitgestellt'}), 400
         
-        channels = data['channels']
-        m3u_content = generate_m3u_content(channels)
-        
-        # Create temporary file
-        temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.m3u', delete=False, encoding='utf-8')
-        temp_file.write(m3u_content)
-        temp_file.close()
-        
-        return send_file(
-            temp_file.name,
-            as_attachment=True,
-            download_name='sorted_playlist.m3u',
-            mimetype='audio/x-mpegurl'
-        )
+        # Render the first chunk up front so broken channel data still fails with a 500
+        chunks = iter_m3u_chunks(data['channels'])
+        first_chunk = next(chunks)
+        
+        response = Response(chain([first_chunk], chunks), mimetype='audio/x-mpegurl')
+        response.headers['Content-Disposition'] = build_content_disposition('attachment', 'sorted_playlist.m3u')
+        return response
         
     except Exception as e:
         return jsonify({'success': False, 'error': f'Fehler beim Exportieren: {str(e)}'}), 500
-    finally:
-        # Clean up temporary file
+
+def build_content_disposition(disposition, filename):
+    """Build a Content-Disposition header, with an RFC 5987 fallback for non-ASCII names."""
+    try:
+        filename.encode('ascii')
+        return f'{disposition}; filename="{filename}"'
+    except UnicodeEncodeError:
+        return f"{disposition}; filename*=UTF-8''{quote(filename)}"
+
+def get_playlist_etag(playlist_data, variant=()):
+    """Strong ETag for a saved playlist, derived from its id, last update and served variant."""
+    version = ':'.join(map(str, (M3U_RENDER_VERSION, playlist_data['id'], playlist_data.get('updated_at')) + variant))
+    return hashlib.sha1(version.encode('utf-8')).hexdigest()
+
+def get_playlist_last_modified(playlist_data, *timestamps):
+    """Last-Modified datetime (UTC, second precision): the latest of updated_at and timestamps."""
+    try:
+        updated_at = max(
+            datetime.fromisoformat(value)
+            for value in (playlist_data['updated_at'],) + timestamps if value
+        )
+    except (KeyError, TypeError, ValueError):
+        return None
+    return updated_at.astimezone(timezone.utc).replace(microsecond=0)
+
+# Served playlists are compressed once per version, with settings favouring size
+PLAYLIST_COMPRESSORS = {
+    'gzip': lambda body: gzip.compress(body, compresslevel=9, mtime=0),
+}
+if brotli is not None:
+    PLAYLIST_COMPRESSORS['br'] = lambda body: brotli.compress(body, mode=brotli.MODE_TEXT, quality=9)
+
+def negotiate_playlist_encoding():
+    """Pick the content coding for a served playlist from Accept-Encoding."""
+    offered = [
+        encoding.strip() for encoding in app.config['PLAYLIST_COMPRESSION'].split(',')
+        if encoding.strip() in PLAYLIST_COMPRESSORS
+    ]
+    if not offered:
+        return 'identity'
+    return request.accept_encodings.best_match(offered + ['identity'], default='identity')
+
+def get_compressed_playlist(cache_key, encoding, render_chunks):
+    """Return the compressed rendering of a playlist version, compressing it only once.
+    
+    render_chunks() returns the uncompressed chunks on a cache miss.
+    """
+    compressed_key = cache_key + (encoding,)
+    body = rendered_playlist_cache.get(compressed_key)
+    if body is None:
+        raw_body = rendered_playlist_cache.get(cache_key)
+        if raw_body is None:
+            raw_body = b''.join(render_chunks())
+            rendered_playlist_cache.put(cache_key, raw_body)
+        
+        body = PLAYLIST_COMPRESSORS[encoding](raw_body)
+        rendered_playlist_cache.put(compressed_key, body)
+    return body
+
+def wants_alive_channels_only():
+    """Whether dead channels should be dropped (?alive=1/0 overrides SERVE_ALIVE_ONLY)."""
+    alive = request.args.get('alive')
+    if alive is None:
+        return app.config['SERVE_ALIVE_ONLY']
+    return alive.lower() in ('1', 'true')
+
+PLAYLIST_FILTER_PARAMETERS = ('group', 'exclude_group', 'tvg_id')
+
+def get_playlist_filter():
+    """Filter of a served playlist from the query string, or None for the whole playlist.
+    
+    group, exclude_group and tvg_id may be repeated; offset and limit select
+    a range of the filtered channels. Raises ValueError for a bad range.
+    """
+    playlist_filter = {
+        parameter: tuple(sorted(set(request.args.getlist(parameter))))
+        for parameter in PLAYLIST_FILTER_PARAMETERS
+    }
+    offset = max(int(request.args.get('offset', 0)), 0)
+    limit = request.args.get('limit')
+    playlist_filter['range'] = (offset, max(int(limit), 0) if limit is not None else None)
+    
+    if not any(playlist_filter[parameter] for parameter in PLAYLIST_FILTER_PARAMETERS) and playlist_filter['range'] == (0, None):
+        return None
+    return playlist_filter
+
+CHANNEL_FETCH_BATCH = 1000  # channels read from the store at a time for filtered views
+
+def iter_channels_at(playlist_data, positions):
+    """Read the channels at positions of the playlist version in playlist_data, in batches."""
+    positions = iter(positions)
+    while True:
+        batch = list(islice(positions, CHANNEL_FETCH_BATCH))
+        if not batch:
+            return
+        yield from playlist_store.get_channels_at(playlist_data['id'], batch, playlist_data.get('updated_at'))
+
+def filter_playlist_channels(playlist_data, playlist_filter, dead_urls=()):
+    """Channels of a saved playlist selected by a filter (see get_playlist_filter).
+    
+    Only channels at selected positions are read, lazily, so a range stops once
+    it is filled. Raises PlaylistVersionConflict if the playlist changed since
+    playlist_data was read.
+    """
+    if any(playlist_filter[parameter] for parameter in PLAYLIST_FILTER_PARAMETERS):
+        positions = group_index_cache.get(playlist_data).select(
+            playlist_filter['group'], playlist_filter['exclude_group'], playlist_filter['tvg_id']
+        )
+    else:
+        positions = range(playlist_data.get('channel_count', 0))
+    
+    offset, limit = playlist_filter['range']
+    stop = offset + limit if limit is not None else None
+    if not dead_urls:
+        # Only the requested range has to be read
+        return list(iter_channels_at(playlist_data, islice(positions, offset, stop)))
+    
+    selected = (
+        channel for channel in iter_channels_at(playlist_data, positions)
+        if channel.get('url') not in dead_urls
+    )
+    return list(islice(selected, offset, stop))
+
+def iter_cached_chunks(cache_key, rendered_chunks):
+    """Yield rendered chunks and store the complete rendering in the cache."""
+    chunks = []
+    for chunk in rendered_chunks:
+        chunks.append(chunk)
+        yield chunk
+    
+    # Only reached if the client received everything
+    rendered_playlist_cache.put(cache_key, b''.join(chunks))
+
+def serve_playlist(playlist_data):
+    """Serve a saved playlist (info dict) from the rendered cache, answering conditional requests with 304."""
+    try:
+        playlist_filter = get_playlist_filter()
+    except ValueError:
+        return "Invalid filter: offset and limit must be numbers", 400
+    
+    # Without dead channels the output also depends on the last stream check
+    variant = ()
+    timestamps = ()
+    health = load_stream_health(playlist_data['sanitized_name']) if wants_alive_channels_only() else None
+    if health and health.get('checked_at'):
+        variant = ('alive', health['checked_at'])
+        timestamps = (health['checked_at'],)
+    
+    # Every filter combination is rendered, cached and tagged separately
+    if playlist_filter:
+        variant += ('filter', json.dumps(playlist_filter, sort_keys=True))
+    
+    def get_channels():
+        dead_urls = get_dead_urls(playlist_data['sanitized_name'], health) if timestamps else ()
+        with timed_phase('read'):
+            if playlist_filter:
+                return filter_playlist_channels(playlist_data, playlist_filter, dead_urls)
+            channels = playlist_store.get_channels(playlist_data['id'])
+        if dead_urls:
+            channels = [channel for channel in channels if channel.get('url') not in dead_urls]
+        return channels
+    
+    # Each content coding is a separate representation with its own ETag
+    encoding = negotiate_playlist_encoding()
+    etag = get_playlist_etag(playlist_data, variant)
+    if encoding != 'identity':
+        etag = f'{etag}-{encoding}'
+    last_modified = get_playlist_last_modified(playlist_data, *timestamps)
+    
+    # Unchanged for the client - no rendering and no cache lookup needed
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        cache_key = (playlist_data['id'], playlist_data.get('updated_at')) + variant
         try:
-            if 'temp_file' in locals():
-                os.unlink(temp_file.name)
-        except:
-            pass
+            with timed_phase('generate'):
+                if encoding != 'identity':
+                    body = get_compressed_playlist(cache_key, encoding, lambda: iter_m3u_chunks(get_channels()))
+                else:
+                    body = rendered_playlist_cache.get(cache_key)
+                    if body is None:
+                        # Stream while rendering; the cache is filled once the last chunk is sent
+                        body = iter_cached_chunks(cache_key, iter_m3u_chunks(get_channels()))
+                        if get_request_timings() is not None:
+                            # Profiled: render up front so generation shows up in Server-Timing
+                            body = b''.join(body)
+        except PlaylistVersionConflict:
+            # Patched while filtering - serve the new version under its own ETag
+            playlist_info = playlist_store.get_info_by_id(playlist_data['id'])
+            if not playlist_info:
+                return "Playlist not found", 404
+            return serve_playlist(playlist_info)
+        
+        response = Response(body, mimetype='audio/x-mpegurl')
+        if encoding != 'identity':
+            response.content_encoding = encoding
+        response.headers['Content-Disposition'] = build_content_disposition(
+            'inline', f'{playlist_data["sanitized_name"]}.m3u'
+        )
+    
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Clients may keep a copy but must revalidate it on every poll
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/playlist/<playlist_name>')
 @app.route('/playlist/<playlist_name>.m3u')
@@ -539,62 +5095,92 @@ def serve_playlist_by_name(playlist_name):
     
     sanitized_name = sanitize_playlist_name(playlist_name)
     
-    if sanitized_name not in named_playlists:
+    playlist_info = playlist_store.get_info(sanitized_name)
+    if not playlist_info:
         return "Playlist not found", 404
     
-    playlist_data = named_playlists[sanitized_name]
-    channels = playlist_data['channels']
-    
-    m3u_content = generate_m3u_content(channels)
-    
-    # Create temporary file
-    temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.m3u', delete=False, encoding='utf-8')
-    temp_file.write(m3u_content)
-    temp_file.close()
-    
-    try:
-        return send_file(
-            temp_file.name,
-            as_attachment=False,
-            download_name=f'{sanitized_name}.m3u',
-            mimetype='audio/x-mpegurl'
-        )
-    finally:
-        # Clean up temporary file
-        try:
-            os.unlink(temp_file.name)
-        except:
-            pass
+    return serve_playlist(playlist_info)
 
 @app.route('/playlist/<playlist_id>')
 def serve_playlist_by_id(playlist_id):
     """Serve playlist by ID (legacy support)."""
-    if playlist_id not in playlists:
+    playlist_info = playlist_store.get_info_by_id(playlist_id)
+    if not playlist_info:
         return "Playlist not found", 404
     
-    playlist_data = playlists[playlist_id]
-    channels = playlist_data['channels']
+    return serve_playlist(playlist_info)
+
+def serve_epg(playlist_data, gzip_file=False):
+    """Serve the EPG of a saved playlist: programmes of its channels' tvg-ids only.
     
-    m3u_content = generate_m3u_content(channels)
+    Renderings are cached per playlist and guide version like playlists; as a
+    .xml.gz file the body is always gzip-compressed.
+    """
+    epg_version, imported_at = epg_store.version()
+    if epg_version is None:
+        return "No EPG imported", 404
     
-    # Create temporary file
-    temp_file = tempfile.NamedTemporaryFile(mode='w', suffix='.m3u', delete=False, encoding='utf-8')
-    temp_file.write(m3u_content)
-    temp_file.close()
+    variant = ('epg', epg_version)
+    if gzip_file:
+        encoding = 'gzip'
+    else:
+        encoding = negotiate_playlist_encoding()
+    etag = f'{get_playlist_etag(playlist_data, variant)}-{"gzfile" if gzip_file else encoding}'
+    last_modified = get_playlist_last_modified(playlist_data, imported_at)
     
-    try:
-        return send_file(
-            temp_file.name,
-            as_attachment=False,
-            download_name=f'{playlist_data["sanitized_name"]}.m3u',
-            mimetype='audio/x-mpegurl'
-        )
-    finally:
-        # Clean up temporary file
-        try:
-            os.unlink(temp_file.name)
-        except:
-            pass
+    def render_chunks():
+        channel_ids = {
+            channel.get('tvg_id') for channel in playlist_store.get_channels(playlist_data['id'])
+            if channel.get('tvg_id')
+        }
+        return epg_store.iter_guide_chunks(channel_ids)
+    
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = Response(status=304)
+    else:
+        cache_key = (playlist_data['id'], playlist_data.get('updated_at')) + variant
+        with timed_phase('generate'):
+            if encoding != 'identity':
+                body = get_compressed_playlist(cache_key, encoding, render_chunks)
+            else:
+                body = rendered_playlist_cache.get(cache_key)
+                if body is None:
+                    body = iter_cached_chunks(cache_key, render_chunks())
+        
+        if gzip_file:
+            response = Response(body, mimetype='application/gzip')
+            filename = f'{playlist_data["sanitized_name"]}.xml.gz'
+        else:
+            response = Response(body, mimetype='application/xml')
+            if encoding != 'identity':
+                response.content_encoding = encoding
+            filename = f'{playlist_data["sanitized_name"]}.xml'
+        response.headers['Content-Disposition'] = build_content_disposition('inline', filename)
+    
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/epg/<playlist_name>.xml')
+def serve_playlist_epg(playlist_name):
+    """Serve the EPG of a saved playlist as XMLTV."""
+    playlist_info = playlist_store.get_info(sanitize_playlist_name(playlist_name))
+    if not playlist_info:
+        return "Playlist not found", 404
+    
+    return serve_epg(playlist_info)
+
+@app.route('/epg/<playlist_name>.xml.gz')
+def serve_playlist_epg_gzip(playlist_name):
+    """Serve the EPG of a saved playlist as gzip-compressed XMLTV file."""
+    playlist_info = playlist_store.get_info(sanitize_playlist_name(playlist_name))
+    if not playlist_info:
+        return "Playlist not found", 404
+    
+    return serve_epg(playlist_info, gzip_file=True)
 
 # Enhanced application initialization with route debugging
 
@@ -699,43 +5285,141 @@ def file_too_large_error(error):
 def debug_playlists():
     """Debug endpoint to see playlist storage status."""
     try:
-        playlists_file = get_playlists_file()
+        playlist_count = playlist_store.count()
         
         debug_info = {
             'timestamp': datetime.now().isoformat(),
-            'playlists_in_memory': len(playlists),
-            'named_playlists_in_memory': len(named_playlists),
-            'playlists_file_path': playlists_file,
-            'playlists_file_exists': os.path.exists(playlists_file),
-            'playlists_directory': os.path.dirname(playlists_file),
-            'playlists_directory_exists': os.path.exists(os.path.dirname(playlists_file))
+            'playlists_in_memory': playlist_count,
+            'named_playlists_in_memory': playlist_count
         }
-        
-        # File info if exists
-        if os.path.exists(playlists_file):
-            stat = os.stat(playlists_file)
-            debug_info.update({
-                'file_size': stat.st_size,
-                'file_modified': datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                'file_readable': os.access(playlists_file, os.R_OK),
-                'file_writable': os.access(playlists_file, os.W_OK)
-            })
+        debug_info.update(playlist_store.describe())
         
         # List named playlists
         debug_info['named_playlists_list'] = []
-        for name, data in named_playlists.items():
+        for info in playlist_store.list_info():
             debug_info['named_playlists_list'].append({
-                'name': data.get('name', name),
-                'sanitized_name': name,
-                'channel_count': len(data.get('channels', [])),
-                'created_at': data.get('created_at'),
-                'id': data.get('id')
+                'name': info['name'],
+                'sanitized_name': info['sanitized_name'],
+                'channel_count': info['channel_count'],
+                'created_at': info['created_at'],
+                'id': info['id']
             })
         
         return jsonify(debug_info)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.cli.command('sort-playlist')
+@click.argument('playlist_name')
+@click.argument('template_name')
+def sort_playlist_command(playlist_name, template_name):
+    """Re-sort a saved playlist by a stored template (headless)."""
+    template = load_templates().get(template_name)
+    if not template:
+        raise click.ClickException(f"Template '{template_name}' not found")
+    
+    try:
+        _, results = resort_saved_playlist(sanitize_playlist_name(playlist_name), template)
+    except KeyError:
+        raise click.ClickException(f"Playlist '{playlist_name}' not found")
+    
+    click.echo(', '.join(f'{key}: {len(value)}' for key, value in results.items()))
+
+@app.cli.command('apply-rules')
+@click.argument('playlist_name')
+@click.argument('rule_set_name')
+def apply_rules_command(playlist_name, rule_set_name):
+    """Apply a stored rule set to a saved playlist (headless)."""
+    rule_set = load_rules()[0].get(rule_set_name)
+    if not rule_set:
+        raise click.ClickException(f"Rule set '{rule_set_name}' not found")
+    
+    try:
+        _, changes = apply_rules_to_saved_playlist(sanitize_playlist_name(playlist_name), rule_set)
+    except KeyError:
+        raise click.ClickException(f"Playlist '{playlist_name}' not found")
+    except RuleSetError as e:
+        raise click.ClickException(f"Invalid rule set: {e}")
+    
+    click.echo(', '.join(f'{key}: {value}' for key, value in changes.items()))
+
+@app.cli.command('merge-playlists')
+@click.argument('sources', nargs=-1, required=True, type=click.Path(exists=True, dir_okay=False))
+@click.option('--sort', 'sort_by', type=click.Choice(sorted(MERGE_SORT_KEYS)), default='priority',
+              help='Output order; ties and duplicates go to the earlier source.')
+@click.option('--output', '-o', type=click.File('wb'), default='-', help='M3U output file (default stdout).')
+@click.option('--save', 'save_name', help='Also store the result as a saved playlist with this name.')
+def merge_playlists_command(sources, sort_by, output, save_name):
+    """Merge M3U files, highest priority first, dropping duplicate channels."""
+    contents = []
+    for path in sources:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    
+    try:
+        channels, stats = merge_playlists(contents, sort_by)
+    except M3UValidationError as e:
+        raise click.ClickException(str(e))
+    
+    # Written as merged, unless the result is also saved
+    if save_name:
+        channels = list(channels)
+    for chunk in iter_m3u_chunks(channels):
+        output.write(chunk)
+    
+    if save_name:
+        replace_playlist_channels(save_name, channels)
+    
+    click.echo(f"{stats['unique']} channels ({stats['duplicates']} duplicates removed)", err=True)
+
+@app.cli.command('refresh-subscriptions')
+@click.argument('names', nargs=-1)
+@click.option('--force', is_flag=True, help='Fetch unconditionally and re-import even if unchanged.')
+def refresh_subscriptions_command(names, force):
+    """Refresh subscriptions now (all due ones, or the named ones) - e.g. from cron."""
+    if names:
+        subscriptions = []
+        for name in names:
+            try:
+                subscriptions.append(refresh_subscription(sanitize_playlist_name(name), force))
+            except KeyError:
+                raise click.ClickException(f"Subscription '{name}' not found")
+    else:
+        subscriptions = refresh_due_subscriptions()
+    
+    for subscription in subscriptions:
+        click.echo(f"{subscription['name']}: {subscription['last_status']}"
+                   + (f" ({subscription['last_error']})" if subscription.get('last_error') else ''))
+
+@app.cli.command('check-streams')
+@click.argument('playlist_name')
+def check_streams_command(playlist_name):
+    """Check every channel URL of a saved playlist and store the results."""
+    try:
+        health = check_playlist_streams(sanitize_playlist_name(playlist_name))
+    except KeyError:
+        raise click.ClickException(f"Playlist '{playlist_name}' not found")
+    
+    click.echo(', '.join(f'{key}: {value}' for key, value in health['summary'].items()))
+
+@app.cli.command('import-epg')
+@click.argument('source')
+@click.option('--name', help='Source name (default: derived from the file name)')
+def import_epg_command(source, name):
+    """Import an XMLTV guide (.xml or .xml.gz) from a file or URL."""
+    name = sanitize_playlist_name(name or get_epg_source_name(source))
+    try:
+        if source.lower().startswith(('http://', 'https://')):
+            info = import_epg_url(name, source)
+        else:
+            with open(source, 'rb') as f:
+                info = epg_store.import_xmltv(name, f)
+    except (ET.ParseError, ValueError, OSError) as e:
+        raise click.ClickException(f"Import failed: {e}")
+    
+    click.echo(f"{info['name']}: {info['channel_count']} channels, {info['programme_count']} programmes")
+
 if __name__ == '__main__':
     # Development mode only - Gunicorn handles production
+    start_subscription_scheduler()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark: memory of a loaded playlist as channel dicts vs. Channel objects
+
+Each representation is measured in a fresh process: the playlist file is
+loaded with plain json.load (what the JSON store did before) or with the
+store's channel_object_hook. Reported are the bytes still allocated
+(tracemalloc) and the growth of the resident set once garbage is collected.
+
+Usage: python benchmarks/bench_channel_memory.py [channel_count]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = r'''
+import gc, json, logging, os, sys, tracemalloc
+logging.disable(logging.WARNING)
+import app
+
+def rss_kb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') // 1024
+
+# tracemalloc's own bookkeeping inflates RSS, so each figure comes from its own run
+trace = sys.argv[3] == 'trace'
+gc.collect()
+rss_before = rss_kb()
+if trace:
+    tracemalloc.start()
+with open(sys.argv[2], encoding='utf-8') as f:
+    if sys.argv[1] == 'compact':
+        channels = json.load(f, object_hook=app.channel_object_hook)['channels']
+    else:
+        channels = json.load(f)['channels']
+gc.collect()
+allocated = tracemalloc.get_traced_memory()[0] if trace else None
+print(json.dumps({'allocated': allocated, 'rss_kb': rss_kb() - rss_before, 'channels': len(channels)}))
+'''
+
+
+def build_channels(count):
+    """Channels resembling large provider lists: few groups, CDN logos, a few extra attributes."""
+    groups = [f'DE | {name}' for name in ('News', 'Sports', 'Movies', 'Kids', 'Music', 'Documentary', 'Series', 'Regional')]
+    return [{
+        'name': f'Channel {i} HD',
+        'group': groups[i % len(groups)],
+        'logo': f'https://cdn.example.com/picons/{groups[i % len(groups)].split()[-1].lower()}.png',
+        'tvg_name': f'Channel {i}',
+        'tvg_id': f'channel{i}.de',
+        'attributes': {'tvg-chno': str(i + 1), 'catchup': 'default'} if i % 4 == 0 else {},
+        'url': f'https://stream.example.com/live/user/pass/{100000 + i}.ts'
+    } for i in range(count)]
+
+
+def run(mode, path, trace):
+    env = dict(os.environ, SAVED_PLAYLISTS_FOLDER=tempfile.mkdtemp(), PYTHONPATH=ROOT)
+    output = subprocess.run([sys.executable, '-c', MEASURE, mode, path, trace], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(mode, path):
+    return {
+        'allocated': run(mode, path, 'trace')['allocated'],
+        'rss_kb': run(mode, path, 'rss')['rss_kb']
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'playlist.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'channels': build_channels(count)}, f)
+
+        dicts = measure('dict', path)
+        compact = measure('compact', path)
+
+    print(f"{count} channels")
+    print(f"{'':>10} {'allocated':>12} {'per channel':>12} {'RSS growth':>12}")
+    for label, result in (('dicts', dicts), ('Channel', compact)):
+        print(f"{label:>10} {result['allocated'] / 2**20:>10.1f}MB {result['allocated'] / count:>11.0f}B "
+              f"{result['rss_kb'] / 1024:>10.1f}MB")
+    print(f"saved: {(1 - compact['allocated'] / dicts['allocated']) * 100:.0f}% allocated, "
+          f"{(1 - compact['rss_kb'] / dicts['rss_kb']) * 100:.0f}% RSS")
+
+
+if __name__ == '__main__':
+    main()
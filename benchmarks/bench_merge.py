@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark: multi-source merge, inline vs. process pool
+
+Sources are synthetic provider lists that overlap by roughly a third, so
+the dedupe pass has real work to do. The pool pays for pickling every
+parsed run back to the worker, so it only wins when the sources parse on
+separate cores. On a single core it can only add overhead (measured
+0.60-0.71x of inline); PARSE_WORKERS defaults to the CPU count (at most 4
+under gunicorn), so such hosts merge inline. The script prints the
+measured ratio rather than assuming a speedup.
+
+Usage: python benchmarks/bench_merge.py [sources] [channels_per_source]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SAVED_PLAYLISTS_FOLDER', tempfile.mkdtemp())
+
+import logging  # noqa: E402
+logging.disable(logging.WARNING)
+
+import app  # noqa: E402
+
+
+def build_source(index, count):
+    """Provider list whose channels partly overlap with the other sources."""
+    groups = ['News', 'Sports', 'Movies', 'Kids', 'Music', 'Documentary']
+    lines = ['#EXTM3U']
+    for i in range(count):
+        # Every third channel is shared by all sources
+        channel = i if i % 3 == 0 else index * count + i
+        group = groups[channel % len(groups)]
+        lines.append(f'#EXTINF:-1 tvg-id="channel{channel}.de" tvg-logo="https://cdn.example.com/{channel}.png" '
+                     f'group-title="{group}",Channel {channel} HD')
+        lines.append(f'https://stream.example.com/live/{channel}/index.m3u8')
+    return '\n'.join(lines).encode('utf-8')
+
+
+def timed(sources, sort_by, workers):
+    app.app.config['PARSE_WORKERS'] = workers
+    start = time.perf_counter()
+    channels, stats = app.merge_playlists(sources, sort_by)
+    channels = list(channels)
+    return time.perf_counter() - start, channels, stats
+
+
+def main():
+    source_count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    sources = [build_source(index, count) for index in range(source_count)]
+    cpus = os.cpu_count() or 1
+    # The gunicorn default, but at least 2 so there is a pool to measure
+    workers = max(min(4, cpus), 2)
+
+    print(f"{source_count} sources x {count} channels, {cpus} CPUs, pool of {workers}")
+    for sort_by in ('priority', 'group'):
+        inline, channels, stats = timed(sources, sort_by, 1)
+        # Start the pool outside the measurement, as a long-running worker would
+        timed(sources[:2], sort_by, workers)
+        pooled, pooled_channels, _ = timed(sources, sort_by, workers)
+        assert pooled_channels == channels
+
+        print(f"[{sort_by}] {stats['unique']} unique, {stats['duplicates']} duplicates")
+        print(f"  inline: {inline:.2f}s")
+        print(f"  pool:   {pooled:.2f}s  ({inline / pooled:.2f}x, {'faster' if pooled < inline else 'slower'} than inline)")
+
+    if cpus < 2:
+        print("Single CPU: the pool can only add overhead here (PARSE_WORKERS defaults to 1, merges run inline)")
+
+
+if __name__ == '__main__':
+    main()
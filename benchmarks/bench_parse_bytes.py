@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark: byte-level validate + parse vs. decoding the upload first
+
+"decoded" is the previous path for a raw upload buffer: decode with
+utf-8-sig, validate_m3u_content (lowercases the whole text) and
+parse_m3u_content. "bytes" runs validate_m3u_bytes and parse_m3u_bytes on
+the buffer as it is.
+
+Usage: python benchmarks/bench_parse_bytes.py [channel_count]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('SAVED_PLAYLISTS_FOLDER', tempfile.mkdtemp())
+os.environ.setdefault('SUBSCRIPTIONS_ENABLED', 'false')
+
+import logging  # noqa: E402
+logging.disable(logging.WARNING)
+
+import app  # noqa: E402
+from generate_m3u import generate_m3u  # noqa: E402
+
+
+def decoded_validate(data):
+    return app.validate_m3u_content(data.decode('utf-8-sig', errors='ignore'))
+
+
+def decoded_parse(data):
+    content = data.decode('utf-8-sig', errors='ignore')
+    is_valid, message = app.validate_m3u_content(content)
+    assert is_valid, message
+    return app.parse_m3u_content(content)
+
+
+def bytes_parse(data):
+    is_valid, message = app.validate_m3u_bytes(data)
+    assert is_valid, message
+    return app.parse_m3u_bytes(data)
+
+
+def check_equivalence():
+    """Both paths must give the same channels on the bundled playlists."""
+    checked = 0
+    for name in ('deu.m3u', 'example_playlist.m3u'):
+        with open(os.path.join(ROOT, name), 'rb') as f:
+            data = f.read()
+        channels = bytes_parse(data)
+        assert channels == decoded_parse(data), name
+        checked += len(channels)
+    return checked
+
+
+# Fragments random inputs are built from: markers, separators, non-ASCII
+# whitespace, multi-byte characters and invalid UTF-8 bytes
+FUZZ_FRAGMENTS = (
+    b'#EXTM3U', b'#EXTINF:', b'-1', b',', b'"', b'=', b'tvg-id', b'group-title', b'#', b'#EXT',
+    b'INF:', b'http://a', b'<script', b'javascript:', b'\n', b'\r\n', b' ', b'\t', b'\x0c',
+    b'\xc2\x85', b'\xc2\xa0', b'\xe3\x80\x80', b'\xc3\xa9', b'\xef\xbb\xbf', b'\xff', b'\xc3',
+    b'\x80', b'\xe2\x82', b'A', b'b',
+)
+
+
+def fuzz_input(rng):
+    data = b''.join(rng.choice(FUZZ_FRAGMENTS) for _ in range(rng.randint(0, 40)))
+    return b'#EXTM3U\n' + data if rng.random() < 0.7 else data
+
+
+def check_fuzz(cases=20_000, seed=1):
+    """Both paths must agree on random inputs, including invalid UTF-8."""
+    rng = random.Random(seed)
+    for _ in range(cases):
+        data = fuzz_input(rng)
+        content = data.decode('utf-8-sig', errors='ignore')
+        assert app.validate_m3u_bytes(data) == app.validate_m3u_content(content), data
+        assert app.parse_m3u_bytes(data) == app.parse_m3u_content(content), data
+    return cases
+
+
+def run(func, data):
+    start = time.perf_counter()
+    func(data)
+    return time.perf_counter() - start
+
+
+def compare(label, data, decoded, current):
+    # Alternate the two paths so background noise hits both equally
+    decoded_runs, current_runs = [], []
+    for _ in range(5):
+        decoded_runs.append(run(decoded, data))
+        current_runs.append(run(current, data))
+    before = min(decoded_runs)
+    after = min(current_runs)
+
+    print(f"  {label:<9} decoded: {before:.3f}s  bytes: {after:.3f}s  speedup: {before / after:.2f}x")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+
+    print(f"deu.m3u, example_playlist.m3u: {check_equivalence()} channels parsed identically")
+    print(f"random inputs: {check_fuzz()} validated and parsed identically")
+
+    for attributes, unicode_ratio, crlf in (('typical', 0.1, False), ('extended', 0.5, True)):
+        data = generate_m3u(count, attributes, unicode_ratio, crlf).encode('utf-8')
+        app.app.config['MAX_CONTENT_LENGTH'] = max(app.app.config['MAX_CONTENT_LENGTH'], len(data))
+        assert bytes_parse(data) == decoded_parse(data)
+
+        print(f"[{attributes}, {unicode_ratio:.0%} unicode{', CRLF' if crlf else ''}] "
+              f"{count} channels ({len(data) / 1024 / 1024:.1f} MB)")
+        compare('validate', data, decoded_validate, app.validate_m3u_bytes)
+        compare('total', data, decoded_parse, bytes_parse)
+
+
+if __name__ == '__main__':
+    main()
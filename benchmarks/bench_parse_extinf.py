@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark: single-pass EXTINF tokenizer vs. the previous four-regex parser
+
+The tokenizer also keeps every other attribute (tvg-chno, catchup, ...),
+which the old parser dropped. That extra work shows on lines with many
+attributes. Per-round ratios measured on a single CPU: typical lines
+1.08-1.37x, deu.m3u 0.95-1.26x, extended lines 0.91-1.08x - no faster
+than the old parser there. The ranges are printed rather than only the
+best round.
+
+Usage: python benchmarks/bench_parse_extinf.py [channel_count]
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SAVED_PLAYLISTS_FOLDER', tempfile.mkdtemp())
+
+import logging  # noqa: E402
+logging.disable(logging.WARNING)
+
+from app import parse_extinf_line  # noqa: E402
+
+
+def legacy_parse_extinf_line(extinf_line):
+    """Previous implementation: one regex scan per attribute plus rsplit."""
+    channel_info = {
+        'name': '',
+        'group': None,
+        'logo': None,
+        'tvg_name': None,
+        'tvg_id': None
+    }
+
+    if ',' in extinf_line:
+        parts = extinf_line.rsplit(',', 1)
+        if len(parts) == 2:
+            channel_info['name'] = parts[1].strip()
+
+    group_match = re.search(r'group-title="([^"]*)"', extinf_line)
+    if group_match:
+        channel_info['group'] = group_match.group(1)
+
+    logo_match = re.search(r'tvg-logo="([^"]*)"', extinf_line)
+    if logo_match:
+        channel_info['logo'] = logo_match.group(1)
+
+    tvg_name_match = re.search(r'tvg-name="([^"]*)"', extinf_line)
+    if tvg_name_match:
+        channel_info['tvg_name'] = tvg_name_match.group(1)
+
+    tvg_id_match = re.search(r'tvg-id="([^"]*)"', extinf_line)
+    if tvg_id_match:
+        channel_info['tvg_id'] = tvg_id_match.group(1)
+
+    return channel_info
+
+
+def build_lines(count, extended=False):
+    """Build EXTINF lines resembling large provider lists."""
+    groups = ['News', 'Sports', 'Movies', 'Kids', 'Music', 'Documentary']
+    lines = []
+    for i in range(count):
+        group = groups[i % len(groups)]
+        extra = f'tvg-name="Channel {i}" tvg-chno="{i + 1}" catchup="default" catchup-days="7" ' if extended else ''
+        lines.append(
+            f'#EXTINF:-1 tvg-id="channel{i}.de" {extra}'
+            f'tvg-logo="https://cdn.example.com/logos/{group.lower()}/{i}.png" '
+            f'group-title="{group}",Channel {i} (1080p)'
+        )
+    return lines
+
+
+def load_sample_lines():
+    """EXTINF lines of the bundled real-world playlist."""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'deu.m3u'), encoding='utf-8') as f:
+        return [line.strip() for line in f if line.startswith('#EXTINF:')]
+
+
+def check_equivalence():
+    """Known fields must match the previous parser on the bundled playlist."""
+    extinf_lines = load_sample_lines()
+    for line in extinf_lines:
+        current = parse_extinf_line(line)
+        current.pop('attributes')
+        assert current == legacy_parse_extinf_line(line), line
+    return len(extinf_lines)
+
+
+def run(func, lines):
+    start = time.perf_counter()
+    for line in lines:
+        func(line)
+    return time.perf_counter() - start
+
+
+def compare(label, lines):
+    # Warm up both code paths
+    run(legacy_parse_extinf_line, lines[:1000])
+    run(parse_extinf_line, lines[:1000])
+
+    # Alternate the two parsers so background noise hits both equally
+    legacy_runs, current_runs = [], []
+    for _ in range(7):
+        legacy_runs.append(run(legacy_parse_extinf_line, lines))
+        current_runs.append(run(parse_extinf_line, lines))
+    legacy = min(legacy_runs)
+    current = min(current_runs)
+    ratios = [old / new for old, new in zip(legacy_runs, current_runs)]
+
+    count = len(lines)
+    print(f"[{label}] {count} EXTINF lines")
+    print(f"  legacy (4 regexes): {legacy:.3f}s  ({count / legacy:,.0f} lines/s)")
+    print(f"  single-pass:        {current:.3f}s  ({count / current:,.0f} lines/s)")
+    print(f"  speedup:            {legacy / current:.2f}x best, {min(ratios):.2f}-{max(ratios):.2f}x per round")
+    if min(ratios) < 1:
+        print("  not consistently faster - within noise of the legacy parser on this profile")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    checked = check_equivalence()
+    print(f"deu.m3u: {checked} lines parsed identically to the previous parser")
+
+    sample = load_sample_lines()
+    compare('deu.m3u repeated', (sample * (count // len(sample) + 1))[:count])
+    compare('typical: tvg-id, tvg-logo, group-title', build_lines(count))
+    compare('extended: 7 attributes, extras preserved', build_lines(count, extended=True))
+
+
+if __name__ == '__main__':
+    main()
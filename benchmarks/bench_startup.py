@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: startup time and RSS with many stored playlists
+
+Each measurement imports the app in a fresh process. "index only" is the
+normal startup; "all hydrated" additionally loads every channel list, which
+is what the previous eager playlists.json load did.
+
+Usage: python benchmarks/bench_startup.py [channels_per_playlist]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MEASURE = r'''
+import json, logging, resource, sys, time
+logging.disable(logging.WARNING)
+start = time.perf_counter()
+import app
+startup = time.perf_counter() - start
+rss_index = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+hydrated = None
+if sys.argv[1] == 'hydrate':
+    start = time.perf_counter()
+    for info in app.playlist_store.list_info():
+        app.playlist_store.get_channels(info['id'])
+    hydrated = time.perf_counter() - start
+print(json.dumps({
+    'startup_s': startup,
+    'hydrate_s': hydrated,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'index_rss_kb': rss_index,
+    'playlists': app.playlist_store.count()
+}))
+'''
+
+
+def build_channels(count):
+    groups = ['News', 'Sports', 'Movies', 'Kids', 'Music', 'Documentary']
+    return [{
+        'name': f'Channel {i} HD',
+        'group': groups[i % len(groups)],
+        'logo': f'https://cdn.example.com/logos/{i}.png',
+        'tvg_name': f'Channel {i}',
+        'tvg_id': f'channel{i}.de',
+        'attributes': {},
+        'url': f'https://stream.example.com/live/{i}/index.m3u8'
+    } for i in range(count)]
+
+
+def populate(directory, playlist_count, channels_per_playlist):
+    """Write playlists in the per-playlist layout used by the JSON store."""
+    data_dir = os.path.join(directory, 'playlists')
+    os.makedirs(data_dir, exist_ok=True)
+    channels = build_channels(channels_per_playlist)
+    index = []
+
+    for i in range(playlist_count):
+        playlist_data = {
+            'id': f'playlist-{i:05d}',
+            'name': f'Playlist {i}',
+            'sanitized_name': f'Playlist_{i}',
+            'channels': channels,
+            'created_at': '2026-01-01T00:00:00',
+            'updated_at': '2026-01-01T00:00:00'
+        }
+        with open(os.path.join(data_dir, f'{playlist_data["id"]}.json'), 'w', encoding='utf-8') as f:
+            json.dump(playlist_data, f, separators=(',', ':'))
+        index.append({key: value for key, value in playlist_data.items() if key != 'channels'})
+        index[-1]['channel_count'] = len(channels)
+
+    with open(os.path.join(directory, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump({'playlists': index}, f)
+
+
+def measure(directory, mode):
+    env = dict(os.environ, SAVED_PLAYLISTS_FOLDER=directory, PYTHONPATH=ROOT,
+               PLAYLIST_CACHE_MAX_CHANNELS=str(10 ** 9))
+    output = subprocess.run([sys.executable, '-c', MEASURE, mode], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    channels_per_playlist = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+
+    print(f"channels per playlist: {channels_per_playlist}")
+    print(f"{'playlists':>10} {'startup':>10} {'RSS':>10} {'all hydrated':>14} {'RSS':>10}")
+    for playlist_count in (10, 100, 1000):
+        with tempfile.TemporaryDirectory() as directory:
+            populate(directory, playlist_count, channels_per_playlist)
+            index_only = measure(directory, 'index')
+            hydrated = measure(directory, 'hydrate')
+            print(f"{playlist_count:>10} {index_only['startup_s']:>9.3f}s "
+                  f"{index_only['max_rss_kb'] / 1024:>8.1f}MB "
+                  f"{hydrated['startup_s'] + hydrated['hydrate_s']:>13.3f}s "
+                  f"{hydrated['max_rss_kb'] / 1024:>8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Synthetic M3U generator for benchmarks
+
+Produces deterministic provider-style playlists of any size. The same seed
+and options always give the same bytes, so results stay comparable between
+versions.
+
+Usage: python benchmarks/generate_m3u.py COUNT [--attributes minimal|typical|extended]
+                                        [--unicode 0.2] [--crlf] [--seed 1] [-o out.m3u]
+"""
+
+import argparse
+import random
+import sys
+
+GROUPS = ['News', 'Sports', 'Movies', 'Kids', 'Music', 'Documentary', 'Series', 'Regional', 'Shop', 'General']
+COUNTRIES = ['DE', 'AT', 'CH', 'UK', 'FR', 'IT', 'PL', 'TR']
+UNICODE_NAMES = ['Müller TV', 'Ελληνικά', 'Телеканал', 'تلفزيون', '日本テレビ', 'Ñandú Sur', 'Česká', '📺 Live']
+QUALITIES = ['', ' HD', ' FHD', ' 4K', ' (720p)', ' (1080p) [Geo-blocked]']
+CDNS = [
+    'https://cdn{n}.example-iptv.net/live/{user}/{password}/{id}.ts',
+    'https://hls{n}.akamaized.example.com/hls/live/{id}/master.m3u8',
+    'http://stitcher.example.tv/stitch/hls/channel/{id:024x}/master.m3u8?appName=web&deviceType=web&sid={id}'
+]
+LOGOS = [
+    'https://i.imgur.example.com/{id:07x}.png',
+    'https://picons.example.org/logos/{group}/{id}.png'
+]
+
+ATTRIBUTE_MIXES = ('minimal', 'typical', 'extended')
+
+
+def generate_channel_lines(index, rng, attributes='typical', unicode_ratio=0.1):
+    """Return the EXTINF and URL line of one channel."""
+    group = rng.choice(GROUPS)
+    country = rng.choice(COUNTRIES)
+    base_name = rng.choice(UNICODE_NAMES) if rng.random() < unicode_ratio else f'Channel {index}'
+    name = f'{country}: {base_name}{rng.choice(QUALITIES)}'
+    url = rng.choice(CDNS).format(n=index % 8, user='user', password='secret', id=100000 + index)
+
+    parts = ['#EXTINF:-1']
+    if attributes != 'minimal':
+        parts.append(f'tvg-id="channel{index}.{country.lower()}"')
+        if attributes == 'extended':
+            parts.append(f'tvg-name="{base_name}"')
+            parts.append(f'tvg-chno="{index + 1}"')
+            parts.append('catchup="default" catchup-days="7"')
+        parts.append(f'tvg-logo="{rng.choice(LOGOS).format(id=index, group=group.lower())}"')
+    title = f'{country} | {group}, Live' if attributes == 'extended' and index % 50 == 0 else f'{country} | {group}'
+    parts.append(f'group-title="{title}"')
+
+    return f'{" ".join(parts)},{name}', url
+
+
+def generate_m3u(count, attributes='typical', unicode_ratio=0.1, crlf=False, seed=1):
+    """Generate a playlist of count channels as a string."""
+    if attributes not in ATTRIBUTE_MIXES:
+        raise ValueError(f"attributes must be one of {', '.join(ATTRIBUTE_MIXES)}")
+
+    rng = random.Random(seed)
+    lines = ['#EXTM3U']
+    for index in range(count):
+        lines.extend(generate_channel_lines(index, rng, attributes, unicode_ratio))
+    newline = '\r\n' if crlf else '\n'
+    return newline.join(lines) + newline
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic M3U playlist.')
+    parser.add_argument('count', type=int)
+    parser.add_argument('--attributes', choices=ATTRIBUTE_MIXES, default='typical')
+    parser.add_argument('--unicode', type=float, default=0.1, help='share of channels with non-ASCII names')
+    parser.add_argument('--crlf', action='store_true', help='use CRLF line endings')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('-o', '--output', help='output file (default stdout)')
+    args = parser.parse_args()
+
+    content = generate_m3u(args.count, args.attributes, args.unicode, args.crlf, args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+    else:
+        sys.stdout.write(content)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: parsing, validation, generation, storage and serving
+
+Runs every case on synthetic playlists from generate_m3u.py and writes the
+results as JSON, so runs of different versions can be compared:
+
+    python benchmarks/run_suite.py --output before.json
+    git checkout <other version>
+    python benchmarks/run_suite.py --output after.json --compare before.json
+
+Cases only call functions the first version already had (parse_m3u_content,
+validate_m3u_content, ...) and otherwise go through the HTTP routes with the
+Flask test client, so the suite runs unchanged on every version. Cases for
+functions or routes a version does not have are skipped. Storage cases use
+the backend selected by PLAYLIST_STORAGE (run once per backend to compare).
+
+Each case is repeated until it has run at least --min-time seconds (and at
+least --min-repeats times); min and median of the runs are reported.
+
+Usage: python benchmarks/run_suite.py [--sizes 1000,100000,1000000] [--cases parse,serve]
+                                      [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('SAVED_PLAYLISTS_FOLDER', tempfile.mkdtemp())
+os.environ.setdefault('SUBSCRIPTIONS_ENABLED', 'false')
+# A save is only measured completely if it is written before the route returns
+os.environ.setdefault('PERSIST_MODE', 'sync')
+
+import logging  # noqa: E402
+logging.disable(logging.WARNING)
+
+import app  # noqa: E402
+from generate_m3u import generate_m3u  # noqa: E402
+from werkzeug.exceptions import HTTPException  # noqa: E402
+
+DEFAULT_SIZES = (1000, 100_000, 1_000_000)
+PLAYLIST_NAME = 'Benchmark'
+
+
+def measure(func, min_repeats, min_time, setup=None):
+    """Time func() repeatedly; setup() runs untimed before every call."""
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_repeats or time.perf_counter() - started < min_time:
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+class Fixture:
+    """Synthetic playlist of one size plus the derived inputs the cases need."""
+
+    def __init__(self, size, directory):
+        self.size = size
+        self.directory = directory
+        self.content = generate_m3u(size, attributes='typical', unicode_ratio=0.1)
+        self.content_crlf = generate_m3u(size, attributes='extended', unicode_ratio=0.1, crlf=True)
+        self.data = self.content.encode('utf-8')
+        self.extinf_lines = [line for line in self.content.split('\n') if line.startswith('#EXTINF:')]
+        self.channels = app.parse_m3u_content(self.content)
+        # Request body of /api/save, encoded once so the cases time the route only
+        self.save_body = json.dumps({
+            'name': PLAYLIST_NAME,
+            'channels': self.channels,
+            'replace_existing': True
+        }).encode('utf-8')
+
+
+def has_route(path, method='GET'):
+    """Whether this version of the app has a route for path."""
+    try:
+        app.app.url_map.bind('localhost').match(path, method)
+    except HTTPException:
+        return False
+    return True
+
+
+def save_playlist(client, fixture):
+    response = client.post('/api/save', data=fixture.save_body, content_type='application/json')
+    assert response.status_code == 200 and response.get_json()['success'], response.get_data()[:200]
+
+
+def parse_cases(fixture):
+    yield 'parse_extinf_line', lambda: [app.parse_extinf_line(line) for line in fixture.extinf_lines], None
+    yield 'parse_m3u_content', lambda: app.parse_m3u_content(fixture.content), None
+    yield 'parse_m3u_content_crlf_extended', lambda: app.parse_m3u_content(fixture.content_crlf), None
+    if hasattr(app, 'parse_m3u_bytes'):
+        yield 'parse_m3u_bytes', lambda: app.parse_m3u_bytes(fixture.data), None
+
+
+def validate_cases(fixture):
+    yield 'validate_m3u_content', lambda: app.validate_m3u_content(fixture.content), None
+    if hasattr(app, 'validate_m3u_bytes'):
+        yield 'validate_m3u_bytes', lambda: app.validate_m3u_bytes(fixture.data), None
+
+
+def generate_cases(fixture):
+    yield 'generate_m3u_content', lambda: app.generate_m3u_content(fixture.channels), None
+
+
+BENCHMARK_RULES = [
+    {'type': 'rename', 'pattern': r'\s*\((?:720p|1080p)\)'},
+    {'type': 'drop', 'pattern': r'\[Geo-blocked\]'},
+    {'type': 'group', 'map': {'DE | News': 'Nachrichten', 'AT | News': 'Nachrichten'}},
+    {'type': 'group', 'pattern': 'sport', 'ignore_case': True, 'group': 'Sport'},
+    {'type': 'logo', 'pattern': '^DE: Channel 1', 'logo': 'https://example.com/logo.png'}
+]
+
+
+def rules_cases(fixture):
+    if not has_route('/api/rules/apply', 'POST'):
+        return
+    client = app.app.test_client()
+    app.app.config['MAX_CONTENT_LENGTH'] = max(app.app.config['MAX_CONTENT_LENGTH'], len(fixture.save_body) * 2)
+    save_playlist(client, fixture)
+
+    def apply_rules():
+        response = client.post('/api/rules/apply', json={'rules': BENCHMARK_RULES, 'playlist': PLAYLIST_NAME})
+        response.get_data()
+        assert response.status_code == 200, response.status_code
+
+    yield 'route_apply_rules', apply_rules, None
+
+
+def storage_cases(fixture):
+    client = app.app.test_client()
+    app.app.config['MAX_CONTENT_LENGTH'] = max(app.app.config['MAX_CONTENT_LENGTH'], len(fixture.save_body) * 2)
+    # One save per run: the playlist replaces itself, written to disk before the response
+    yield 'route_save', lambda: save_playlist(client, fixture), None
+
+
+def serve_cases(fixture):
+    client = app.app.test_client()
+    app.app.config['MAX_CONTENT_LENGTH'] = max(
+        app.app.config['MAX_CONTENT_LENGTH'], len(fixture.content) * 2, len(fixture.save_body) * 2
+    )
+    # Measure the inline upload path, not the job submission (versions with upload jobs)
+    app.app.config['UPLOAD_JOB_MIN_BYTES'] = app.app.config['MAX_CONTENT_LENGTH'] + 1
+
+    def upload():
+        response = client.post('/api/upload', data={
+            'file': (io.BytesIO(fixture.content.encode('utf-8')), 'benchmark.m3u')
+        }, content_type='multipart/form-data')
+        assert response.status_code == 200, response.status_code
+
+    yield 'route_upload', upload, None
+
+    url = f'/playlist/{PLAYLIST_NAME}.m3u'
+
+    def get(headers=None, status=200, query=''):
+        response = client.get(url + query, headers=headers or {})
+        response.get_data()
+        assert response.status_code == status, response.status_code
+        return response
+
+    # Cold: the first request after a save (a new version), which nothing has rendered yet
+    def save():
+        save_playlist(client, fixture)
+
+    yield 'route_serve_cold', get, save
+    get()
+    yield 'route_serve_warm', get, None
+    # Versions without conditional requests may still send an ETag
+    etag = get().headers.get('ETag')
+    if etag and client.get(url, headers={'If-None-Match': etag}).status_code == 304:
+        yield 'route_serve_not_modified', lambda: get({'If-None-Match': etag}, 304), None
+    yield 'route_serve_gzip', lambda: get({'Accept-Encoding': 'gzip'}), None
+    group_query = f"?group={quote(fixture.channels[0]['group'])}"
+    yield 'route_serve_group_cold', lambda: get(query=group_query), save
+    yield 'route_serve_range_cold', lambda: get(query='?offset=100&limit=100'), save
+    if has_route(f'/api/playlists/{PLAYLIST_NAME}/channels'):
+        yield 'route_search', lambda: client.get(f'/api/playlists/{PLAYLIST_NAME}/channels?q=channel 1&limit=100'), None
+
+
+CASE_GROUPS = {
+    'parse': parse_cases,
+    'validate': validate_cases,
+    'generate': generate_cases,
+    'rules': rules_cases,
+    'storage': storage_cases,
+    'serve': serve_cases
+}
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, groups, min_repeats, min_time):
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            fixture = Fixture(size, directory)
+            print(f"{size} channels ({len(fixture.content) / 1024 / 1024:.1f} MB)", file=sys.stderr)
+            for group in groups:
+                for case, func, setup in CASE_GROUPS[group](fixture):
+                    timings = measure(func, min_repeats, min_time, setup)
+                    result = {
+                        'case': case,
+                        'size': size,
+                        'seconds_min': min(timings),
+                        'seconds_median': statistics.median(timings),
+                        'repeats': len(timings),
+                        'per_channel_us': min(timings) / size * 1e6
+                    }
+                    results.append(result)
+                    print(f"  {case:<34} {result['seconds_min'] * 1000:>10.2f} ms "
+                          f"{result['per_channel_us']:>8.3f} us/channel  (x{len(timings)})", file=sys.stderr)
+    return results
+
+
+def compare(results, baseline_file):
+    """Print min-time ratios against a previous result file (>1 means slower now)."""
+    with open(baseline_file, 'r', encoding='utf-8') as f:
+        baseline = {(r['case'], r['size']): r for r in json.load(f)['results']}
+
+    print(f"\n{'case':<34} {'size':>9} {'baseline':>11} {'current':>11} {'ratio':>7}")
+    for result in results:
+        previous = baseline.get((result['case'], result['size']))
+        if previous is None:
+            continue
+        ratio = result['seconds_min'] / previous['seconds_min']
+        print(f"{result['case']:<34} {result['size']:>9} {previous['seconds_min'] * 1000:>9.2f}ms "
+              f"{result['seconds_min'] * 1000:>9.2f}ms {ratio:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark suite.')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='comma-separated channel counts')
+    parser.add_argument('--cases', default=','.join(CASE_GROUPS),
+                        help=f"comma-separated case groups ({', '.join(CASE_GROUPS)})")
+    parser.add_argument('--min-repeats', type=int, default=3)
+    parser.add_argument('--min-time', type=float, default=1.0, help='minimum seconds per case')
+    parser.add_argument('-o', '--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='baseline JSON from a previous run')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    groups = [group.strip() for group in args.cases.split(',')]
+    unknown = [group for group in groups if group not in CASE_GROUPS]
+    if unknown:
+        parser.error(f"unknown case groups: {', '.join(unknown)}")
+
+    results = run_suite(sizes, groups, args.min_repeats, args.min_time)
+    report = {
+        'meta': {
+            'git_commit': get_git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'playlist_storage': os.environ.get('PLAYLIST_STORAGE', 'json'),
+            'timestamp': datetime.now().isoformat(),
+            'min_repeats': args.min_repeats,
+            'min_time': args.min_time
+        },
+        'results': results
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,7 @@
 import os
+import glob
 import multiprocessing
+import tempfile
 
 # Server socket
 bind = "0.0.0.0:5000"
@@ -12,6 +14,13 @@ worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 1000))
 timeout = int(os.environ.get('TIMEOUT', 120))
 keepalive = int(os.environ.get('KEEPALIVE', 5))
 
+# Every worker has its own parse pool. A share of CPU count / workers is below 2
+# with the default worker count, which would parse everything inline, so give
+# each pool up to 4 processes; they are only started when a merge or upload job
+# needs them and mostly run while the other workers wait on I/O. Must be set
+# before the app is loaded.
+os.environ.setdefault('PARSE_WORKERS', str(min(4, multiprocessing.cpu_count())))
+
 # Restart workers after this many requests, to help prevent memory leaks
 max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
 max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 100))
@@ -19,6 +28,13 @@ max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 100))
 # Load application code before the worker processes are forked
 preload_app = True
 
+# Prometheus multiprocess mode: workers write metric samples to files in this
+# directory and /metrics merges them. Must be set before the app is loaded.
+prometheus_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'iptv-m3u-sorter-metrics')
+)
+os.makedirs(prometheus_dir, exist_ok=True)
+
 # Logging
 accesslog = '-'
 errorlog = '-'
@@ -39,3 +55,27 @@ tmp_upload_dir = None
 # SSL (if needed)
 keyfile = None
 certfile = None
+
+# Server hooks
+def on_starting(server):
+    """Drop metric files left over from a previous run."""
+    for path in glob.glob(os.path.join(prometheus_dir, '*.db')):
+        os.remove(path)
+
+def child_exit(server, worker):
+    """Keep samples of an exited worker, but stop reporting its live gauges."""
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
+
+def worker_exit(server, worker):
+    """Write playlist saves still queued in this worker before it exits."""
+    from app import flush_playlist_store
+    flush_playlist_store()
+
+def post_worker_init(worker):
+    """Start background jobs in each worker (after gevent has patched threading)."""
+    from app import start_subscription_scheduler
+    start_subscription_scheduler()
@@ -5,11 +5,13 @@ class M3USorter {
         this.filteredChannels = [];
         this.draggedElement = null;
         this.currentPlaylistId = null;
+        this.savedPlaylist = null; // { name, version, entries } of the last save, for delta saves
         this.templates = this.loadTemplates();
         
         this.initializeEventListeners();
         this.setupDragAndDrop();
         this.loadSavedPlaylists();
+        this.loadServerTemplates();
     }
 
     initializeEventListeners() {
@@ -92,17 +94,28 @@ class M3USorter {
             this.showLoadingState();
             this.showMessage('M3U-Datei wird hochgeladen und verarbeitet...', 'info');
             
-            const response = await fetch('/api/upload', {
+            const response = await fetch('/api/upload?stream=ndjson', {
                 method: 'POST',
+                headers: { 'Accept': 'application/x-ndjson, application/json' },
                 body: formData
             });
 
-            const result = await response.json();
-            console.log('Server response:', result); // Debug
+            const contentType = response.headers.get('Content-Type') || '';
+            let result;
+            if (response.status === 202) {
+                // Large file - parsed as a server job, poll until it is done
+                result = await this.waitForUploadJob(await response.json());
+            } else if (contentType.includes('application/x-ndjson') && response.body) {
+                result = await this.readUploadStream(response);
+            } else {
+                result = await response.json();
+            }
+            console.log('Server response:', result.success, result.message || result.error); // Debug
 
             if (result.success) {
                 console.log('Success! Channels count:', result.channels.length); // Debug
                 this.channels = result.channels;
+                this.savedPlaylist = null;
                 
                 // Initialize channel numbers
                 this.updateChannelNumbers();
@@ -128,6 +141,82 @@ class M3USorter {
         }
     }
 
+    async waitForUploadJob(job) {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+
+            const response = await fetch(job.status_url);
+            const state = await response.json();
+            if (state.status === 'done' || state.status === 'error' || !response.ok) {
+                return state;
+            }
+
+            const percent = Math.round((state.progress || 0) * 100);
+            this.showMessage(`M3U-Datei wird verarbeitet... ${percent}% (${state.channel_count} Kanäle)`, 'info');
+        }
+    }
+
+    async readUploadStream(response) {
+        // Read NDJSON records as they arrive and show the first batch right away
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        const channels = [];
+        let buffer = '';
+        let result = null;
+
+        const handleRecord = (line) => {
+            if (!line.trim()) return;
+            const record = JSON.parse(line);
+
+            if (record.type === 'channels') {
+                const isFirstBatch = channels.length === 0;
+                channels.push(...record.channels);
+
+                if (isFirstBatch) {
+                    this.channels = channels;
+                    this.updateChannelNumbers();
+                    this.filteredChannels = [...this.channels];
+                    this.showPlaylistSection();
+                    this.renderChannels();
+                }
+                this.showMessage(`${channels.length} Kanäle geladen...`, 'info');
+            } else {
+                result = record;
+            }
+        };
+
+        try {
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+
+                buffer += decoder.decode(value, { stream: true });
+                const lines = buffer.split('\n');
+                buffer = lines.pop();
+                lines.forEach(handleRecord);
+            }
+            handleRecord(buffer + decoder.decode());
+        } catch (error) {
+            this.discardPartialUpload();
+            throw error;
+        }
+
+        if (!result || !result.success) {
+            // The channels shown so far are not the whole file
+            this.discardPartialUpload();
+            return result || { success: false, error: 'Unvollständige Antwort vom Server' };
+        }
+        return { ...result, channels: channels };
+    }
+
+    discardPartialUpload() {
+        this.channels = [];
+        this.filteredChannels = [];
+
+        const playlistSection = document.getElementById('playlistSection');
+        if (playlistSection) playlistSection.style.display = 'none';
+    }
+
     showLoadingState() {
         const uploadSection = document.getElementById('uploadSection');
         const loadingSection = document.getElementById('loadingSection');
@@ -1145,6 +1234,16 @@ class M3USorter {
                 console.log('Name checking not supported by backend yet');
             }
 
+            // Saving over the playlist saved last: send only the changes
+            if (shouldReplace && this.savedPlaylist && this.savedPlaylist.name === cleanName) {
+                const patched = await this.patchSavedPlaylist();
+                if (patched) {
+                    this.showSaveSuccess(`${window.location.origin}/playlist/${encodeURIComponent(cleanName)}.m3u`);
+                    this.showMessage(`Playlist "${cleanName}" erfolgreich gespeichert!`, 'success');
+                    return;
+                }
+            }
+
             const response = await fetch('/api/save', {
                 method: 'POST',
                 headers: {
@@ -1167,6 +1266,7 @@ class M3USorter {
 
             if (result.success) {
                 this.currentPlaylistId = result.playlist_id;
+                this.rememberSavedPlaylist(cleanName, result.version);
                 
                 // Always use the playlist name for the URL with .m3u extension
                 // This makes the URLs more user-friendly immediately
@@ -1185,6 +1285,105 @@ class M3USorter {
         }
     }
 
+    channelJson(channel) {
+        // channelNumber only mirrors the position, moves are sent as such
+        return JSON.stringify({ ...channel, channelNumber: undefined });
+    }
+
+    rememberSavedPlaylist(name, version) {
+        this.savedPlaylist = version ? {
+            name: name,
+            version: version,
+            entries: this.channels.map(channel => ({ channel: channel, json: this.channelJson(channel) }))
+        } : null;
+    }
+
+    longestIncreasingSubsequence(sequence) {
+        // Indexes (into sequence) of one longest strictly increasing subsequence
+        const tails = [];
+        const previous = new Array(sequence.length);
+        sequence.forEach((value, index) => {
+            let low = 0;
+            let high = tails.length;
+            while (low < high) {
+                const middle = (low + high) >> 1;
+                if (sequence[tails[middle]] < value) low = middle + 1;
+                else high = middle;
+            }
+            previous[index] = low > 0 ? tails[low - 1] : -1;
+            tails[low] = index;
+        });
+
+        const result = new Set();
+        for (let index = tails.length ? tails[tails.length - 1] : -1; index !== -1; index = previous[index]) {
+            result.add(index);
+        }
+        return result;
+    }
+
+    buildPlaylistOps(entries, channels) {
+        // Channels keeping their relative order stay; all others are deleted and re-inserted
+        const baseIndex = new Map(entries.map((entry, index) => [entry.channel, index]));
+        const keptOrder = channels.filter(channel => baseIndex.has(channel));
+        const stableIndexes = this.longestIncreasingSubsequence(keptOrder.map(channel => baseIndex.get(channel)));
+        const stable = new Set(keptOrder.filter((channel, index) => stableIndexes.has(index)));
+
+        const ops = [];
+        const deleted = [];
+        entries.forEach((entry, index) => {
+            if (!stable.has(entry.channel)) deleted.push(index);
+        });
+        if (deleted.length) ops.push({ op: 'delete', positions: deleted });
+
+        const updates = [];
+        let run = null;
+        channels.forEach((channel, position) => {
+            if (stable.has(channel)) {
+                run = null;
+                const json = this.channelJson(channel);
+                if (json !== entries[baseIndex.get(channel)].json) {
+                    updates.push({ op: 'update', position: position, fields: JSON.parse(json) });
+                }
+            } else if (run) {
+                run.channels.push(channel);
+            } else {
+                run = { op: 'insert', at: position, channels: [channel] };
+                ops.push(run);
+            }
+        });
+
+        return ops.concat(updates);
+    }
+
+    async patchSavedPlaylist() {
+        const ops = this.buildPlaylistOps(this.savedPlaylist.entries, this.channels);
+        if (!ops.length) return true;
+
+        // A rewrite of most of the list is cheaper as a full save
+        const body = JSON.stringify({ base_version: this.savedPlaylist.version, ops: ops });
+        if (body.length > JSON.stringify(this.channels).length / 2) return false;
+
+        try {
+            const response = await fetch(`/api/playlists/${encodeURIComponent(this.savedPlaylist.name)}`, {
+                method: 'PATCH',
+                headers: { 'Content-Type': 'application/json' },
+                body: body
+            });
+            const result = await response.json();
+            if (!result.success) {
+                // e.g. 409: changed elsewhere - the full save below replaces it
+                console.log('Delta save not applied:', result.error);
+                return false;
+            }
+
+            this.rememberSavedPlaylist(this.savedPlaylist.name, result.version);
+            return true;
+        } catch (error) {
+            console.error('Delta save error:', error);
+            return false;
+        }
+    }
+
     async loadSavedPlaylists() {
         // This could be used to load a list of saved playlists if needed
         // For now, we'll skip this since the current HTML doesn't have a saved playlists section
@@ -1505,6 +1704,43 @@ class M3USorter {
         }
     }
 
+    async loadServerTemplates() {
+        // Merge templates stored on the server (shared between browsers / CLI)
+        try {
+            const response = await fetch('/api/templates');
+            const result = await response.json();
+            if (!result.success) return;
+            
+            let added = false;
+            result.templates.forEach(template => {
+                if (!this.templates[template.name]) {
+                    this.templates[template.name] = template;
+                    added = true;
+                }
+            });
+            
+            if (added) {
+                this.saveTemplates();
+                this.updateTemplateSelector();
+            }
+        } catch (error) {
+            console.error('Error loading server templates:', error);
+        }
+    }
+
+    syncTemplateToServer(template) {
+        fetch('/api/templates', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ template: template })
+        }).catch(error => console.error('Error saving template on server:', error));
+    }
+
+    deleteTemplateFromServer(templateName) {
+        fetch(`/api/templates/${encodeURIComponent(templateName)}`, { method: 'DELETE' })
+            .catch(error => console.error('Error deleting template on server:', error));
+    }
+
     createChannelSignature(channel) {
         // Create unique signature for channel matching
         const name = channel.name.toLowerCase().trim();
@@ -1543,6 +1779,7 @@ class M3USorter {
 
         this.templates[templateName] = template;
         this.saveTemplates();
+        this.syncTemplateToServer(template);
         this.updateTemplateSelector();
         this.showMessage(`Template "${templateName}" erfolgreich erstellt!`, 'success');
     }
@@ -1596,25 +1833,23 @@ class M3USorter {
         // Map template positions
         const sortedChannels = new Array(this.channels.length);
         const usedPositions = new Set();
-        const unmatchedChannels = [...this.channels];
+        const placedIndexes = new Set();
 
         // Step 1: Exact matches
         template.channels.forEach(templateChannel => {
             const key = `${templateChannel.signature.name}|${templateChannel.signature.url}`;
             const match = currentChannelMap.get(key);
             
-            if (match && templateChannel.position <= sortedChannels.length) {
+            if (match && placedIndexes.has(match.originalIndex)) {
+                // Already placed by an earlier template entry
+                return;
+            } else if (match && templateChannel.position <= sortedChannels.length) {
                 const targetPos = templateChannel.position - 1;
                 
                 if (!usedPositions.has(targetPos)) {
                     sortedChannels[targetPos] = match.channel;
                     usedPositions.add(targetPos);
-                    
-                    // Remove from unmatched
-                    const unmatchedIndex = unmatchedChannels.findIndex(ch => ch === match.channel);
-                    if (unmatchedIndex !== -1) {
-                        unmatchedChannels.splice(unmatchedIndex, 1);
-                    }
+                    placedIndexes.add(match.originalIndex);
                     
                     results.matched.push({
                         channel: match.channel,
@@ -1640,7 +1875,9 @@ class M3USorter {
 
         // Step 2: Insert unmatched channels in free positions
         let nextFreePosition = 0;
-        unmatchedChannels.forEach(channel => {
+        this.channels.forEach((channel, index) => {
+            if (placedIndexes.has(index)) return;
+            
             // Find next free position
             while (nextFreePosition < sortedChannels.length && sortedChannels[nextFreePosition] !== undefined) {
                 nextFreePosition++;
@@ -1732,6 +1969,7 @@ class M3USorter {
         if (confirm(`Template "${templateName}" wirklich löschen?`)) {
             delete this.templates[templateName];
             this.saveTemplates();
+            this.deleteTemplateFromServer(templateName);
             this.updateTemplateSelector();
             this.showMessage(`Template "${templateName}" gelöscht.`, 'success');
         }
@@ -1824,6 +2062,7 @@ class M3USorter {
             };
             
             this.saveTemplates();
+            this.syncTemplateToServer(this.templates[templateName]);
             this.updateTemplateSelector();
             this.showMessage(`Template "${templateName}" erfolgreich importiert!`, 'success');
             
@@ -1836,6 +2075,7 @@ class M3USorter {
         this.channels = [];
         this.filteredChannels = [];
         this.currentPlaylistId = null;
+        this.savedPlaylist = null;
         
         // Hide playlist section and show upload section
         const uploadSection = document.getElementById('uploadSection');
@@ -0,0 +1,93 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# app reads its configuration at import time
+os.environ['SAVED_PLAYLISTS_FOLDER'] = tempfile.mkdtemp(prefix='m3u-playlists-')
+os.environ['UPLOAD_FOLDER'] = tempfile.mkdtemp(prefix='m3u-uploads-')
+os.environ['SUBSCRIPTIONS_ENABLED'] = 'false'
+os.environ['METRICS_ENABLED'] = 'false'
+os.environ['PERSIST_MODE'] = 'sync'
+# The test servers listen on 127.0.0.1
+os.environ['ALLOW_PRIVATE_URLS'] = 'true'
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """The app module with an empty playlist folder of its own."""
+    monkeypatch.setitem(app_module.app.config, 'SAVED_PLAYLISTS_FOLDER', str(tmp_path))
+    app_module.playlist_store.load()
+    yield app_module
+    app_module.playlist_store.flush()
+
+
+@pytest.fixture
+def client(app):
+    return app.app.test_client()
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    """Answers with whatever the test registered in server.routes for the path."""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        self.respond(self.server.routes.get(self.path, {'status': 404}))
+
+    def do_HEAD(self):
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        route = self.server.routes.get(self.path, {'status': 404})
+        self.respond(dict(route, status=route.get('head_status', route.get('status', 200))), body=False)
+
+    def respond(self, route, body=True):
+        if route.get('delay'):
+            time.sleep(route['delay'])
+        content = route.get('body', b'')
+        etag = route.get('etag')
+        if etag and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(route.get('status', 200))
+        if etag:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Type', route.get('content_type', 'audio/x-mpegurl'))
+        for name, value in route.get('headers', {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if body:
+            self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    """A local HTTP server; set server.routes[path] = {'status', 'body', 'etag', ...}.
+
+    Routes may also set 'headers', 'head_status' (status of HEAD requests)
+    and 'delay' (seconds before answering).
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeHandler)
+    server.daemon_threads = True
+    server.routes = {}
+    server.requests = []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
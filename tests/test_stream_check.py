@@ -0,0 +1,102 @@
+import asyncio
+
+PLAYLIST_TEMPLATE = """#EXTM3U
+#EXTINF:-1 group-title="News",Live
+{url}/live.ts
+#EXTINF:-1 group-title="News",Dead
+{url}/dead.ts
+"""
+
+
+def check_all(app, urls, timeout=5, cache=None):
+    prober = app.StreamProber(concurrency=10, per_host=4, timeout=timeout, cache=cache)
+    return asyncio.run(prober.check_all(urls))
+
+
+def test_prober_reports_live_and_dead_streams(app, http_server):
+    http_server.routes.update({
+        '/live.ts': {'content_type': 'video/mp2t'},
+        '/dead.ts': {'status': 404},
+        '/stream.m3u8': {'body': b'#EXTM3U\n#EXT-X-VERSION:3\n'},
+        '/error-page.m3u8': {'body': b'<html>Not here</html>', 'content_type': 'text/html'}
+    })
+    url = http_server.url
+
+    results = check_all(app, [url + '/live.ts', url + '/dead.ts', url + '/stream.m3u8', url + '/error-page.m3u8'])
+
+    assert results[url + '/live.ts']['alive'] is True
+    assert results[url + '/dead.ts']['alive'] is False
+    assert results[url + '/dead.ts']['error'] == 'HTTP 404'
+    assert results[url + '/stream.m3u8']['alive'] is True
+    assert results[url + '/error-page.m3u8']['alive'] is False
+    assert results[url + '/error-page.m3u8']['error'] == 'not an HLS playlist'
+    # Plain streams are probed with HEAD, HLS manifests with GET
+    methods = {path: method for method, path, _ in http_server.requests}
+    assert methods == {'/live.ts': 'HEAD', '/dead.ts': 'HEAD', '/stream.m3u8': 'GET', '/error-page.m3u8': 'GET'}
+
+
+def test_prober_follows_redirects_and_falls_back_to_get(app, http_server):
+    http_server.routes.update({
+        '/moved.ts': {'status': 302, 'headers': {'Location': '/live.ts'}},
+        '/live.ts': {},
+        '/no-head.ts': {'head_status': 405, 'content_type': 'video/mp2t'}
+    })
+    url = http_server.url
+
+    results = check_all(app, [url + '/moved.ts', url + '/no-head.ts'])
+
+    assert results[url + '/moved.ts']['alive'] is True
+    assert results[url + '/no-head.ts']['alive'] is True
+    assert ('GET', '/no-head.ts') in [(method, path) for method, path, _ in http_server.requests]
+
+
+def test_prober_times_out_slow_streams(app, http_server):
+    http_server.routes['/slow.ts'] = {'delay': 1}
+
+    result = check_all(app, [http_server.url + '/slow.ts'], timeout=0.2)[http_server.url + '/slow.ts']
+
+    assert result == dict(result, alive=False, error='timeout')
+
+
+def test_prober_keeps_unsupported_urls_unknown(app):
+    result = check_all(app, ['rtmp://example.com/live'])['rtmp://example.com/live']
+
+    assert result['alive'] is None
+
+
+def test_prober_uses_cache(app, http_server):
+    http_server.routes['/live.ts'] = {}
+    cache = app.StreamProbeCache(ttl=60)
+
+    check_all(app, [http_server.url + '/live.ts'], cache=cache)
+    check_all(app, [http_server.url + '/live.ts'], cache=cache)
+
+    assert len(http_server.requests) == 1
+
+
+def test_served_playlist_drops_dead_channels(app, client, http_server):
+    http_server.routes.update({'/live.ts': {}, '/dead.ts': {'status': 404}})
+    playlist = PLAYLIST_TEMPLATE.format(url=http_server.url).encode()
+    app.replace_playlist_channels('news', app.parse_m3u_bytes(playlist))
+    app.stream_probe_cache.entries.clear()
+
+    data = client.post('/api/playlists/news/check?wait=1').get_json()
+    assert data['summary'] == dict(data['summary'], alive=1, dead=1)
+
+    served = client.get('/playlist/news.m3u?alive=1').get_data(as_text=True)
+    assert '/live.ts' in served
+    assert '/dead.ts' not in served
+    assert '/dead.ts' in client.get('/playlist/news.m3u?alive=0').get_data(as_text=True)
+
+
+def test_dead_urls_are_collected_once_per_check(app):
+    health = {'checked_at': '2026-01-01T00:00:00', 'results': {
+        'http://a/1': {'alive': True}, 'http://a/2': {'alive': False}, 'rtmp://a/3': {'alive': None}
+    }}
+
+    dead_urls = app.get_dead_urls('news', health)
+    assert dead_urls == {'http://a/2'}
+    assert app.get_dead_urls('news', dict(health)) is dead_urls
+
+    rechecked = dict(health, checked_at='2026-01-02T00:00:00', results={'http://a/1': {'alive': False}})
+    assert app.get_dead_urls('news', rechecked) == {'http://a/1'}
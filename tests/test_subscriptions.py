@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta
+
+PLAYLIST = b"""#EXTM3U
+#EXTINF:-1 tvg-id="das-erste" group-title="News",Das Erste
+http://example.com/das-erste.m3u8
+#EXTINF:-1 tvg-id="zdf" group-title="News",ZDF
+http://example.com/zdf.m3u8
+"""
+
+UPDATED_PLAYLIST = PLAYLIST + b"""#EXTINF:-1 tvg-id="arte" group-title="Kultur",Arte
+http://example.com/arte.m3u8
+"""
+
+
+def subscribe(client, http_server, name='news'):
+    response = client.post('/api/subscriptions', json={
+        'name': name,
+        'url': http_server.url + '/playlist.m3u',
+        'interval': 60
+    })
+    return response.get_json()
+
+
+def get_channels(app, name):
+    info = app.playlist_store.get_info(name)
+    return app.playlist_store.get_playlist(info['id'])['channels']
+
+
+def test_subscribe_imports_playlist(app, client, http_server):
+    http_server.routes['/playlist.m3u'] = {'body': PLAYLIST, 'etag': '"v1"'}
+
+    data = subscribe(client, http_server)
+
+    assert data['success']
+    assert data['subscription']['last_status'] == 'updated'
+    assert data['subscription']['etag'] == '"v1"'
+    assert [channel['name'] for channel in get_channels(app, 'news')] == ['Das Erste', 'ZDF']
+
+
+def test_refresh_revalidates_with_etag(app, client, http_server):
+    http_server.routes['/playlist.m3u'] = {'body': PLAYLIST, 'etag': '"v1"'}
+    subscribe(client, http_server)
+    playlist_id = app.playlist_store.get_info('news')['id']
+
+    data = client.post('/api/subscriptions/news/refresh').get_json()
+
+    assert data['subscription']['last_status'] == 'not_modified'
+    assert http_server.requests[-1][2].get('If-None-Match') == '"v1"'
+    # A 304 saves nothing
+    assert app.playlist_store.get_info('news')['id'] == playlist_id
+
+
+def test_refresh_skips_unchanged_content(app, client, http_server):
+    # No validators - the content hash decides
+    http_server.routes['/playlist.m3u'] = {'body': PLAYLIST}
+    subscribe(client, http_server)
+    playlist_id = app.playlist_store.get_info('news')['id']
+
+    data = client.post('/api/subscriptions/news/refresh').get_json()
+
+    assert data['subscription']['last_status'] == 'unchanged'
+    assert app.playlist_store.get_info('news')['id'] == playlist_id
+
+
+def test_refresh_imports_changed_source(app, client, http_server):
+    http_server.routes['/playlist.m3u'] = {'body': PLAYLIST, 'etag': '"v1"'}
+    subscribe(client, http_server)
+    http_server.routes['/playlist.m3u'] = {'body': UPDATED_PLAYLIST, 'etag': '"v2"'}
+
+    data = client.post('/api/subscriptions/news/refresh').get_json()
+
+    assert data['subscription']['last_status'] == 'updated'
+    assert data['subscription']['channel_count'] == 3
+    assert len(get_channels(app, 'news')) == 3
+
+
+def test_failed_refresh_keeps_playlist_and_backs_off(app, client, http_server):
+    http_server.routes['/playlist.m3u'] = {'body': PLAYLIST, 'etag': '"v1"'}
+    subscribe(client, http_server)
+    http_server.routes['/playlist.m3u'] = {'status': 500}
+
+    data = client.post('/api/subscriptions/news/refresh').get_json()
+
+    assert not data['success']
+    subscription = data['subscription']
+    assert subscription['last_status'] == 'error'
+    assert subscription['last_error'] == 'HTTP 500'
+    assert subscription['failures'] == 1
+    assert len(get_channels(app, 'news')) == 2
+
+    # One failure doubles the 60 minute interval
+    last_checked = datetime.fromisoformat(subscription['last_checked'])
+    assert not app.is_subscription_due(subscription, last_checked + timedelta(minutes=60))
+    assert app.is_subscription_due(subscription, last_checked + timedelta(minutes=120))
+
+    # The wait stops growing after SUBSCRIPTION_BACKOFF_STEPS failures
+    subscription['failures'] = 10
+    assert not app.is_subscription_due(subscription, last_checked + timedelta(minutes=60 * 16 - 1))
+    assert app.is_subscription_due(subscription, last_checked + timedelta(minutes=60 * 16))
+
+
+def test_successful_refresh_resets_backoff(app, client, http_server):
+    http_server.routes['/playlist.m3u'] = {'status': 500}
+    assert subscribe(client, http_server)['subscription']['failures'] == 1
+    http_server.routes['/playlist.m3u'] = {'body': PLAYLIST}
+
+    data = client.post('/api/subscriptions/news/refresh').get_json()
+
+    assert data['subscription']['last_status'] == 'updated'
+    assert data['subscription']['failures'] == 0
+    assert data['subscription']['last_error'] is None
+
+
+def test_refresh_due_subscriptions_skips_backed_off_source(app, client, http_server):
+    http_server.routes['/playlist.m3u'] = {'status': 500}
+    subscribe(client, http_server)
+    requests = len(http_server.requests)
+
+    assert app.refresh_due_subscriptions() == []
+    assert len(http_server.requests) == requests